@@ -8,6 +8,7 @@ from app.ai.index_graph.configuration import IndexConfiguration
 from app.ai.index_graph.state import IndexState
 from app.ai.shared import retrieval
 from app.ai.shared.state import reduce_docs
+from app.services.semantic_cache import semantic_cache
 
 
 async def index_docs(
@@ -26,6 +27,9 @@ async def index_docs(
 
     with retrieval.make_retriever(config) as retriever:
         await retriever.aadd_documents(docs)
+
+    # Cached answers were grounded in the old index contents.
+    await semantic_cache.invalidate()
     return {"docs": docs}
 
 
@@ -0,0 +1,118 @@
+"""Per-turn deduplication of the researcher's search queries.
+
+The query model often rephrases the same search within a step, and later
+plan steps regularly ask for what an earlier one already searched. A
+``QueryMemo`` shared by the research steps of one turn drops a query when
+its normalized text, or its embedding within ``threshold`` cosine
+similarity, matches one searched before. Nothing is lost by skipping it:
+the earlier search's documents are already in the turn's ``documents``.
+
+Each step admits its queries into a ``fork`` of the turn's memo, merged
+back only once the step's search succeeded: a step that times out or
+fails must not make later steps skip its queries.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.ai.shared.embeddings import normalize_text
+from app.core.metrics import RESEARCH_QUERIES_SKIPPED
+
+
+def query_key(query: str) -> str:
+    return normalize_text(query).casefold()
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    out = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(out))
+    return out / norm if norm else out
+
+
+class QueryMemo:
+    """Queries searched so far in the current turn.
+
+    ``queries`` seeds the memo from earlier steps (kept in the graph state
+    as plain text); their embeddings are fetched again on demand, which the
+    embedding cache normally answers without a provider call.
+    """
+
+    def __init__(
+        self, queries: Sequence[str] = (), threshold: Optional[float] = None
+    ) -> None:
+        self.threshold = threshold
+        self.queries: list[str] = []
+        self._keys: set[str] = set()
+        self._vectors: dict[str, np.ndarray] = {}
+        for query in queries:
+            if query_key(query) not in self._keys:
+                self._add(query, None)
+
+    def _add(self, query: str, vector: Optional[Sequence[float]]) -> None:
+        key = query_key(query)
+        self.queries.append(query)
+        self._keys.add(key)
+        if vector is not None:
+            self._vectors[key] = _unit(vector)
+
+    def missing_vectors(self) -> list[str]:
+        """Remembered queries without an embedding, when one is needed."""
+        if self.threshold is None:
+            return []
+        return [q for q in self.queries if query_key(q) not in self._vectors]
+
+    def set_vectors(
+        self, queries: Sequence[str], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        for query, vector in zip(queries, vectors):
+            self._vectors[query_key(query)] = _unit(vector)
+
+    def admit(
+        self, queries: Sequence[str], embeddings: Sequence[Sequence[float]] = ()
+    ) -> list[int]:
+        """Indices of the ``queries`` not searched yet; they are remembered.
+
+        ``embeddings``, when aligned with ``queries``, enable the similarity
+        check.
+        """
+        vectors = list(embeddings) if len(embeddings) == len(queries) else None
+        kept: list[int] = []
+        for i, query in enumerate(queries):
+            key = query_key(query)
+            if key in self._keys:
+                RESEARCH_QUERIES_SKIPPED.labels(reason="text").inc()
+                continue
+            vector = vectors[i] if vectors is not None else None
+            if vector is not None and self._is_near_duplicate(_unit(vector)):
+                RESEARCH_QUERIES_SKIPPED.labels(reason="embedding").inc()
+                continue
+            self._add(query, vector)
+            kept.append(i)
+        return kept
+
+    def fork(self) -> QueryMemo:
+        """A copy for one research step; see ``merge``."""
+        child = QueryMemo(threshold=self.threshold)
+        child.queries = list(self.queries)
+        child._keys = set(self._keys)
+        child._vectors = dict(self._vectors)
+        return child
+
+    def merge(self, child: QueryMemo) -> None:
+        """Take in what ``child`` (a fork of this memo) searched."""
+        for query in child.queries:
+            key = query_key(query)
+            if key not in self._keys:
+                self.queries.append(query)
+                self._keys.add(key)
+        for key, vector in child._vectors.items():
+            self._vectors.setdefault(key, vector)
+
+    def _is_near_duplicate(self, vector: np.ndarray) -> bool:
+        if self.threshold is None or not self._vectors:
+            return False
+        matrix = np.stack(list(self._vectors.values()))
+        return bool((matrix @ vector).max() >= self.threshold)
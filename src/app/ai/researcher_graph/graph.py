@@ -12,6 +12,7 @@ from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
 
 from app.ai.retrieval_graph.configuration import AgentConfiguration
+from app.ai.researcher_graph.dedup import QueryMemo
 from app.ai.researcher_graph.state import QueryState, ResearcherState
 from app.ai.shared import retrieval
 from app.ai.shared.utils import load_chat_model
@@ -27,37 +28,89 @@ async def generate_queries(
     model = load_chat_model(configuration.query_model).with_structured_output(Response)
     messages = [
         {"role": "system", "content": configuration.generate_queries_system_prompt},
-        {"role": "human", "content": state.question},
+        {"role": "human", "content": state["question"]},
     ]
     response = cast(Response, await model.ainvoke(messages))
     return {"queries": response["queries"]}
 
 
+async def embed_queries(
+    state: ResearcherState, *, config: RunnableConfig
+) -> dict[str, list[list[float]]]:
+    """Embed every generated query in one batched call."""
+    queries = state.get("queries") or []
+    if not retrieval.searches_by_vector(config):
+        # The retriever would embed each query again on its own.
+        return {"query_embeddings": []}
+    return {"query_embeddings": await retrieval.aembed_queries(config, queries)}
+
+
+async def dedupe_queries(
+    state: ResearcherState, *, config: RunnableConfig
+) -> dict[str, list]:
+    """Drop queries repeating one searched earlier this turn (or in this step)."""
+    queries = state.get("queries") or []
+    embeddings = state.get("query_embeddings") or []
+    memo = state.get("memo")
+    if memo is None:
+        configuration = AgentConfiguration.from_runnable_config(config)
+        memo = QueryMemo(threshold=configuration.query_dedup_threshold)
+
+    missing = memo.missing_vectors() if embeddings else []
+    if missing:
+        memo.set_vectors(missing, await retrieval.aembed_queries(config, missing))
+
+    kept = memo.admit(queries, embeddings)
+    if len(kept) == len(queries):
+        return {}
+    return {
+        "queries": [queries[i] for i in kept],
+        "query_embeddings": (
+            [embeddings[i] for i in kept] if len(embeddings) == len(queries) else []
+        ),
+    }
+
+
 async def retrieve_documents(
     state: QueryState, *, config: RunnableConfig
 ) -> dict[str, list[Document]]:
+    embedding = state.get("embedding")
+    if embedding is not None:
+        response = await retrieval.asearch_by_vector(config, state["query"], embedding)
+        return {"documents": response}
+
     with retrieval.make_retriever(config) as retriever:
-        response = await retriever.ainvoke(state.query, config)
+        response = await retriever.ainvoke(state["query"], config)
         return {"documents": response}
 
 
 def retrieve_in_parallel(state: ResearcherState) -> list[Send]:
+    queries = state.get("queries") or []
+    embeddings = state.get("query_embeddings") or []
+    if len(embeddings) != len(queries):
+        return [Send("retrieve_documents", QueryState(query=q)) for q in queries]
     return [
-        Send("retrieve_documents", QueryState(query=query)) for query in state.queries
+        Send("retrieve_documents", QueryState(query=q, embedding=e))
+        for q, e in zip(queries, embeddings)
     ]
 
 
 # Define the graph
 builder = StateGraph(ResearcherState)
 builder.add_node(generate_queries)
+builder.add_node(embed_queries)
+builder.add_node(dedupe_queries)
 builder.add_node(retrieve_documents)
 builder.add_edge(START, "generate_queries")
+builder.add_edge("generate_queries", "embed_queries")
+builder.add_edge("embed_queries", "dedupe_queries")
 builder.add_conditional_edges(
-    "generate_queries",
+    "dedupe_queries",
     retrieve_in_parallel,  # type: ignore
     path_map=["retrieve_documents"],
 )
 builder.add_edge("retrieve_documents", END)
 # Compile into a graph object that you can invoke and deploy.
-graph = builder.compile()
+# Research steps are stateless: never inherit the caller's checkpointer.
+graph = builder.compile(checkpointer=False)
 graph.name = "ResearcherGraph"
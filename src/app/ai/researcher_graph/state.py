@@ -1,5 +1,6 @@
-from typing import Annotated, TypedDict
+from typing import Annotated, NotRequired, TypedDict
 from langchain_core.documents import Document
+from app.ai.researcher_graph.dedup import QueryMemo
 from app.ai.shared.state import reduce_docs
 
 
@@ -7,11 +8,15 @@ class QueryState(TypedDict):
     """Private state for the retrieve_documents node in the researcher graph."""
 
     query: str
+    embedding: NotRequired[list[float]]
 
 
 class ResearcherState(TypedDict, total=False):
     """State of the researcher graph / agent."""
 
     question: str
+    # Queries already searched this turn, shared with the other steps.
+    memo: QueryMemo
     queries: list[str]
+    query_embeddings: list[list[float]]
     documents: Annotated[list[Document], reduce_docs]
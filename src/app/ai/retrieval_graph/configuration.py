@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 
 from app.ai.retrieval_graph import prompts
 from app.ai.shared.configuration import BaseConfiguration
@@ -27,6 +27,89 @@ class AgentConfiguration(BaseConfiguration):
         },
     )
 
+    # research execution
+
+    research_mode: Literal["sequential", "parallel"] = field(
+        default="sequential",
+        metadata={
+            "description": "How research plan steps run: one after another ('sequential') or all at once ('parallel')."
+        },
+    )
+
+    research_max_concurrency: int = field(
+        default=3,
+        metadata={
+            "description": "Maximum number of research steps running at the same time in 'parallel' mode."
+        },
+    )
+
+    speculative_research: bool = field(
+        default=False,
+        metadata={
+            "description": "Start the research plan and its first step while the router is still deciding; the work is cancelled if the question is not routed to research."
+        },
+    )
+
+    research_step_timeout: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds a single research step may take before its results are dropped. None disables the timeout."
+        },
+    )
+
+    query_dedup_threshold: Optional[float] = field(
+        default=0.95,
+        metadata={
+            "description": "Cosine similarity at or above which a generated search query counts as a repeat of one already run this turn and is skipped. None only skips queries with the same normalized text."
+        },
+    )
+
+    # routing
+
+    router_tiers: list[str] = field(
+        default_factory=list,
+        metadata={
+            "description": "Local classifiers tried in order before the router LLM: 'keywords' and/or 'centroid'. Empty routes every question with the LLM."
+        },
+    )
+
+    router_min_similarity: float = field(
+        default=0.5,
+        metadata={
+            "description": "Minimum cosine similarity to the nearest centroid for the 'centroid' tier to decide."
+        },
+    )
+
+    router_min_margin: float = field(
+        default=0.05,
+        metadata={
+            "description": "Minimum similarity lead of the nearest centroid over the runner-up for the 'centroid' tier to decide."
+        },
+    )
+
+    # history windows (approximate tokens; None sends every message in state)
+
+    router_history_tokens: Optional[int] = field(
+        default=1000,
+        metadata={
+            "description": "Token budget for the recent messages the router sees."
+        },
+    )
+
+    planner_history_tokens: Optional[int] = field(
+        default=2000,
+        metadata={
+            "description": "Token budget for the recent messages used to build the research plan."
+        },
+    )
+
+    response_history_tokens: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Token budget for the recent messages sent with the final answer prompts. None uses the whole window passed in."
+        },
+    )
+
     # prompts
 
     router_system_prompt: str = field(
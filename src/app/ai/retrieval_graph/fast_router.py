@@ -0,0 +1,321 @@
+"""Local routing tiers tried before the structured-output router LLM.
+
+Each tier looks only at the latest user message and either returns a
+confident ``RouteGuess`` or ``None`` to defer to the next tier; the LLM
+router runs only when every configured tier defers.
+
+* ``keywords``: regex rules; decides only when exactly one label matches.
+* ``centroid``: nearest centroid over the message embedding. Centroids
+  are trained by ``scripts/train_router.py`` from the decisions the LLM
+  router logs to ``ROUTER_DECISION_LOG``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional, Protocol, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.ai.shared.retrieval import get_text_encoder
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ROUTE_TYPES = ("more-info", "langchain", "general")
+
+
+@dataclass(frozen=True)
+class RouteGuess:
+    type: str
+    confidence: float
+    tier: str
+
+    def as_router(self) -> dict[str, str]:
+        # No analysis to pass on: the answer prompts quote ``logic`` as the
+        # router's reasoning, so a made-up one would only mislead the model.
+        return {"type": self.type, "logic": ""}
+
+
+class RouterTier(Protocol):
+    name: str
+
+    async def classify(self, text: str) -> Optional[RouteGuess]: ...
+
+
+class KeywordRouter:
+    name = "keywords"
+
+    RULES: tuple[tuple[str, re.Pattern[str]], ...] = (
+        (
+            "langchain",
+            re.compile(
+                r"\b(lang ?chain|lang ?graph|lang ?smith|lcel|runnables?|retrievers?"
+                r"|vector ?stores?|embeddings?|text splitters?|document loaders?"
+                r"|output parsers?|prompt templates?|chat models?|tool calling)\b",
+                re.IGNORECASE,
+            ),
+        ),
+        (
+            # Complaints without details; alongside a LangChain term the two
+            # rules conflict and the question is left to the next tier.
+            "more-info",
+            re.compile(
+                r"\b(doesn'?t|does not|isn'?t|is not|not) work(s|ing)?\b"
+                r"|\b(got|getting|have|has) an? (error|exception|bug)\b",
+                re.IGNORECASE,
+            ),
+        ),
+        (
+            "general",
+            re.compile(
+                r"^\s*(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening)"
+                r"|who are you|how are you)\b[\s!.?]*$",
+                re.IGNORECASE,
+            ),
+        ),
+    )
+
+    async def classify(self, text: str) -> Optional[RouteGuess]:
+        labels = {label for label, pattern in self.RULES if pattern.search(text)}
+        if len(labels) != 1:
+            return None
+        return RouteGuess(labels.pop(), 1.0, self.name)
+
+
+class CentroidRouter:
+    """Nearest centroid by cosine similarity over normalized embeddings.
+
+    Decides only when the best label is at least ``min_similarity`` and
+    beats the runner-up by ``min_margin``; the margin is the confidence.
+    """
+
+    name = "centroid"
+
+    def __init__(
+        self,
+        embedding_model: str,
+        centroids: dict[str, Sequence[float]],
+        *,
+        min_similarity: float = 0.5,
+        min_margin: float = 0.05,
+    ) -> None:
+        self.embedding_model = embedding_model
+        self.labels = list(centroids)
+        self.matrix = np.asarray([centroids[k] for k in self.labels], dtype=np.float32)
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+
+    async def classify(self, text: str) -> Optional[RouteGuess]:
+        encoder = get_text_encoder(self.embedding_model)
+        vector = _normalize(np.asarray(await encoder.aembed_query(text), np.float32))
+        sims = self.matrix @ vector
+        order = np.argsort(sims)[::-1]
+        best = float(sims[order[0]])
+        margin = best - (float(sims[order[1]]) if len(order) > 1 else -1.0)
+        if best < self.min_similarity or margin < self.min_margin:
+            return None
+        return RouteGuess(self.labels[order[0]], margin, self.name)
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def train_centroids(
+    examples: Sequence[tuple[str, str]],
+    encoder: Embeddings,
+    embedding_model: str,
+    min_examples: int = 5,
+) -> dict[str, Any]:
+    """Centroid file contents from ``(question, route type)`` examples.
+
+    Labels with fewer than ``min_examples`` questions are left out, so the
+    classifier never decides for them.
+    """
+    by_label: dict[str, list[str]] = {}
+    for text, label in examples:
+        if label in ROUTE_TYPES and text.strip():
+            by_label.setdefault(label, []).append(text)
+
+    labels: dict[str, Any] = {}
+    for label, texts in sorted(by_label.items()):
+        if len(texts) < min_examples:
+            continue
+        vectors = np.asarray(encoder.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        labels[label] = {
+            "centroid": _normalize(vectors.mean(axis=0)).tolist(),
+            "count": len(texts),
+        }
+    return {"embedding_model": embedding_model, "labels": labels}
+
+
+_centroid_cache: dict[str, tuple[float, Optional[dict[str, Any]]]] = {}
+_centroid_lock = threading.Lock()
+
+# A retrained centroid file is picked up within this many seconds.
+CENTROID_RECHECK_SECONDS = 5.0
+_mtime_cache: dict[str, tuple[float, Optional[float]]] = {}
+_tiers_cache: dict[tuple, tuple[Optional[float], list[RouterTier]]] = {}
+
+
+def _centroid_mtime(path: str) -> Optional[float]:
+    """``path``'s mtime (None if missing), stat-ed at most every few seconds."""
+    now = time.monotonic()
+    with _centroid_lock:
+        cached = _mtime_cache.get(path)
+        if cached is not None and now - cached[0] < CENTROID_RECHECK_SECONDS:
+            return cached[1]
+    try:
+        mtime: Optional[float] = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    with _centroid_lock:
+        _mtime_cache[path] = (now, mtime)
+    return mtime
+
+
+def load_centroids(path: str) -> Optional[dict[str, Any]]:
+    """The centroid file at ``path``, re-read only when it changes."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _centroid_lock:
+        cached = _centroid_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data: Optional[dict[str, Any]] = json.load(f)
+        except Exception:
+            logger.warning("Could not read router centroids %s", path, exc_info=True)
+            data = None
+        _centroid_cache[path] = (mtime, data)
+        return data
+
+
+def build_tiers(
+    names: Sequence[str],
+    embedding_model: str,
+    *,
+    min_similarity: float,
+    min_margin: float,
+) -> list[RouterTier]:
+    """The configured tiers, reused until the config or centroid file changes."""
+    path = settings.router_centroids_path
+    uses_centroids = CentroidRouter.name in names
+    key = (
+        tuple(names),
+        embedding_model,
+        min_similarity,
+        min_margin,
+        path if uses_centroids else None,
+    )
+    mtime = _centroid_mtime(path) if uses_centroids else None
+    with _centroid_lock:
+        cached = _tiers_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    tiers = _build_tiers(
+        names,
+        embedding_model,
+        path,
+        min_similarity=min_similarity,
+        min_margin=min_margin,
+    )
+    with _centroid_lock:
+        _tiers_cache[key] = (mtime, tiers)
+    return tiers
+
+
+def _build_tiers(
+    names: Sequence[str],
+    embedding_model: str,
+    path: str,
+    *,
+    min_similarity: float,
+    min_margin: float,
+) -> list[RouterTier]:
+    tiers: list[RouterTier] = []
+    for name in names:
+        if name == KeywordRouter.name:
+            tiers.append(KeywordRouter())
+        elif name == CentroidRouter.name:
+            data = load_centroids(path)
+            if not data or len(data.get("labels") or {}) < 2:
+                continue
+            if data.get("embedding_model") != embedding_model:
+                # Vectors from another model are not comparable.
+                continue
+            tiers.append(
+                CentroidRouter(
+                    embedding_model,
+                    {k: v["centroid"] for k, v in data["labels"].items()},
+                    min_similarity=min_similarity,
+                    min_margin=min_margin,
+                )
+            )
+        else:
+            raise ValueError(f"Unknown router tier {name!r}")
+    return tiers
+
+
+async def route_locally(text: str, tiers: Sequence[RouterTier]) -> Optional[RouteGuess]:
+    for tier in tiers:
+        try:
+            guess = await tier.classify(text)
+        except Exception:
+            logger.warning("Router tier %s failed", tier.name, exc_info=True)
+            continue
+        if guess is not None:
+            return guess
+    return None
+
+
+class LatencyAverage:
+    """Exponentially weighted mean of the LLM router's latency."""
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def observe(self, seconds: float) -> None:
+        if self.value is None:
+            self.value = seconds
+        else:
+            self.value += self.alpha * (seconds - self.value)
+
+
+llm_router_latency = LatencyAverage()
+
+
+async def log_decision(text: str, route_type: str) -> None:
+    """Append an LLM routing decision to ROUTER_DECISION_LOG (JSON lines)."""
+    path = settings.router_decision_log
+    if not path or not text:
+        return
+    line = json.dumps({"question": text, "type": route_type, "ts": time.time()})
+    await asyncio.to_thread(_append_line, path, line)
+
+
+def _append_line(path: str, line: str) -> None:
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        logger.warning("Could not log router decision to %s", path, exc_info=True)
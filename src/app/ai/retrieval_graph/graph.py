@@ -1,39 +1,127 @@
-from typing import Any, Literal, TypedDict, cast
-
-from langchain_core.messages import BaseMessage
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from typing import Any, Literal, Optional, TypedDict, cast
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, convert_to_messages
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
+from langgraph.types import Overwrite
 
+from app.ai.retrieval_graph import fast_router
 from app.ai.retrieval_graph.configuration import AgentConfiguration
+from app.ai.researcher_graph.dedup import QueryMemo
 from app.ai.researcher_graph.graph import graph as researcher_graph
 from app.ai.retrieval_graph.state import AgentState, InputState, Router
+from app.ai.shared.history import prompt_messages
 from app.ai.shared.utils import format_docs, load_chat_model
+from app.core.metrics import (
+    ROUTER_DECISIONS,
+    ROUTER_LATENCY,
+    ROUTER_LATENCY_SAVED,
+    SPECULATIVE_RUNS,
+    SPECULATIVE_WASTED_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _last_user_text(state: AgentState) -> str:
+    for message in reversed(convert_to_messages(state.get("messages") or [])):
+        if message.type == "human":
+            return message.text
+    return ""
+
+
+async def _route(state: AgentState, configuration: AgentConfiguration) -> dict:
+    start = time.perf_counter()
+    question = _last_user_text(state)
+    if configuration.router_tiers and question:
+        tiers = fast_router.build_tiers(
+            configuration.router_tiers,
+            configuration.embedding_model,
+            min_similarity=configuration.router_min_similarity,
+            min_margin=configuration.router_min_margin,
+        )
+        guess = await fast_router.route_locally(question, tiers)
+        if guess is not None:
+            elapsed = time.perf_counter() - start
+            ROUTER_DECISIONS.labels(tier=guess.tier).inc()
+            ROUTER_LATENCY.labels(tier=guess.tier).observe(elapsed)
+            typical = fast_router.llm_router_latency.value
+            if typical is not None:
+                ROUTER_LATENCY_SAVED.inc(max(0.0, typical - elapsed))
+            return guess.as_router()
 
-
-async def analyze_and_route_query(
-    state: AgentState, *, config: RunnableConfig
-) -> dict[str, dict]:
-    configuration = AgentConfiguration.from_runnable_config(config)
     model = load_chat_model(configuration.query_model)
-
-    state_messages: list[BaseMessage] = state.get("messages", [])  # type: ignore[assignment]
-    messages = [
-        {"role": "system", "content": configuration.router_system_prompt}
-    ] + state_messages
-
+    messages = prompt_messages(
+        configuration.router_system_prompt,
+        state,
+        configuration.router_history_tokens,
+    )
+    llm_start = time.perf_counter()
     # Router là Pydantic BaseModel
     router_obj = await model.with_structured_output(Router).ainvoke(messages)
+    fast_router.llm_router_latency.observe(time.perf_counter() - llm_start)
+    ROUTER_DECISIONS.labels(tier="llm").inc()
+    ROUTER_LATENCY.labels(tier="llm").observe(time.perf_counter() - start)
     # Lưu vào state dưới dạng dict cho dễ dùng
-    return {"router": router_obj.model_dump()}
+    router = router_obj.model_dump()
+    await fast_router.log_decision(question, router["type"])
+    return router
 
 
-def route_query(
-    state: AgentState,
-) -> Literal["create_research_plan", "ask_for_more_info", "respond_to_general_query"]:
+async def analyze_and_route_query(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    configuration = AgentConfiguration.from_runnable_config(config)
+
+    speculation = (
+        _Speculation(state, configuration)
+        if configuration.speculative_research
+        else None
+    )
+    try:
+        router = await _route(state, configuration)
+    except BaseException:
+        if speculation is not None:
+            await speculation.cancel()
+        raise
+    if speculation is None:
+        return {"router": router}
+
+    if router["type"] != "langchain":
+        await speculation.cancel()
+        return {"router": router}
+
+    steps, documents = await speculation.result()
+    # Overwrite: replaces the previous turn's documents, as the "delete" in
+    # create_research_plan does.
+    return {
+        "router": router,
+        "steps": steps,
+        "documents": Overwrite(documents),
+        "searched_queries": speculation.memo.queries,
+    }
+
+
+def route_query(state: AgentState, config: RunnableConfig) -> Literal[
+    "create_research_plan",
+    "conduct_research",
+    "respond",
+    "ask_for_more_info",
+    "respond_to_general_query",
+]:
     router = state.get("router") or {}
     _type = router.get("type")
 
     if _type == "langchain":
+        configuration = AgentConfiguration.from_runnable_config(config)
+        if configuration.speculative_research:
+            # The plan (and its first step) already ran alongside the router.
+            return check_finished(state)
         return "create_research_plan"
     elif _type == "more-info":
         return "ask_for_more_info"
@@ -53,9 +141,9 @@ async def ask_for_more_info(
     logic = router.get("logic", "")
 
     system_prompt = configuration.more_info_system_prompt.format(logic=logic)
-    state_messages: list[BaseMessage] = state.get("messages", [])  # type: ignore[assignment]
-
-    messages = [{"role": "system", "content": system_prompt}] + state_messages
+    messages = prompt_messages(
+        system_prompt, state, configuration.response_history_tokens
+    )
     response = await model.ainvoke(messages)
     return {"messages": [response]}
 
@@ -70,38 +158,158 @@ async def respond_to_general_query(
     logic = router.get("logic", "")
 
     system_prompt = configuration.general_system_prompt.format(logic=logic)
-    state_messages: list[BaseMessage] = state.get("messages", [])  # type: ignore[assignment]
-
-    messages = [{"role": "system", "content": system_prompt}] + state_messages
+    messages = prompt_messages(
+        system_prompt, state, configuration.response_history_tokens
+    )
     response = await model.ainvoke(messages)
     return {"messages": [response]}
 
 
-async def create_research_plan(
-    state: AgentState, *, config: RunnableConfig
-) -> dict[str, list[str] | str]:
+async def _plan(state: AgentState, configuration: AgentConfiguration) -> list[str]:
     class Plan(TypedDict):
         steps: list[str]
 
-    configuration = AgentConfiguration.from_runnable_config(config)
     model = load_chat_model(configuration.query_model).with_structured_output(Plan)
 
-    state_messages: list[BaseMessage] = state.get("messages", [])  # type: ignore[assignment]
-    messages = [
-        {"role": "system", "content": configuration.research_plan_system_prompt}
-    ] + state_messages
+    messages = prompt_messages(
+        configuration.research_plan_system_prompt,
+        state,
+        configuration.planner_history_tokens,
+    )
 
     response = cast(Plan, await model.ainvoke(messages))
-    return {"steps": response["steps"], "documents": "delete"}
+    return response["steps"]
 
 
-async def conduct_research(state: AgentState) -> dict[str, Any]:
+async def create_research_plan(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, list[str] | str]:
+    configuration = AgentConfiguration.from_runnable_config(config)
+    steps = await _plan(state, configuration)
+    return {"steps": steps, "documents": "delete", "searched_queries": []}
+
+
+async def _research_step(
+    step: str, configuration: AgentConfiguration, memo: QueryMemo
+) -> list[Document]:
+    step_memo = memo.fork()
+    call = researcher_graph.ainvoke({"question": step, "memo": step_memo})
+    if configuration.research_step_timeout is None:
+        result = await call
+    else:
+        try:
+            result = await asyncio.wait_for(
+                call, timeout=configuration.research_step_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Research step timed out after %ss: %r",
+                configuration.research_step_timeout,
+                step,
+            )
+            return []
+    # Only now do the step's queries count as searched for the rest of the turn.
+    memo.merge(step_memo)
+    return result.get("documents") or []
+
+
+class _Speculation:
+    """Research plan and its first step, started before routing has decided.
+
+    Saves the planner's round trip (and the first retrieval) on questions
+    routed to research, at the cost of discarded work on the others; that
+    waste is exported as ``SPECULATIVE_WASTED_SECONDS``.
+    """
+
+    def __init__(self, state: AgentState, configuration: AgentConfiguration):
+        self.state = state
+        self.configuration = configuration
+        self.started = time.perf_counter()
+        self.research_started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.steps: Optional[list[str]] = None
+        self.memo = QueryMemo(threshold=configuration.query_dedup_threshold)
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self) -> tuple[list[str], list[Document]]:
+        self.steps = await _plan(self.state, self.configuration)
+        documents: list[Document] = []
+        if self.steps:
+            self.research_started = time.perf_counter()
+            documents = await _research_step(
+                self.steps[0], self.configuration, self.memo
+            )
+        self.finished = time.perf_counter()
+        return self.steps[1:], documents
+
+    async def result(self) -> tuple[list[str], list[Document]]:
+        """Remaining steps and the first step's documents."""
+        try:
+            out = await self.task
+        except Exception:
+            SPECULATIVE_RUNS.labels(outcome="failed").inc()
+            logger.warning("Speculative research failed; planning again", exc_info=True)
+            if self.steps is None:
+                self.steps = await _plan(self.state, self.configuration)
+            self.memo = QueryMemo(threshold=self.configuration.query_dedup_threshold)
+            return self.steps, []
+        SPECULATIVE_RUNS.labels(outcome="used").inc()
+        return out
+
+    async def cancel(self) -> None:
+        self.task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await self.task
+        end = self.finished or time.perf_counter()
+        research_started = self.research_started or end
+        SPECULATIVE_RUNS.labels(outcome="cancelled").inc()
+        SPECULATIVE_WASTED_SECONDS.labels(stage="plan").inc(
+            research_started - self.started
+        )
+        SPECULATIVE_WASTED_SECONDS.labels(stage="research").inc(end - research_started)
+
+
+async def conduct_research(
+    state: AgentState, *, config: RunnableConfig
+) -> dict[str, Any]:
+    configuration = AgentConfiguration.from_runnable_config(config)
     steps: list[str] = state.get("steps") or []  # type: ignore[assignment]
     if not steps:
         return {"documents": state.get("documents", []), "steps": []}
-
-    result = await researcher_graph.ainvoke({"question": steps[0]})
-    return {"documents": result["documents"], "steps": steps[1:]}
+    memo = QueryMemo(
+        state.get("searched_queries") or [],
+        threshold=configuration.query_dedup_threshold,
+    )
+
+    if configuration.research_mode == "parallel":
+        # Steps are independent searches merged by reduce_docs, so they can
+        # all run at once; latency becomes that of the slowest step.
+        semaphore = asyncio.Semaphore(max(1, configuration.research_max_concurrency))
+
+        async def run(step: str) -> list[Document]:
+            async with semaphore:
+                return await _research_step(step, configuration, memo)
+
+        # Let every step settle before failing the node, so none keeps
+        # running unawaited.
+        results = await asyncio.gather(
+            *(run(step) for step in steps), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return {
+            "documents": [d for docs in results for d in docs],
+            "steps": [],
+            "searched_queries": memo.queries,
+        }
+
+    documents = await _research_step(steps[0], configuration, memo)
+    return {
+        "documents": documents,
+        "steps": steps[1:],
+        "searched_queries": memo.queries,
+    }
 
 
 def check_finished(state: AgentState) -> Literal["respond", "conduct_research"]:
@@ -122,8 +330,7 @@ async def respond(
     context = format_docs(docs)
     prompt = configuration.response_system_prompt.format(context=context)
 
-    state_messages: list[BaseMessage] = state.get("messages", [])  # type: ignore[assignment]
-    messages = [{"role": "system", "content": prompt}] + state_messages
+    messages = prompt_messages(prompt, state, configuration.response_history_tokens)
 
     response = await model.ainvoke(messages)
     return {"messages": [response]}
@@ -1,8 +1,7 @@
-from typing import Annotated, Literal, TypedDict
+from typing import Annotated, Literal, NotRequired, TypedDict
 from langchain_core.documents import Document
 from langchain_core.messages import AnyMessage
-from langgraph.graph import add_messages
-
+from app.ai.shared.history import add_windowed_messages
 from app.ai.shared.state import reduce_docs
 from pydantic import BaseModel
 
@@ -13,10 +12,14 @@ class Router(BaseModel):
 
 
 class InputState(TypedDict):
-    messages: Annotated[list[AnyMessage], add_messages]
+    messages: Annotated[list[AnyMessage], add_windowed_messages]
+    # Rolling summary of the turns that no longer fit in ``messages``.
+    summary: NotRequired[str]
 
 
 class AgentState(InputState, total=False):
     router: Router
     steps: list[str]
     documents: Annotated[list[Document], reduce_docs]
+    # Search queries already run this turn; later steps skip repeats.
+    searched_queries: list[str]
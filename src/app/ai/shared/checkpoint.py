@@ -0,0 +1,306 @@
+"""LangGraph checkpointer on an async Redis client.
+
+Only the newest checkpoint of each thread is kept: a chat turn always
+resumes from the latest state, so earlier checkpoints would just be dead
+weight. Every value goes through the graph's serializer (msgpack by
+default) and is stored as ``<type>|<bytes>`` in one Redis hash per thread
+and namespace; every write refreshes the thread's TTL.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+
+def _frame(typed: tuple[str, bytes]) -> bytes:
+    kind, data = typed
+    return kind.encode() + b"|" + data
+
+
+def _unframe(raw: bytes) -> tuple[str, bytes]:
+    kind, _, data = raw.partition(b"|")
+    return kind.decode(), data
+
+
+def _str(raw: Any) -> str:
+    return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+
+class RedisCheckpointSaver(BaseCheckpointSaver[int]):
+    """Async-only checkpointer keeping the latest checkpoint per thread.
+
+    Keys, with ``ns`` the checkpoint namespace ("" for the root graph):
+
+    * ``graph:checkpoint:{thread}:{ns}`` hash: ``thread_id``,
+      ``checkpoint_ns``, ``id``, ``parent``, ``checkpoint`` and ``metadata``,
+      plus one ``ch:{channel}`` field per channel value. A put only rewrites
+      the channels that changed.
+    * ``graph:writes:{thread}:{ns}:{checkpoint_id}`` hash of pending writes,
+      dropped once the next checkpoint is stored.
+    * ``graph:thread:{thread}`` set of the thread's keys, for deletion.
+    """
+
+    CHECKPOINT_PREFIX = "graph:checkpoint:"
+
+    def __init__(
+        self,
+        redis: Any,
+        *,
+        ttl_seconds: Optional[int] = None,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def _checkpoint_key(cls, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{cls.CHECKPOINT_PREFIX}{thread_id}:{checkpoint_ns}"
+
+    @staticmethod
+    def _writes_key(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"graph:writes:{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    @staticmethod
+    def _thread_key(thread_id: str) -> str:
+        return f"graph:thread:{thread_id}"
+
+    def _touch(self, pipe: Any, thread_id: str, *keys: str) -> None:
+        thread_key = self._thread_key(thread_id)
+        pipe.sadd(thread_key, *keys)
+        if self.ttl_seconds:
+            for key in (*keys, thread_key):
+                pipe.expire(key, self.ttl_seconds)
+
+    async def ahas_thread(self, thread_id: str, checkpoint_ns: str = "") -> bool:
+        """Whether a checkpoint for ``thread_id`` is still stored."""
+        return bool(
+            await self.redis.exists(self._checkpoint_key(thread_id, checkpoint_ns))
+        )
+
+    async def aget_channel(
+        self, thread_id: str, channel: str, checkpoint_ns: str = ""
+    ) -> Optional[Any]:
+        """The latest checkpoint's value of ``channel``; None if not stored."""
+        raw = await self.redis.hget(
+            self._checkpoint_key(thread_id, checkpoint_ns), f"ch:{channel}"
+        )
+        return None if raw is None else self.serde.loads_typed(_unframe(raw))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+
+        data = {
+            _str(k): v
+            for k, v in (
+                await self.redis.hgetall(self._checkpoint_key(thread_id, checkpoint_ns))
+            ).items()
+        }
+        if not data:
+            return None
+        checkpoint_id = _str(data["id"])
+        requested = get_checkpoint_id(config)
+        if requested and requested != checkpoint_id:
+            return None
+
+        checkpoint: Checkpoint = self.serde.loads_typed(_unframe(data["checkpoint"]))
+        channel_values: dict[str, Any] = {}
+        for channel in checkpoint["channel_versions"]:
+            raw = data.get(f"ch:{channel}")
+            if raw is not None:
+                channel_values[channel] = self.serde.loads_typed(_unframe(raw))
+
+        raw_writes = await self.redis.hgetall(
+            self._writes_key(thread_id, checkpoint_ns, checkpoint_id)
+        )
+        writes = []
+        for field, raw in raw_writes.items():
+            task_id, _, idx = _str(field).rpartition(":")
+            channel, task_path, value = self.serde.loads_typed(_unframe(raw))
+            writes.append(
+                (writes_sort_key(task_path, task_id, int(idx)), channel, value)
+            )
+        writes.sort(key=lambda w: w[0])
+
+        parent = _str(data.get("parent") or b"")
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed(_unframe(data["metadata"])),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent,
+                    }
+                }
+                if parent
+                else None
+            ),
+            pending_writes=[(key[1], channel, value) for key, channel, value in writes],
+        )
+
+    async def _latest(
+        self, config: Optional[RunnableConfig]
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is not None:
+            found = await self.aget_tuple(config)
+            if found is not None:
+                yield found
+            return
+        async for key in self.redis.scan_iter(match=f"{self.CHECKPOINT_PREFIX}*"):
+            thread_id, checkpoint_ns = await self.redis.hmget(
+                key, "thread_id", "checkpoint_ns"
+            )
+            if thread_id is None:
+                continue
+            found = await self.aget_tuple(
+                {
+                    "configurable": {
+                        "thread_id": _str(thread_id),
+                        "checkpoint_ns": _str(checkpoint_ns or b""),
+                    }
+                }
+            )
+            if found is not None:
+                yield found
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """The latest checkpoint of the thread in ``config``, or of every
+        thread and namespace (found with SCAN) when ``config`` is None.
+
+        Earlier checkpoints are not kept, so each thread yields at most one.
+        """
+        if limit is not None and limit <= 0:
+            return
+        before_id = get_checkpoint_id(before) if before else None
+        yielded = 0
+        async for found in self._latest(config):
+            if before_id and found.checkpoint["id"] >= before_id:
+                continue
+            if filter and not all(
+                found.metadata.get(k) == v for k, v in filter.items()
+            ):
+                continue
+            yield found
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        parent_id = configurable.get("checkpoint_id")
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+
+        c = checkpoint.copy()
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        mapping: dict[str, Any] = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "id": checkpoint["id"],
+            "parent": parent_id or "",
+            "checkpoint": _frame(self.serde.dumps_typed(c)),
+            "metadata": _frame(
+                self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            ),
+        }
+        cleared: list[str] = []
+        for channel in new_versions:
+            if channel in values:
+                mapping[f"ch:{channel}"] = _frame(
+                    self.serde.dumps_typed(values[channel])
+                )
+            else:
+                cleared.append(f"ch:{channel}")
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            if cleared:
+                pipe.hdel(key, *cleared)
+            if parent_id:
+                # The parent's pending writes are folded into this checkpoint.
+                parent_writes = self._writes_key(thread_id, checkpoint_ns, parent_id)
+                pipe.delete(parent_writes)
+                pipe.srem(self._thread_key(thread_id), parent_writes)
+            self._touch(pipe, thread_id, key)
+            await pipe.execute()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        key = self._writes_key(
+            thread_id,
+            configurable.get("checkpoint_ns", ""),
+            configurable["checkpoint_id"],
+        )
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_id}:{write_idx}"
+                raw = _frame(self.serde.dumps_typed((channel, task_path, value)))
+                # Regular writes are idempotent per task; special ones
+                # (errors, interrupts) replace the previous value.
+                if write_idx >= 0:
+                    pipe.hsetnx(key, field, raw)
+                else:
+                    pipe.hset(key, field, raw)
+            self._touch(pipe, thread_id, key)
+            await pipe.execute()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        thread_key = self._thread_key(thread_id)
+        keys = [_str(k) for k in await self.redis.smembers(thread_key)]
+        await self.redis.delete(*keys, thread_key)
@@ -22,12 +22,14 @@ class BaseConfiguration:
     )
 
     retriever_provider: Annotated[
-        Literal["elastic-local", "elastic", "pinecone", "mongodb", "chroma"],
+        Literal[
+            "elastic-local", "elastic", "pinecone", "mongodb", "chroma", "local-numpy"
+        ],
         {"__template_metadata__": {"kind": "retriever"}},
     ] = field(
         default="elastic-local",
         metadata={
-            "description": "The vector store provider to use for retrieval. Options are 'elastic','chroma', 'pinecone', or 'mongodb'."
+            "description": "The vector store provider to use for retrieval. Options are 'elastic','chroma', 'pinecone', 'mongodb', or 'local-numpy'."
         },
     )
 
@@ -0,0 +1,325 @@
+"""Embedding wrappers layered over the provider clients from ``make_text_encoder``."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import CACHE_REQUESTS, EMBEDDING_BATCH_SIZE, EMBEDDING_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+_Pending = tuple[list[str], "asyncio.Future[list[list[float]]]", float]
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """Coalesce concurrent async embedding calls into batched provider calls.
+
+    Requests from every in-flight chat turn are queued for at most
+    ``max_wait_ms`` (or until ``max_batch_size`` texts are waiting), sent as
+    one ``aembed_documents`` call to ``inner`` and the vectors are handed
+    back to each caller. Sync calls go straight to ``inner``.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        *,
+        max_wait_ms: float = 5.0,
+        max_batch_size: int = 64,
+        name: str = "",
+    ) -> None:
+        self.inner = inner
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name or type(inner).__name__
+        self._pending: list[_Pending] = []
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks.
+        self._tasks: set[asyncio.Task] = set()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.inner.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[list[list[float]]] = loop.create_future()
+        self._pending.append((list(texts), fut, time.perf_counter()))
+        self._pending_texts += len(texts)
+
+        if self._pending_texts >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_texts = self._pending, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list[_Pending]) -> None:
+        now = time.perf_counter()
+        texts: list[str] = []
+        for item_texts, _, enqueued_at in batch:
+            texts.extend(item_texts)
+            EMBEDDING_QUEUE_WAIT.labels(encoder=self.name).observe(now - enqueued_at)
+        EMBEDDING_BATCH_SIZE.labels(encoder=self.name).observe(len(texts))
+
+        vectors: Optional[list[list[float]]] = None
+        error: Optional[Exception] = None
+        try:
+            vectors = await self.inner.aembed_documents(texts)
+        except Exception as e:
+            error = e
+        finally:
+            # Resolve every caller, also when cancelled, so none waits forever.
+            offset = 0
+            for item_texts, fut, _ in batch:
+                n = len(item_texts)
+                if fut.done():
+                    pass
+                elif vectors is not None:
+                    fut.set_result(vectors[offset : offset + n])
+                elif error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.cancel()
+                offset += n
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for content addressing: NFKC, collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    out = array("f")
+    out.frombytes(data)
+    return out.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed embedding cache in front of ``inner``.
+
+    Vectors are keyed by embedding model and normalized text and stored as
+    packed float32 bytes: first in a per-process LRU bounded by
+    ``max_bytes``, then (when ``redis`` is given) in Redis with a TTL so all
+    workers share them. Only texts missing from both tiers reach the
+    provider, once per distinct text. Redis errors degrade to a miss.
+    """
+
+    KEY_PREFIX = "emb:"
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        *,
+        model: str,
+        max_bytes: int = 32 * 1024 * 1024,
+        redis: Any = None,
+        ttl_seconds: int = 7 * 24 * 3600,
+    ) -> None:
+        self.inner = inner
+        self.model = model
+        self.max_bytes = max_bytes
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self._lru: OrderedDict[str, bytes] = OrderedDict()
+        self._lru_bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(
+            f"{self.model}\0{normalize_text(text)}".encode("utf-8")
+        ).hexdigest()
+        return self.KEY_PREFIX + digest
+
+    # ---- in-process tier ----
+    def _lru_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._lru.get(key)
+            if data is not None:
+                self._lru.move_to_end(key)
+            return data
+
+    def _lru_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self._lru_bytes -= len(old)
+            self._lru[key] = data
+            self._lru_bytes += len(data)
+            while self._lru_bytes > self.max_bytes:
+                _, evicted = self._lru.popitem(last=False)
+                self._lru_bytes -= len(evicted)
+
+    def _lookup_local(self, keys: list[str]) -> dict[str, bytes]:
+        found: dict[str, bytes] = {}
+        for k in keys:
+            data = self._lru_get(k)
+            if data is not None:
+                found[k] = data
+        CACHE_REQUESTS.labels(cache="embedding_lru", result="hit").inc(len(found))
+        CACHE_REQUESTS.labels(cache="embedding_lru", result="miss").inc(
+            len(set(keys)) - len(found)
+        )
+        return found
+
+    # ---- shared tier ----
+    async def _lookup_redis(self, keys: list[str]) -> dict[str, bytes]:
+        if self.redis is None or not keys:
+            return {}
+        try:
+            values = await self.redis.mget(keys)
+        except Exception:
+            logger.warning("Embedding cache read from Redis failed", exc_info=True)
+            return {}
+        found = {k: v for k, v in zip(keys, values) if v}
+        for k, v in found.items():
+            self._lru_put(k, v)
+        CACHE_REQUESTS.labels(cache="embedding_redis", result="hit").inc(len(found))
+        CACHE_REQUESTS.labels(cache="embedding_redis", result="miss").inc(
+            len(keys) - len(found)
+        )
+        return found
+
+    async def _store_redis(self, items: dict[str, bytes]) -> None:
+        if self.redis is None or not items:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for k, v in items.items():
+                pipe.set(k, v, ex=self.ttl_seconds)
+            await pipe.execute()
+        except Exception:
+            logger.warning("Embedding cache write to Redis failed", exc_info=True)
+
+    # ---- Embeddings interface ----
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(t) for t in texts]
+        found = self._lookup_local(keys)
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            for k, v in zip(missing, vectors):
+                found[k] = pack_vector(v)
+                self._lru_put(k, found[k])
+        return [unpack_vector(found[k]) for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(t) for t in texts]
+        found = self._lookup_local(keys)
+        remaining = list(dict.fromkeys(k for k in keys if k not in found))
+        found.update(await self._lookup_redis(remaining))
+
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vectors = await self.inner.aembed_documents(list(missing.values()))
+            fresh = {k: pack_vector(v) for k, v in zip(missing, vectors)}
+            for k, data in fresh.items():
+                self._lru_put(k, data)
+            found.update(fresh)
+            await self._store_redis(fresh)
+        return [unpack_vector(found[k]) for k in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic, offline embeddings via feature hashing.
+
+    Each lowercase word token and adjacent word pair is hashed (blake2b, so
+    results are stable across processes, unlike ``hash()``) to a bucket and
+    a sign; the signed counts are L2-normalized. Texts sharing words get
+    similar vectors, which is enough to exercise ingest, indexing and
+    retrieval end to end without network access.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        if dim <= 0:
+            raise ValueError("Hash embedding dimension must be positive")
+        self.dim = dim
+        self._features: dict[str, tuple[int, float]] = {}
+
+    def _feature(self, token: str) -> tuple[int, float]:
+        hit = self._features.get(token)
+        if hit is None:
+            h = int.from_bytes(
+                hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            hit = (h % self.dim, 1.0 if (h >> 63) & 1 else -1.0)
+            if len(self._features) < 1_000_000:
+                self._features[token] = hit
+        return hit
+
+    def _embed_matrix(self, texts: list[str]) -> np.ndarray:
+        rows: list[int] = []
+        cols: list[int] = []
+        signs: list[float] = []
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for token in tokens:
+                col, sign = self._feature(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(out, (np.asarray(rows), np.asarray(cols)), np.asarray(signs))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed_matrix([text])[0].tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
@@ -0,0 +1,405 @@
+"""Offline chat model providers for load tests: ``fake/``, ``replay/`` and ``record/``.
+
+``fake/<name>[?options]`` answers from a script: structured calls get a fixed
+``Router``/``Plan``/``Response`` and plain calls stream a canned answer.
+``record/<provider>/<model>`` wraps the real model and saves every response
+to the cassette file (``CHAT_CASSETTE``); ``replay/<provider>/<model>`` serves
+them back from it. Fake and replay models accept ``first_token_ms`` and
+``token_ms`` options to simulate provider latency, e.g.
+``fake/default?route=langchain&first_token_ms=300&token_ms=15``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional
+from urllib.parse import parse_qs
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    convert_to_messages,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.config import settings
+
+OFFLINE_CHAT_PROVIDERS = frozenset({"fake", "replay", "record"})
+
+DEFAULT_ANSWER = (
+    "LangChain lets you compose prompts, models and retrievers into chains. "
+    "Use a retriever to fetch relevant documents and pass them to the model "
+    "as context [1]."
+)
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text) or [""]
+
+
+def _schema_fields(schema: Any) -> set[str]:
+    fields = getattr(schema, "model_fields", None)
+    if fields is None:
+        fields = getattr(schema, "__annotations__", {})
+    return set(fields)
+
+
+def _coerce(schema: Any, value: Any) -> Any:
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_validate(value)
+    return value
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return value
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else str(part.get("text", "")) for part in content
+    )
+
+
+def _prompt_key(model: str, kind: str, messages: Any) -> str:
+    msgs = convert_to_messages(messages)
+    payload = json.dumps(
+        [model, kind, [(m.type, m.content) for m in msgs]],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _LatencyMixin(BaseChatModel):
+    """Streams a text answer token by token with simulated provider latency."""
+
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+
+    def _answer_for(self, messages: list[BaseMessage]) -> str:
+        raise NotImplementedError
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._answer_for(messages)
+        time.sleep(self.first_token_delay + self.token_delay * len(_tokens(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._answer_for(messages)
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(_tokens(text)):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._answer_for(messages)
+        await asyncio.sleep(self.first_token_delay)
+        for i, token in enumerate(_tokens(text)):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        parts = [
+            chunk.message.content
+            async for chunk in self._astream(messages, stop, run_manager, **kwargs)
+        ]
+        text = "".join(str(p) for p in parts)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class ScriptedChatModel(_LatencyMixin):
+    """Chat model that answers from a fixed script, for load tests."""
+
+    answer: str = DEFAULT_ANSWER
+    route: str = "langchain"
+    steps: list[str] = Field(
+        default_factory=lambda: ["Look up how retrievers work in LangChain"]
+    )
+    queries: list[str] = Field(
+        default_factory=lambda: [
+            "langchain retriever",
+            "vector store as_retriever",
+            "retrieval chain example",
+        ]
+    )
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _answer_for(self, messages: list[BaseMessage]) -> str:
+        return self.answer
+
+    def _structured(self, schema: Any) -> Any:
+        fields = _schema_fields(schema)
+        if "steps" in fields:
+            value: Any = {"steps": list(self.steps)}
+        elif "queries" in fields:
+            value = {"queries": list(self.queries)}
+        elif {"type", "logic"} <= fields:
+            value = {"type": self.route, "logic": "Scripted route."}
+        else:
+            raise ValueError(f"No scripted output for schema {schema!r}")
+        return _coerce(schema, value)
+
+    def with_structured_output(  # type: ignore[override]
+        self, schema: Any, **kwargs: Any
+    ) -> Any:
+        def call(_: Any) -> Any:
+            time.sleep(self.first_token_delay)
+            return self._structured(schema)
+
+        async def acall(_: Any) -> Any:
+            await asyncio.sleep(self.first_token_delay)
+            return self._structured(schema)
+
+        return RunnableLambda(call, afunc=acall)
+
+
+class Cassette:
+    """JSON file of recorded model responses keyed by prompt hash."""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: dict[str, Any] = {}
+        if self.path.exists():
+            self._data = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def get(self, key: str) -> Any:
+        try:
+            return self._data[key]
+        except KeyError:
+            raise KeyError(
+                f"No recorded response for prompt {key[:12]} in {self.path}; "
+                "record it first with a record/<provider>/<model> model."
+            ) from None
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(
+                json.dumps(self._data, ensure_ascii=False, indent=1), encoding="utf-8"
+            )
+            os.replace(tmp, self.path)
+
+
+_cassettes: dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: Optional[str] = None) -> Cassette:
+    path = path or settings.chat_cassette_path
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+class ReplayChatModel(_LatencyMixin):
+    """Serves responses recorded by ``RecordingChatModel``."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str
+    cassette: Cassette
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _answer_for(self, messages: list[BaseMessage]) -> str:
+        return str(self.cassette.get(_prompt_key(self.model_name, "text", messages)))
+
+    def with_structured_output(  # type: ignore[override]
+        self, schema: Any, **kwargs: Any
+    ) -> Any:
+        kind = f"structured:{getattr(schema, '__name__', schema)}"
+
+        def call(messages: Any) -> Any:
+            time.sleep(self.first_token_delay)
+            key = _prompt_key(self.model_name, kind, messages)
+            return _coerce(schema, self.cassette.get(key))
+
+        async def acall(messages: Any) -> Any:
+            await asyncio.sleep(self.first_token_delay)
+            key = _prompt_key(self.model_name, kind, messages)
+            return _coerce(schema, self.cassette.get(key))
+
+        return RunnableLambda(call, afunc=acall)
+
+
+class RecordingChatModel(BaseChatModel):
+    """Passes calls through to ``inner`` and saves each response to a cassette."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    model_name: str
+    cassette: Cassette
+
+    @property
+    def _llm_type(self) -> str:
+        return "record"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        self.cassette.put(
+            _prompt_key(self.model_name, "text", messages), _text(message)
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        parts: list[str] = []
+        async for message in self.inner.astream(messages, stop=stop, **kwargs):
+            token = _text(message)
+            parts.append(token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        self.cassette.put(
+            _prompt_key(self.model_name, "text", messages), "".join(parts)
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        self.cassette.put(
+            _prompt_key(self.model_name, "text", messages), _text(message)
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def with_structured_output(  # type: ignore[override]
+        self, schema: Any, **kwargs: Any
+    ) -> Any:
+        kind = f"structured:{getattr(schema, '__name__', schema)}"
+        structured = self.inner.with_structured_output(schema, **kwargs)
+
+        def call(messages: Any) -> Any:
+            out = structured.invoke(messages)
+            key = _prompt_key(self.model_name, kind, messages)
+            self.cassette.put(key, _jsonable(out))
+            return out
+
+        async def acall(messages: Any) -> Any:
+            out = await structured.ainvoke(messages)
+            key = _prompt_key(self.model_name, kind, messages)
+            self.cassette.put(key, _jsonable(out))
+            return out
+
+        return RunnableLambda(call, afunc=acall)
+
+
+def _latency_options(options: dict[str, Any]) -> dict[str, float]:
+    out: dict[str, float] = {}
+    if "first_token_ms" in options:
+        out["first_token_delay"] = float(options.pop("first_token_ms")) / 1000.0
+    if "token_ms" in options:
+        out["token_delay"] = float(options.pop("token_ms")) / 1000.0
+    return out
+
+
+def make_offline_chat_model(provider: str, spec: str, **params: Any) -> BaseChatModel:
+    """Build a ``fake``/``replay``/``record`` model from the part after the prefix."""
+    name, _, query = spec.partition("?")
+    options: dict[str, Any] = {k: v[-1] for k, v in parse_qs(query).items()}
+    options.update(params)
+
+    match provider:
+        case "fake":
+            latency = _latency_options(options)
+            script = {k: options[k] for k in ("answer", "route") if k in options}
+            return ScriptedChatModel(**script, **latency)
+        case "replay":
+            latency = _latency_options(options)
+            return ReplayChatModel(
+                model_name=name,
+                cassette=get_cassette(options.get("cassette")),
+                **latency,
+            )
+        case "record":
+            from app.ai.shared.utils import load_chat_model
+
+            cassette = get_cassette(options.pop("cassette", None))
+            return RecordingChatModel(
+                inner=load_chat_model(name, **options),
+                model_name=name,
+                cassette=cassette,
+            )
+        case _:
+            raise ValueError(f"Unsupported offline chat provider: {provider}")
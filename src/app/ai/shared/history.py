@@ -0,0 +1,74 @@
+"""Token-budgeted views of the conversation history.
+
+The newest turns are sent verbatim up to a token budget; anything older
+reaches the model only through the rolling ``summary`` kept on the
+conversation (see ``app.services.history_service``).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, BaseMessage, convert_to_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph import add_messages
+
+from app.core.config import settings
+
+
+def history_start(messages: Sequence[Any], max_tokens: Optional[int]) -> int:
+    """Index of the oldest message in the newest window within ``max_tokens``.
+
+    ``messages`` are chronological message-likes (``BaseMessage`` or
+    ``(role, text)`` tuples). The window starts on a user turn so the model
+    never sees an answer without its question, and always keeps the last
+    message even if it alone exceeds the budget. ``None`` keeps everything.
+    """
+    if max_tokens is None or not messages:
+        return 0
+
+    converted: list[BaseMessage] = convert_to_messages(messages)
+    start = len(converted) - 1
+    used = count_tokens_approximately([converted[start]])
+    while start > 0:
+        cost = count_tokens_approximately([converted[start - 1]])
+        if used + cost > max_tokens:
+            break
+        used += cost
+        start -= 1
+
+    for i in range(start, len(converted)):
+        if converted[i].type == "human":
+            return i
+    return start
+
+
+def trim_history(messages: Sequence[Any], max_tokens: Optional[int]) -> list[Any]:
+    return list(messages[history_start(messages, max_tokens) :])
+
+
+def add_windowed_messages(left: Any, right: Any) -> list[AnyMessage]:
+    """``add_messages``, then drop the turns beyond HISTORY_MAX_TOKENS.
+
+    Keeps checkpointed state bounded however long the conversation runs.
+    """
+    return trim_history(add_messages(left, right), settings.history_max_tokens)
+
+
+def with_summary(system_prompt: str, summary: Optional[str]) -> str:
+    if not summary:
+        return system_prompt
+    return (
+        f"{system_prompt}\n\n"
+        "Summary of the earlier part of this conversation:\n"
+        f"<conversation_summary>\n{summary}\n</conversation_summary>"
+    )
+
+
+def prompt_messages(
+    system_prompt: str, state: Any, max_tokens: Optional[int]
+) -> list[Any]:
+    """System prompt (plus the state's summary) followed by the windowed history."""
+    return [
+        {"role": "system", "content": with_summary(system_prompt, state.get("summary"))}
+    ] + trim_history(state.get("messages", []), max_tokens)
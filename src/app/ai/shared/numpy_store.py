@@ -0,0 +1,379 @@
+"""In-process vector store holding all chunk embeddings in one NumPy matrix."""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Iterable, NamedTuple, Optional
+
+import numpy as np
+from numpy.lib import format as npformat
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _doc_line(doc: Document) -> bytes:
+    row = {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+    return (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _replace(path: Path, write: Callable[[Any], None]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Snapshot(NamedTuple):
+    """What a search reads: the first ``len(matrix)`` rows and their docs.
+
+    ``docs`` is append-only and extended before a snapshot covering the new
+    rows is published, so every row index is valid in it. Replacing rows
+    builds a new matrix and a new list instead.
+    """
+
+    matrix: np.ndarray
+    docs: list[Document]
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine search over a contiguous float32 matrix.
+
+    Rows are unit-normalized on insert, so a query is one matrix-vector
+    product followed by ``argpartition`` for the top k. With ``path`` set the
+    matrix is saved as ``vectors.npy`` (memory-mapped on load, so the OS page
+    cache is shared between workers) and the documents as ``docs.jsonl``.
+
+    Inserts append to both files and then rewrite the fixed-size ``.npy``
+    header with the new row count; that header is the commit point; rows or
+    lines past it are dropped on load. Adding a document whose id is already
+    stored replaces its row instead, which rewrites both files, so
+    re-ingesting the same chunks does not duplicate them.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None) -> None:
+        self._embedding = embedding
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._docs: list[Document] = []
+        # Row of each stored document id.
+        self._rows: dict[str, int] = {}
+        self._snapshot = _Snapshot(np.empty((0, 0), dtype=np.float32), self._docs)
+        # In-memory growth buffer (no ``path``): rows past the count are spare.
+        self._buffer: Optional[np.ndarray] = None
+        # Committed length of docs.jsonl.
+        self._docs_bytes = 0
+        if self.path is not None:
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self._snapshot.matrix)
+
+    # ---- persistence ----
+    def _load(self) -> None:
+        assert self.path is not None
+        vectors = self.path / VECTORS_FILE
+        docs_path = self.path / DOCS_FILE
+        if not vectors.exists() or not docs_path.exists():
+            return
+        matrix = np.load(vectors, mmap_mode="r")
+
+        docs: list[Document] = []
+        offset = 0
+        with docs_path.open("rb") as f:
+            for line in f:
+                if len(docs) == len(matrix) or not line.endswith(b"\n"):
+                    break
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    break
+                docs.append(
+                    Document(
+                        id=row["id"],
+                        page_content=row["page_content"],
+                        metadata=row.get("metadata") or {},
+                    )
+                )
+                offset += len(line)
+
+        if len(docs) < len(matrix):
+            logger.warning(
+                "%s has %d rows but only %d documents; truncating",
+                self.path,
+                len(matrix),
+                len(docs),
+            )
+            self._write_all(np.ascontiguousarray(matrix[: len(docs)]), docs)
+            matrix = np.load(vectors, mmap_mode="r")
+            offset = sum(len(_doc_line(d)) for d in docs)
+
+        self._docs.extend(docs)
+        self._rows = {d.id: i for i, d in enumerate(docs)}
+        self._docs_bytes = offset
+        self._snapshot = _Snapshot(matrix, self._docs)
+
+    def _write_all(self, matrix: np.ndarray, docs: list[Document]) -> None:
+        assert self.path is not None
+        self.path.mkdir(parents=True, exist_ok=True)
+        _replace(self.path / DOCS_FILE, lambda f: f.writelines(map(_doc_line, docs)))
+        _replace(self.path / VECTORS_FILE, lambda f: np.save(f, matrix))
+
+    def _append_to_disk(self, rows: np.ndarray, docs: list[Document]) -> np.ndarray:
+        """Persist ``rows`` after the committed ones; returns the new mmap."""
+        assert self.path is not None
+        vectors = self.path / VECTORS_FILE
+        count = len(self._snapshot.matrix)
+        if count == 0:
+            self._write_all(rows, docs)
+            self._docs_bytes = sum(len(_doc_line(d)) for d in docs)
+            return np.load(vectors, mmap_mode="r")
+
+        dim = rows.shape[1]
+        with vectors.open("r+b") as vf, (self.path / DOCS_FILE).open("r+b") as df:
+            npformat.read_magic(vf)
+            npformat.read_array_header_1_0(vf)
+            header_end = vf.tell()
+            # Drop anything a failed insert left past the committed data.
+            vf.seek(header_end + count * dim * rows.itemsize)
+            vf.truncate()
+            vf.write(rows.tobytes())
+            df.seek(self._docs_bytes)
+            df.truncate()
+            lines = b"".join(map(_doc_line, docs))
+            df.write(lines)
+            for f in (vf, df):
+                f.flush()
+                os.fsync(f.fileno())
+            # The header is padded for growth, so its size never changes.
+            header = io.BytesIO()
+            npformat.write_array_header_1_0(
+                header,
+                {
+                    "descr": npformat.dtype_to_descr(rows.dtype),
+                    "fortran_order": False,
+                    "shape": (count + len(rows), dim),
+                },
+            )
+            if header.tell() != header_end:
+                # The appended rows stay uncommitted and are dropped on load.
+                raise RuntimeError(
+                    f"{vectors}: the .npy header has no room for "
+                    f"{count + len(rows)} rows; rebuild the index"
+                )
+            vf.seek(0)
+            vf.write(header.getvalue())
+            vf.flush()
+            os.fsync(vf.fileno())
+        self._docs_bytes += len(lines)
+        return np.load(vectors, mmap_mode="r")
+
+    def _append_in_memory(self, rows: np.ndarray) -> np.ndarray:
+        count = len(self._snapshot.matrix)
+        needed = count + len(rows)
+        buffer = self._buffer
+        if buffer is None or len(buffer) < needed:
+            # Doubling keeps a run of small inserts linear overall.
+            buffer = np.empty((max(needed, 2 * count, 64), rows.shape[1]), np.float32)
+            if count:
+                buffer[:count] = self._snapshot.matrix
+            self._buffer = buffer
+        # Published snapshots only view rows below ``count``: never rewritten.
+        buffer[count:needed] = rows
+        return buffer[:needed]
+
+    def _replace_rows(
+        self,
+        positions: list[int],
+        replaced: np.ndarray,
+        added: np.ndarray,
+        docs: list[Document],
+    ) -> np.ndarray:
+        """A new matrix with ``replaced`` at ``positions`` and ``added`` after.
+
+        ``docs`` already lists the documents of the new matrix.
+        """
+        matrix = np.concatenate([self._snapshot.matrix, added])
+        matrix[positions] = replaced
+        if self.path is None:
+            self._buffer = matrix
+            return matrix
+        self._write_all(matrix, docs)
+        self._docs_bytes = sum(len(_doc_line(d)) for d in docs)
+        return np.load(self.path / VECTORS_FILE, mmap_mode="r")
+
+    # ---- writes ----
+    def add_vectors(
+        self,
+        vectors: list[list[float]],
+        documents: list[Document],
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        ids = list(ids) if ids else [d.id or str(uuid.uuid4()) for d in documents]
+        if not ids:
+            return []
+        rows = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        # A repeated id within the batch keeps its last document.
+        last = {doc_id: j for j, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            rows = rows[list(last.values())]
+        docs = [
+            Document(
+                id=doc_id,
+                page_content=documents[j].page_content,
+                metadata=dict(documents[j].metadata),
+            )
+            for doc_id, j in last.items()
+        ]
+        with self._lock:
+            current = self._snapshot.matrix
+            if len(current) and current.shape[1] != rows.shape[1]:
+                raise ValueError(
+                    f"Expected {current.shape[1]}-dimensional vectors, "
+                    f"got {rows.shape[1]}"
+                )
+            existing = [j for j, d in enumerate(docs) if d.id in self._rows]
+            if existing:
+                new = [j for j, d in enumerate(docs) if d.id not in self._rows]
+                positions = [self._rows[docs[j].id] for j in existing]
+                # Searches may hold the current list: update a copy.
+                all_docs = list(self._docs)
+                for position, j in zip(positions, existing):
+                    all_docs[position] = docs[j]
+                docs = [docs[j] for j in new]
+                all_docs.extend(docs)
+                matrix = self._replace_rows(
+                    positions, rows[existing], rows[new], all_docs
+                )
+                self._docs = all_docs
+            else:
+                if self.path is not None:
+                    matrix = self._append_to_disk(rows, docs)
+                else:
+                    matrix = self._append_in_memory(rows)
+                self._docs.extend(docs)
+            first = len(self._docs) - len(docs)
+            for offset, d in enumerate(docs):
+                self._rows[d.id] = first + offset
+            self._snapshot = _Snapshot(matrix, self._docs)
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        return self.add_vectors(self._embedding.embed_documents(texts), docs, ids)
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        vectors = await self._embedding.aembed_documents(texts)
+        return self.add_vectors(vectors, docs, ids)
+
+    # ---- search ----
+    def _top_k(self, embedding: list[float], k: int) -> list[tuple[Document, float]]:
+        matrix, docs = self._snapshot
+        if matrix is None or len(matrix) == 0 or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+        scores = matrix @ query
+        k = min(k, len(scores))
+        if k < len(scores):
+            idx = np.argpartition(scores, -k)[-k:]
+        else:
+            idx = np.arange(len(scores))
+        idx = idx[np.argsort(scores[idx])[::-1]]
+        return [(docs[i], float(scores[i])) for i in idx]
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self._top_k(embedding, k)]
+
+    async def asimilarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        # Sub-millisecond for typical index sizes: cheaper than a thread hop.
+        return self.similarity_search_by_vector(embedding, k, **kwargs)
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self._top_k(self._embedding.embed_query(query), k)
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return [
+            (d, (s + 1.0) / 2.0)
+            for d, s in self._top_k(self._embedding.embed_query(query), k)
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return self.similarity_search_by_vector(
+            self._embedding.embed_query(query), k, **kwargs
+        )
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        embedding = await self._embedding.aembed_query(query)
+        return self.similarity_search_by_vector(embedding, k, **kwargs)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, path=path)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
@@ -1,10 +1,16 @@
+import asyncio
+import functools
+import inspect
+import logging
 import os
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Generator, Optional
 
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.runnables import RunnableConfig
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
 from langchain_chroma import Chroma
 
 try:
@@ -15,6 +21,17 @@ except Exception:  # pragma: no cover
 
 
 from app.ai.shared.configuration import BaseConfiguration
+from app.ai.shared.embeddings import (
+    CachedEmbeddings,
+    HashingEmbeddings,
+    MicroBatchingEmbeddings,
+)
+from app.ai.shared.numpy_store import NumpyVectorStore
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.core.redis_client import rds
+
+logger = logging.getLogger(__name__)
 
 
 def make_text_encoder(model: str) -> Embeddings:
@@ -28,29 +45,29 @@ def make_text_encoder(model: str) -> Embeddings:
             if CohereEmbeddings is None:
                 raise RuntimeError("Cohere embeddings provider not installed")
             return CohereEmbeddings(model=model)  # type: ignore
+        case "hash":
+            # Offline and deterministic, for benchmarks and tests: "hash/<dim>".
+            return HashingEmbeddings(dim=int(model))
         case _:
             raise ValueError(f"Unsupported embedding provider: {provider}")
 
 
-@contextmanager
-def make_chroma_retriever(
-    configuration, embedding_model
-) -> Generator[VectorStoreRetriever, None, None]:
+def make_chroma_store(
+    configuration: BaseConfiguration, embedding_model: Embeddings
+) -> VectorStore:
     persist_dir = os.environ.get("CHROMA_PERSIST_DIR", "./chroma_db")
     collection = os.environ.get("CHROMA_COLLECTION", "langchain_index")
 
-    vstore = Chroma(
+    return Chroma(
         collection_name=collection,
         persist_directory=persist_dir,
         embedding_function=embedding_model,
     )
-    yield vstore.as_retriever(search_kwargs=configuration.search_kwargs)
 
 
-@contextmanager
-def make_elastic_retriever(
+def make_elastic_store(
     configuration: BaseConfiguration, embedding_model: Embeddings
-):
+) -> VectorStore:
 
     connection_options = {}
     provider = configuration.retriever_provider
@@ -71,41 +88,208 @@ def make_elastic_retriever(
     except Exception:
         raise RuntimeError("Elasticsearch store provider not installed")
 
-    vstore = ElasticsearchStore(
+    return ElasticsearchStore(
         es_url=os.environ["ELASTICSEARCH_URL"],
         index_name="langchain_index",
         embedding=embedding_model,
         **connection_options,
     )
-    yield vstore.as_retriever(search_kwargs=configuration.search_kwargs)
 
 
-@contextmanager
-def make_pinecone_retriever(
+def make_pinecone_store(
     configuration: BaseConfiguration, embedding_model: Embeddings
-) -> Generator[VectorStoreRetriever, None, None]:
+) -> VectorStore:
     """Configure this agent to connect to a specific pinecone index."""
     from langchain_pinecone import PineconeVectorStore  # type: ignore[import]
 
-    vstore = PineconeVectorStore.from_existing_index(
+    return PineconeVectorStore.from_existing_index(
         os.environ["PINECONE_INDEX_NAME"], embedding=embedding_model
     )
-    yield vstore.as_retriever(search_kwargs=configuration.search_kwargs)
 
 
-@contextmanager
-def make_mongodb_retriever(
+def make_mongodb_store(
     configuration: BaseConfiguration, embedding_model: Embeddings
-) -> Generator[VectorStoreRetriever, None, None]:
+) -> VectorStore:
     """Configure this agent to connect to a specific MongoDB Atlas index & namespaces."""
     from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch  # type: ignore[import]
 
-    vstore = MongoDBAtlasVectorSearch.from_connection_string(
+    return MongoDBAtlasVectorSearch.from_connection_string(
         os.environ["MONGODB_URI"],
         namespace="langgraph_retrieval_agent.default",
         embedding=embedding_model,
     )
-    yield vstore.as_retriever(search_kwargs=configuration.search_kwargs)
+
+
+def make_numpy_store(
+    configuration: BaseConfiguration, embedding_model: Embeddings
+) -> VectorStore:
+    """In-process store; persisted (and memory-mapped) under NUMPY_STORE_DIR."""
+    path = os.environ.get("NUMPY_STORE_DIR", "./numpy_index")
+    return NumpyVectorStore(embedding_model, path=path or None)
+
+
+StoreFactory = Callable[[BaseConfiguration, Embeddings], VectorStore]
+
+
+def _store_factory(provider: str) -> tuple[StoreFactory, str]:
+    """Return the store constructor and the index it points at for a provider."""
+    match provider:
+        case "elastic" | "elastic-local":
+            return make_elastic_store, "langchain_index"
+        case "pinecone":
+            return make_pinecone_store, os.environ.get("PINECONE_INDEX_NAME", "")
+        case "mongodb":
+            return make_mongodb_store, "langgraph_retrieval_agent.default"
+        case "local-numpy":
+            return make_numpy_store, os.environ.get("NUMPY_STORE_DIR", "./numpy_index")
+        case "chroma":
+            return make_chroma_store, os.environ.get(
+                "CHROMA_COLLECTION", "langchain_index"
+            )
+        case _:
+            raise ValueError(
+                "Unrecognized retriever_provider in configuration. "
+                f"Expected one of: {', '.join(BaseConfiguration.__annotations__['retriever_provider'].__args__)}\n"
+                f"Got: {provider}"
+            )
+
+
+# Where provider clients keep their HTTP clients: SDK clients (or, for
+# OpenAIEmbeddings, SDK resources) and any httpx clients passed in.
+_HTTP_CLIENT_ATTRS = ("client", "async_client", "http_client", "http_async_client")
+
+
+def _close_method(client: Any) -> Optional[Callable[[], Any]]:
+    """``client``'s close method; an SDK resource is closed via its root client."""
+    for target in (client, getattr(client, "_client", None)):
+        close = getattr(target, "aclose", None) or getattr(target, "close", None)
+        if callable(close) and hasattr(close, "__self__"):
+            return close
+    return None
+
+
+class RetrieverPool:
+    """Long-lived embedding clients and vector stores shared across requests.
+
+    Embedding clients are keyed by model name, vector stores by
+    (provider, index, embedding model). Building either one opens HTTP
+    clients, so each is built once per process and closed by ``aclose``
+    on app shutdown.
+
+    Vector stores get the bare client: they embed documents on ingest,
+    which would only flood the query cache. The micro-batcher and cache
+    wrap the same client for the query path (``get_text_encoder``).
+    """
+
+    def __init__(self) -> None:
+        self._document_encoders: dict[str, Embeddings] = {}
+        self._encoders: dict[str, Embeddings] = {}
+        self._stores: dict[tuple[str, str, str], VectorStore] = {}
+        # Re-entrant: building a store builds (or fetches) its encoder.
+        self._lock = threading.RLock()
+
+    def _get_or_build(
+        self, cache: str, pool: dict, key: Any, build: Callable[[], Any]
+    ) -> Any:
+        item = pool.get(key)
+        if item is None:
+            with self._lock:
+                item = pool.get(key)
+                if item is None:
+                    logger.info("Creating %s for %s", cache, key)
+                    item = pool[key] = build()
+                    CACHE_REQUESTS.labels(cache=cache, result="miss").inc()
+                    return item
+        CACHE_REQUESTS.labels(cache=cache, result="hit").inc()
+        return item
+
+    def get_document_encoder(self, model: str) -> Embeddings:
+        return self._get_or_build(
+            "document_embeddings",
+            self._document_encoders,
+            model,
+            lambda: make_text_encoder(model),
+        )
+
+    def get_text_encoder(self, model: str) -> Embeddings:
+        return self._get_or_build(
+            "embeddings",
+            self._encoders,
+            model,
+            lambda: self._wrap_for_queries(model, self.get_document_encoder(model)),
+        )
+
+    @staticmethod
+    def _wrap_for_queries(model: str, encoder: Embeddings) -> Embeddings:
+        if isinstance(encoder, HashingEmbeddings):
+            # Computed locally: batching and caching would only add overhead.
+            return encoder
+        if settings.embedding_batch_max_wait_ms > 0:
+            encoder = MicroBatchingEmbeddings(
+                encoder,
+                max_wait_ms=settings.embedding_batch_max_wait_ms,
+                max_batch_size=settings.embedding_batch_max_size,
+                name=model,
+            )
+        if settings.embedding_cache_max_bytes > 0:
+            encoder = CachedEmbeddings(
+                encoder,
+                model=model,
+                max_bytes=settings.embedding_cache_max_bytes,
+                redis=rds if settings.embedding_cache_ttl_seconds > 0 else None,
+                ttl_seconds=settings.embedding_cache_ttl_seconds,
+            )
+        return encoder
+
+    def get_vector_store(self, configuration: BaseConfiguration) -> VectorStore:
+        factory, index = _store_factory(configuration.retriever_provider)
+        key = (configuration.retriever_provider, index, configuration.embedding_model)
+        return self._get_or_build(
+            "vector_store",
+            self._stores,
+            key,
+            lambda: factory(
+                configuration,
+                self.get_document_encoder(configuration.embedding_model),
+            ),
+        )
+
+    async def aclose(self) -> None:
+        with self._lock:
+            # Query encoders only wrap the document encoders closed here.
+            owners = list(self._stores.values()) + list(
+                self._document_encoders.values()
+            )
+            self._stores.clear()
+            self._encoders.clear()
+            self._document_encoders.clear()
+
+        closed: set[int] = set()
+        for owner in owners:
+            while hasattr(owner, "inner"):
+                owner = owner.inner
+            for attr in _HTTP_CLIENT_ATTRS:
+                client = getattr(owner, attr, None)
+                if client is None:
+                    continue
+                close = _close_method(client)
+                if close is None or id(close.__self__) in closed:
+                    continue
+                closed.add(id(close.__self__))
+                try:
+                    result = close()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    logger.warning("Failed to close %s.%s", type(owner).__name__, attr)
+
+
+retriever_pool = RetrieverPool()
+
+
+def get_text_encoder(model: str) -> Embeddings:
+    """Return the shared (batched, cached) query embedding client for ``model``."""
+    return retriever_pool.get_text_encoder(model)
 
 
 @contextmanager
@@ -114,26 +298,74 @@ def make_retriever(
 ) -> Generator[VectorStoreRetriever, None, None]:
     """Create a retriever for the agent, based on the current configuration."""
     configuration = BaseConfiguration.from_runnable_config(config)
-    embedding_model = make_text_encoder(configuration.embedding_model)
-    match configuration.retriever_provider:
-        case "elastic" | "elastic-local":
-            with make_elastic_retriever(configuration, embedding_model) as retriever:
-                yield retriever
+    vstore = retriever_pool.get_vector_store(configuration)
+    yield vstore.as_retriever(search_kwargs=configuration.search_kwargs)
 
-        case "pinecone":
-            with make_pinecone_retriever(configuration, embedding_model) as retriever:
-                yield retriever
 
-        case "mongodb":
-            with make_mongodb_retriever(configuration, embedding_model) as retriever:
-                yield retriever
-        case "chroma":
-            with make_chroma_retriever(configuration, embedding_model) as r:
-                yield r
+async def aembed_queries(
+    config: RunnableConfig, queries: list[str]
+) -> list[list[float]]:
+    """Embed all ``queries`` with a single batched provider call."""
+    if not queries:
+        return []
+    configuration = BaseConfiguration.from_runnable_config(config)
+    encoder = retriever_pool.get_text_encoder(configuration.embedding_model)
+    return await encoder.aembed_documents(queries)
 
-        case _:
-            raise ValueError(
-                "Unrecognized retriever_provider in configuration. "
-                f"Expected one of: {', '.join(BaseConfiguration.__annotations__['retriever_provider'].__args__)}\n"
-                f"Got: {configuration.retriever_provider}"
+
+@functools.lru_cache(maxsize=None)
+def _vector_search_kind(store_type: type[VectorStore]) -> Optional[str]:
+    """How ``store_type`` searches by a precomputed vector, if it can.
+
+    "native" stores implement ``similarity_search_by_vector``; "scored" ones
+    (``ElasticsearchStore``) only have the ``..._with_relevance_scores``
+    variant.
+    """
+    for name in ("similarity_search_by_vector", "asimilarity_search_by_vector"):
+        if getattr(store_type, name) is not getattr(VectorStore, name):
+            return "native"
+    if hasattr(store_type, "similarity_search_by_vector_with_relevance_scores"):
+        return "scored"
+    return None
+
+
+def searches_by_vector(config: RunnableConfig) -> bool:
+    """Whether the configured store can use precomputed query embeddings."""
+    configuration = BaseConfiguration.from_runnable_config(config)
+    vstore = retriever_pool.get_vector_store(configuration)
+    return _vector_search_kind(type(vstore)) is not None
+
+
+async def asearch_by_vector(
+    config: RunnableConfig, query: str, embedding: list[float]
+) -> list[Document]:
+    """Vector search with a precomputed query embedding.
+
+    Falls back to the regular retriever, which embeds ``query`` itself, for
+    stores that cannot search by vector.
+    """
+    configuration = BaseConfiguration.from_runnable_config(config)
+    vstore = retriever_pool.get_vector_store(configuration)
+    search_kwargs = dict(configuration.search_kwargs)
+    k = search_kwargs.pop("k", 4)
+    kind = _vector_search_kind(type(vstore))
+    try:
+        if kind == "native":
+            return await vstore.asimilarity_search_by_vector(
+                embedding, k=k, **search_kwargs
+            )
+        if kind == "scored":
+            search = getattr(
+                vstore, "similarity_search_by_vector_with_relevance_scores"
+            )
+            scored = await asyncio.to_thread(
+                search,
+                embedding,
+                k=k,
+                **search_kwargs,
             )
+            return [doc for doc, _ in scored]
+    except NotImplementedError:
+        pass
+    with make_retriever(config) as retriever:
+        return await retriever.ainvoke(query, config)
@@ -1,10 +1,16 @@
-from typing import Optional
+import json
+import logging
+import threading
+from typing import Any, Optional
 
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
-import os
+from app.ai.shared.fake_models import OFFLINE_CHAT_PROVIDERS, make_offline_chat_model
 from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
 
 
 def _format_doc(doc: Document) -> str:
@@ -25,26 +31,95 @@ def format_docs(docs: Optional[list[Document]]) -> str:
 </documents>"""
 
 
-def load_chat_model(fully_specified_name: str) -> BaseChatModel:
+def _resolve_provider(fully_specified_name: str) -> tuple[str, str, dict[str, Any]]:
     if "/" in fully_specified_name:
         provider, model = fully_specified_name.split("/", maxsplit=1)
     else:
         provider = ""
         model = fully_specified_name
 
-    print(f"[load_chat_model] incoming: provider={provider!r}, model={model!r}")
-
+    credentials: dict[str, Any] = {}
     if provider in {"", "openai"}:
         provider = "openai"
         if settings.openai_api_key is None:
             raise RuntimeError("OPENAI_API_KEY is not set in .env / Settings.")
-        os.environ["OPENAI_API_KEY"] = settings.openai_api_key.get_secret_value()
+        credentials["api_key"] = settings.openai_api_key.get_secret_value()
 
     elif provider in {"google", "gemini"}:
         if settings.google_api_key is None:
             raise RuntimeError("GOOGLE_API_KEY is not set in .env / Settings.")
-        os.environ["GOOGLE_API_KEY"] = settings.google_api_key.get_secret_value()
+        credentials["api_key"] = settings.google_api_key.get_secret_value()
         provider = "google_genai"
 
-    print(f"[load_chat_model] normalized: provider={provider!r}, model={model!r}")
-    return init_chat_model(model, model_provider=provider)
+    return provider, model, credentials
+
+
+class ChatModelRegistry:
+    """Process-wide cache of chat model clients.
+
+    Clients are keyed by (provider, model, params) so every graph node and
+    every request shares one instance, and with it the provider SDK's HTTP
+    connection pool. Construction is synchronous and guarded by a lock, so
+    concurrent tasks (or threads) never build the same client twice.
+    """
+
+    def __init__(self) -> None:
+        self._models: dict[tuple[str, str, str], BaseChatModel] = {}
+        # Re-entrant: a record/ model loads the model it wraps from here.
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(provider: str, model: str, params: dict[str, Any]) -> tuple[str, str, str]:
+        return provider, model, json.dumps(params, sort_keys=True, default=repr)
+
+    def get(self, fully_specified_name: str, **params: Any) -> BaseChatModel:
+        provider, _, model = fully_specified_name.partition("/")
+        if provider in OFFLINE_CHAT_PROVIDERS:
+            credentials: dict[str, Any] = {}
+        else:
+            provider, model, credentials = _resolve_provider(fully_specified_name)
+        key = self._key(provider, model, params)
+
+        cached = self._models.get(key)
+        if cached is not None:
+            self.hits += 1
+            CACHE_REQUESTS.labels(cache="chat_model", result="hit").inc()
+            return cached
+
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is not None:
+                self.hits += 1
+                CACHE_REQUESTS.labels(cache="chat_model", result="hit").inc()
+                return cached
+
+            logger.info(
+                "Creating chat model client provider=%s model=%s", provider, model
+            )
+            if provider in OFFLINE_CHAT_PROVIDERS:
+                # record/... builds its wrapped model through this registry.
+                instance = make_offline_chat_model(provider, model, **params)
+            else:
+                instance = init_chat_model(
+                    model, model_provider=provider, **credentials, **params
+                )
+            self._models[key] = instance
+            self.misses += 1
+            CACHE_REQUESTS.labels(cache="chat_model", result="miss").inc()
+            return instance
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._models), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+chat_models = ChatModelRegistry()
+
+
+def load_chat_model(fully_specified_name: str, **params: Any) -> BaseChatModel:
+    return chat_models.get(fully_specified_name, **params)
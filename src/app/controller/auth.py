@@ -2,11 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from app.security.jwt_tokens import create_access_token
 from app.core.db import get_db
+from app.core.redis_client import Redis, get_redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.dto.user import UserLogin
 from app.services.user_services import UserService
 
-
 router = APIRouter(prefix="/api", tags=["auth"])
 
 
@@ -14,8 +14,9 @@ router = APIRouter(prefix="/api", tags=["auth"])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
-    service = UserService(db=db)
+    service = UserService(db=db, redis=redis)
     user = await service.authenticate_user(
         UserLogin(username=form_data.username, password=form_data.password)
     )
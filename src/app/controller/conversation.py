@@ -1,29 +1,41 @@
+import json
+from typing import AsyncGenerator
+
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_db
+from app.core.db import get_db, session_factory
 from app.dto.conversation import ConversationListResponse, ConversationDetailResponse
 from app.services.conversation_service import ConversationService
 from app.dto.message import MessageRead, MessageContent
 from sse_starlette.sse import EventSourceResponse
 from app.security.deps import CurrentUser, get_current_user
 from app.services.chat_service import ChatService
-from app.dto.chat_dto import ChatRequest
+from app.dto.chat_dto import ChatRequest, ChatRequestIn
 
 router = APIRouter(tags=["conversation"])
 
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 5000
+# Larger pages are streamed instead of being built in memory.
+STREAM_MIN_MESSAGES = 200
+
+
+def get_chat_service() -> ChatService:
+    # ChatService opens its own short-lived sessions; a request-scoped one
+    # would stay checked out for the whole SSE stream.
+    return ChatService()
+
 
 @router.post("/f/conversation")
 async def post_conversation(
     payload: ChatRequest,
-    db: AsyncSession = Depends(get_db),
     current_user: CurrentUser = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
-    payload.user_id = current_user.id
-
-    conv_service = ConversationService(db)
-    chat_service = ChatService(conv_service)
-    return EventSourceResponse(chat_service.stream_conversation(payload))
+    chat_request = ChatRequestIn(**payload.model_dump(), user_id=current_user.id)
+    return EventSourceResponse(chat_service.stream_conversation(chat_request))
 
 
 @router.get("/conversations", response_model=ConversationListResponse)
@@ -32,6 +44,7 @@ async def list_conversations_endpoint(
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     order: str = Query("updated"),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_db),
     current_user: CurrentUser = Depends(get_current_user),
 ):
@@ -45,41 +58,106 @@ async def list_conversations_endpoint(
         target_user_id = user_id if user_id is not None else current_user.id
 
     service = ConversationService(db)
-    data = await service.list_conversations(
-        user_id=target_user_id,
-        offset=offset,
-        limit=limit,
-    )
+    try:
+        data = await service.list_conversations(
+            user_id=target_user_id,
+            offset=offset,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
     return data
 
 
+def _message_read(m: dict) -> MessageRead:
+    return MessageRead(
+        id=m["id"],
+        role=m["role"],
+        content=MessageContent(**m["content"]),
+        created_at=m["created_at"],
+    )
+
+
+async def _stream_detail(
+    conversation_id: str, start, before: str | None, before_cursor: str | None
+) -> AsyncGenerator[str, None]:
+    # Own session: the request-scoped one may be closed before the body is sent.
+    yield json.dumps(
+        {
+            "conversation_id": conversation_id,
+            "next_cursor": None,
+            "before_cursor": before_cursor,
+        }
+    )[:-1] + ', "messages": ['
+    async with session_factory() as db:
+        sep = ""
+        async for m in ConversationService(db).iter_messages(
+            conversation_id, start, before
+        ):
+            yield sep + _message_read(m).model_dump_json()
+            sep = ","
+    yield "]}"
+
+
 @router.get(
     "/conversation/{conversation_id}", response_model=ConversationDetailResponse
 )
 async def get_conversation_detail(
     conversation_id: str,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MESSAGE_PAGE_MAX),
+    before: str | None = Query(None),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_db),
     current_user: CurrentUser = Depends(get_current_user),
 ):
-    service = ConversationService(db)
-    raw_msgs = await service.get_conversation_messages(conversation_id)
+    """Latest ``limit`` messages, oldest first.
 
-    if not raw_msgs:
-        raise HTTPException(status_code=404, detail="Conversation not found or empty")
+    ``before_cursor`` fetches the next older page via ``before``; ``cursor``
+    pages forward from the start of the thread (``next_cursor``). Pages
+    above STREAM_MIN_MESSAGES are streamed row by row.
+    """
+    if before and cursor:
+        raise HTTPException(status_code=400, detail="use either before or cursor")
 
-    messages: list[MessageRead] = []
-    for m in raw_msgs:
-        content = MessageContent(**m["content"])
-        messages.append(
-            MessageRead(
-                id=m["id"],
-                role=m["role"],
-                content=content,
-                created_at=m["created_at"],
+    service = ConversationService(db)
+    next_cursor = before_cursor = None
+    try:
+        if cursor:
+            page = await service.get_messages_page(
+                conversation_id, limit=limit, cursor=cursor
             )
-        )
+            raw_msgs, next_cursor = page["messages"], page["next_cursor"]
+        elif limit > STREAM_MIN_MESSAGES:
+            start, before_cursor = await service.latest_window(
+                conversation_id, limit, before
+            )
+            if start is None and before is None:
+                raise HTTPException(
+                    status_code=404, detail="Conversation not found or empty"
+                )
+            if start is None:
+                return ConversationDetailResponse(
+                    conversation_id=conversation_id, messages=[]
+                )
+            return StreamingResponse(
+                _stream_detail(conversation_id, start, before, before_cursor),
+                media_type="application/json",
+            )
+        else:
+            page = await service.get_latest_messages(
+                conversation_id, limit=limit, before=before
+            )
+            raw_msgs, before_cursor = page["messages"], page["before_cursor"]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    if not raw_msgs and cursor is None and before is None:
+        raise HTTPException(status_code=404, detail="Conversation not found or empty")
 
     return ConversationDetailResponse(
         conversation_id=conversation_id,
-        messages=messages,
+        messages=[_message_read(m) for m in raw_msgs],
+        next_cursor=next_cursor,
+        before_cursor=before_cursor,
     )
@@ -51,6 +51,64 @@ class Settings(BaseSettings):
     elastic_url: Optional[str] = Field(default=None, alias="ELASTIC_URL")
     elastic_index: str = Field(default="docs", alias="ELASTIC_INDEX")
 
+    # ==== Embeddings ====
+    # Cross-request micro-batching of query embeddings; 0 disables it.
+    embedding_batch_max_wait_ms: float = Field(
+        default=5.0, alias="EMBEDDING_BATCH_MAX_WAIT_MS"
+    )
+    embedding_batch_max_size: int = Field(default=64, alias="EMBEDDING_BATCH_MAX_SIZE")
+    # Query-embedding cache: in-process LRU byte budget (0 disables the cache)
+    # and the TTL of the shared Redis tier (0 keeps it in-process only).
+    embedding_cache_max_bytes: int = Field(
+        default=32 * 1024 * 1024, alias="EMBEDDING_CACHE_MAX_BYTES"
+    )
+    embedding_cache_ttl_seconds: int = Field(
+        default=7 * 24 * 3600, alias="EMBEDDING_CACHE_TTL_SECONDS"
+    )
+
+    # ==== Semantic answer cache (opt-in) ====
+    semantic_cache_enabled: bool = Field(default=False, alias="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float = Field(
+        default=0.95, alias="SEMANTIC_CACHE_THRESHOLD"
+    )
+    semantic_cache_ttl_seconds: int = Field(
+        default=3600, alias="SEMANTIC_CACHE_TTL_SECONDS"
+    )
+    semantic_cache_max_entries: int = Field(
+        default=1000, alias="SEMANTIC_CACHE_MAX_ENTRIES"
+    )
+
+    # ==== Conversation history ====
+    # Approximate token budget for the recent turns sent to the graph; older
+    # turns are folded into the conversation's rolling summary once at least
+    # HISTORY_SUMMARY_MIN_TOKENS of them have piled up.
+    history_max_tokens: int = Field(default=3000, alias="HISTORY_MAX_TOKENS")
+    history_fetch_messages: int = Field(default=60, alias="HISTORY_FETCH_MESSAGES")
+    history_summary_min_tokens: int = Field(
+        default=1000, alias="HISTORY_SUMMARY_MIN_TOKENS"
+    )
+    # Defaults to the graph's query model.
+    summary_model: Optional[str] = Field(default=None, alias="SUMMARY_MODEL")
+    # Router fast path: centroids written by scripts/train_router.py, and
+    # where LLM routing decisions are logged as its training data (unset
+    # disables logging).
+    router_centroids_path: str = Field(
+        default="models/router_centroids.json", alias="ROUTER_CENTROIDS_PATH"
+    )
+    router_decision_log: Optional[str] = Field(
+        default=None, alias="ROUTER_DECISION_LOG"
+    )
+    # Idle time after which a conversation's graph checkpoint is evicted; the
+    # next turn then re-seeds it from the messages table.
+    checkpoint_ttl_seconds: int = Field(
+        default=24 * 3600, alias="CHECKPOINT_TTL_SECONDS"
+    )
+
+    # Responses saved by record/<provider>/<model> and served by replay/...
+    chat_cassette_path: str = Field(
+        default="cassettes/chat.json", alias="CHAT_CASSETTE"
+    )
+
     # ==== JWT Auth ====
     jwt_secret: Optional[SecretStr] = Field(default=None, alias="JWT_SECRET")
     access_expire_seconds: int = Field(default=3600, alias="ACCESS_EXPIRE_SECONDS")
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncContextManager, AsyncGenerator, Callable
+
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
@@ -9,7 +11,6 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import settings
 
-
 DB_URL = settings.database_url
 if DB_URL is None:
     raise RuntimeError("DATABASE_URL is not set. Put it in your .env or ENV.")
@@ -44,6 +45,15 @@ async def session_factory() -> AsyncGenerator[AsyncSession, None]:
             raise
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with session_factory() as db:
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+
+def get_session_factory() -> SessionFactory:
+    return session_factory
+
+
+async def get_db(
+    sessions: SessionFactory = Depends(get_session_factory),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with sessions() as db:
         yield db
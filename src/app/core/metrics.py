@@ -0,0 +1,59 @@
+"""Prometheus metrics for the app, served from ``/metrics``."""
+
+from prometheus_client import Counter, Histogram
+
+CACHE_REQUESTS = Counter(
+    "chatbot_cache_requests_total",
+    "Lookups against in-process caches, pools and registries.",
+    ["cache", "result"],
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "chatbot_embedding_batch_size",
+    "Texts per batched embedding provider call.",
+    ["encoder"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+EMBEDDING_QUEUE_WAIT = Histogram(
+    "chatbot_embedding_queue_wait_seconds",
+    "Time an embedding request waited in the micro-batching queue.",
+    ["encoder"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+SPECULATIVE_RUNS = Counter(
+    "chatbot_speculative_research_runs_total",
+    "Research plans started alongside routing, by outcome.",
+    ["outcome"],
+)
+
+SPECULATIVE_WASTED_SECONDS = Counter(
+    "chatbot_speculative_research_wasted_seconds_total",
+    "Time spent on speculative planning/retrieval that was thrown away.",
+    ["stage"],
+)
+
+ROUTER_DECISIONS = Counter(
+    "chatbot_router_decisions_total",
+    "Routing decisions by the tier that made them (keywords, centroid, llm).",
+    ["tier"],
+)
+
+ROUTER_LATENCY = Histogram(
+    "chatbot_router_latency_seconds",
+    "Time taken to route a question, by deciding tier.",
+    ["tier"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+ROUTER_LATENCY_SAVED = Counter(
+    "chatbot_router_latency_saved_seconds_total",
+    "Estimated router LLM time avoided by local decisions.",
+)
+
+RESEARCH_QUERIES_SKIPPED = Counter(
+    "chatbot_research_queries_skipped_total",
+    "Generated search queries dropped as repeats of one already run this turn.",
+    ["reason"],
+)
@@ -11,3 +11,7 @@ except Exception:  # pragma: no cover
 rds: Redis = Redis(
     host=settings.redis_host, port=settings.redis_port, db=settings.redis_db
 )
+
+
+def get_redis() -> Redis:
+    return rds
@@ -30,9 +30,12 @@ class ConversationListResponse(BaseModel):
     limit: int
     offset: int
     total: int
+    next_cursor: Optional[str] = None
 
 
 # 1.3 Detail
 class ConversationDetailResponse(BaseModel):
     conversation_id: str
     messages: List[MessageRead]
+    next_cursor: Optional[str] = None
+    before_cursor: Optional[str] = None
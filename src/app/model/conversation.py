@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from sqlalchemy import String, DateTime
+from sqlalchemy import String, DateTime, Integer, Index, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
@@ -25,9 +25,27 @@ class Conversation(Base):
         nullable=False,
     )
 
+    # Maintained by ConversationService.add_messages so the sidebar never
+    # has to aggregate over the messages table.
+    last_message_preview: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    last_message_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    message_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+
+    # Rolling summary of the turns older than the prompt's history window,
+    # and the keyset cursor of the last message folded into it.
+    history_summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    summary_cursor: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
     messages = relationship(
         "Message",
         back_populates="conversation",
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+
+
+Index("ix_conversation_user_updated", Conversation.user_id, Conversation.updated_at)
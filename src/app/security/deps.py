@@ -1,7 +1,6 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.db import get_db
+from app.core.db import SessionFactory, get_session_factory
 from app.repository.user_repository import UserRepository
 from app.security.jwt_tokens import decode_token
 from app.utils.tbconstants import ROLE
@@ -16,7 +15,8 @@ class CurrentUser:
 
 
 async def get_current_user(
-    token: str = Depends(oauth2), db: AsyncSession = Depends(get_db)
+    token: str = Depends(oauth2),
+    sessions: SessionFactory = Depends(get_session_factory),
 ) -> CurrentUser:
     try:
         payload = decode_token(token)
@@ -30,7 +30,11 @@ async def get_current_user(
     if not user_id:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Bad token payload")
 
-    user = await UserRepository(db).get_by_id(int(user_id))
+    # Use a dedicated session so the lookup's connection goes back to the
+    # pool right away instead of living as long as the (possibly streaming)
+    # response.
+    async with sessions() as db:
+        user = await UserRepository(db).get_by_id(int(user_id))
     if not user or not getattr(user, "is_active", True):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "User not active")
 
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-import uuid
 import asyncio
+import logging
 import os
+import re
+import uuid
 from dataclasses import asdict, is_dataclass
 from typing import (
     Any,
@@ -10,14 +12,22 @@ from typing import (
     Optional,
     List,
     Dict,
-    cast,
+    Set,
 )
 
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 
+from app.core.config import settings
+from app.core.db import SessionFactory, session_factory
+from app.core.redis_client import Redis, rds
 from app.services.conversation_service import ConversationService
+from app.services.history_service import HistoryService
+from app.services.semantic_cache import SemanticAnswerCache, semantic_cache
 from app.security.jwt_tokens import create_access_token
-from app.ai.retrieval_graph import graph as builder
+from app.ai.retrieval_graph.graph import builder
+from app.ai.shared.checkpoint import RedisCheckpointSaver
+from app.ai.shared.history import history_start
 
 try:
     from app.dto.events import (
@@ -59,15 +69,128 @@ def _extract_text_from_content(content_obj: dict) -> str:
     return "\n".join([p for p in parts if isinstance(p, str)]).strip()
 
 
-def _role_to_lc(role: str) -> str:
-    if role == "assistant":
-        return "ai"
-    return role
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", None)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        out: List[str] = []
+        for p in content:
+            if isinstance(p, str):
+                out.append(p)
+            elif isinstance(p, dict) and p.get("type", "text") == "text":
+                out.append(str(p.get("text") or ""))
+        return "".join(out)
+    return ""
+
+
+def _last_message_text(result: Any) -> str:
+    msgs: List[Any] = []
+    if isinstance(result, dict):
+        msgs = result.get("messages") or []
+    elif hasattr(result, "messages"):
+        msgs = getattr(result, "messages") or []
+    if not msgs:
+        return ""
+    return _chunk_text(msgs[-1]).strip()
+
+
+async def _replay_answer(answer: str) -> AsyncGenerator[str, None]:
+    for piece in re.findall(r"\s*\S+\s*", answer):
+        yield piece
+
+
+def _delta_patch(patch: List[Dict[str, Any]]) -> Any:
+    if _HAS_EVENTS_DTO:
+        return DeltaPatchEvent(v=[JsonPatchOp(**op) for op in patch])
+    return {"v": patch}
+
+
+def _to_lc_message(item: Dict[str, Any]) -> Optional[BaseMessage]:
+    # Keep the stored message id so checkpointed state can be matched back
+    # to the messages table.
+    text = _extract_text_from_content(item.get("content") or {})
+    if not text:
+        return None
+    if item.get("role") == "assistant":
+        return AIMessage(content=text, id=item.get("id"))
+    return HumanMessage(content=text, id=item.get("id"))
+
+
+logger = logging.getLogger(__name__)
+
+# Graph nodes whose model output is the user-visible answer.
+ANSWER_NODES = frozenset({"respond", "respond_to_general_query", "ask_for_more_info"})
+
+# The graph resumes each conversation from its checkpoint (thread_id is the
+# conversation id), so a turn only sends the new messages.
+checkpointer = RedisCheckpointSaver(rds, ttl_seconds=settings.checkpoint_ttl_seconds)
+graph = builder.compile(checkpointer=checkpointer)
+graph.name = "RetrievalGraph"
+
+# Summary folds run after the response has finished; keep strong references
+# until they complete.
+_background_tasks: Set[asyncio.Task] = set()
 
 
 class ChatService:
-    def __init__(self, conversation_service: ConversationService):
-        self.conv_svc = conversation_service
+    """Runs one chat turn as short, independent DB phases.
+
+    The inputs are persisted (and, when the conversation has no graph
+    checkpoint, its recent history read) in one session, the graph runs
+    with no connection checked out, and the answer is written in a fresh
+    session, so a pooled connection is never held across the LLM call.
+
+    ``redis`` replaces the app's client for checkpoints and conversation
+    caches; it gets its own compiled graph and answer cache.
+    """
+
+    def __init__(
+        self,
+        db_session_factory: SessionFactory = session_factory,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        redis: Optional[Redis] = None,
+    ):
+        self.session_factory = db_session_factory
+        self.redis = redis
+        if redis is None:
+            self.checkpointer, self.graph = checkpointer, graph
+        else:
+            self.checkpointer = RedisCheckpointSaver(
+                redis, ttl_seconds=settings.checkpoint_ttl_seconds
+            )
+            self.graph = builder.compile(checkpointer=self.checkpointer)
+            self.graph.name = graph.name
+        if answer_cache is None and settings.semantic_cache_enabled:
+            if redis is None:
+                answer_cache = semantic_cache
+            else:
+                answer_cache = SemanticAnswerCache(
+                    threshold=settings.semantic_cache_threshold,
+                    ttl_seconds=settings.semantic_cache_ttl_seconds,
+                    max_entries=settings.semantic_cache_max_entries,
+                    redis=redis,
+                )
+        self.answer_cache = answer_cache
+
+    def _cacheable_question(self, lc_messages: list[BaseMessage]) -> Optional[str]:
+        # Only standalone first turns: a follow-up's answer depends on history
+        # the cache key does not capture.
+        if self.answer_cache is None or len(lc_messages) != 1:
+            return None
+        message = lc_messages[0]
+        return message.text if message.type == "human" else None
+
+    async def _cached_answer(
+        self, question: Optional[str], configurable: dict[str, Any]
+    ) -> Optional[str]:
+        if question is None or self.answer_cache is None:
+            return None
+        try:
+            return await self.answer_cache.lookup(question, configurable)
+        except Exception:
+            logger.warning("Semantic cache lookup failed", exc_info=True)
+            return None
 
     def _make_graph_config(self, req: Any) -> RunnableConfig:
         metadata = getattr(req, "metadata", None) or {}
@@ -85,36 +208,142 @@ class ChatService:
                 "RESPONSE_MODEL", os.getenv("MODEL", "openai/gpt-4o-mini")
             ),
             "search_kwargs": {"k": int(os.getenv("RETRIEVER_TOP_K", "4"))},
+            "research_mode": os.getenv("RESEARCH_MODE", "sequential"),
+            "research_max_concurrency": int(os.getenv("RESEARCH_MAX_CONCURRENCY", "3")),
+            "router_tiers": [
+                t.strip() for t in os.getenv("ROUTER_TIERS", "").split(",") if t.strip()
+            ],
+            "speculative_research": os.getenv("SPECULATIVE_RESEARCH", "").lower()
+            in {"1", "true", "yes"},
         }
         if temperature is not None:
             configurable["temperature"] = temperature
+        step_timeout = os.getenv("RESEARCH_STEP_TIMEOUT")
+        if step_timeout:
+            configurable["research_step_timeout"] = float(step_timeout)
+        dedup_threshold = os.getenv("QUERY_DEDUP_THRESHOLD")
+        if dedup_threshold:
+            configurable["query_dedup_threshold"] = (
+                None if dedup_threshold.lower() == "none" else float(dedup_threshold)
+            )
 
         return RunnableConfig(configurable=configurable)
 
+    async def _fold_history(self, conversation_id: str, model_name: str) -> None:
+        try:
+            # The checkpointed state is the window the graph keeps; anything
+            # older than its first user turn belongs in the summary.
+            state = await self.graph.aget_state(
+                {"configurable": {"thread_id": conversation_id}}
+            )
+            messages = (state.values or {}).get("messages") or []
+            start = next((m for m in messages if m.type == "human"), None)
+            if start is None or start.id is None:
+                return
+            async with self.session_factory() as db:
+                await HistoryService(db).fold(conversation_id, start.id, model_name)
+        except Exception:
+            logger.warning("History summary update failed", exc_info=True)
+
+    async def _window_overflowed(
+        self, conversation_id: str, window_start: Optional[str], seeded_cut: bool
+    ) -> bool:
+        """Whether older turns were left out of the window this turn.
+
+        True when the window seeded from a cut history, or when the graph's
+        checkpointed window no longer starts at ``window_start``. Only then
+        is there anything new for ``HistoryService.fold`` to summarize.
+        """
+        if seeded_cut:
+            return True
+        try:
+            window = await self.checkpointer.aget_channel(conversation_id, "messages")
+        except Exception:
+            logger.warning("Could not read the history window", exc_info=True)
+            return False
+        return bool(window) and window[0].id != window_start
+
+    def _schedule_fold(
+        self, conversation_id: str, configurable: dict[str, Any]
+    ) -> None:
+        model_name = settings.summary_model or configurable.get("query_model")
+        task = asyncio.create_task(self._fold_history(conversation_id, model_name))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def _astream_answer(
+        self, graph_input: dict[str, Any], config: RunnableConfig
+    ) -> AsyncGenerator[str, None]:
+        """Yield answer tokens as the graph's answer nodes produce them."""
+        final_state: Any = None
+        streamed = False
+        async for mode, data in self.graph.astream(
+            graph_input, config, stream_mode=["messages", "values"]
+        ):
+            if mode == "values":
+                final_state = data
+                continue
+            chunk, meta = data
+            if (meta or {}).get("langgraph_node") not in ANSWER_NODES:
+                continue
+            text = _chunk_text(chunk)
+            if text:
+                streamed = True
+                yield text
+
+        # Models that cannot stream still produce a final message in state.
+        if not streamed:
+            answer = _last_message_text(final_state)
+            if answer:
+                yield answer
+
     async def stream_conversation(
         self, req: Any
     ) -> AsyncGenerator[dict[str, Any] | str, None]:
-        conv = await self.conv_svc.get_or_create_conversation(
-            req.user_id, req.conversation_id
-        )
-
-        for m in req.messages:
-            message_id = m.id or str(uuid.uuid4())
-            await self.conv_svc.add_message(
-                conv.id,
-                m.role,
-                {"content_type": m.content.content_type, "parts": m.content.parts},
-                message_id,
+        async with self.session_factory() as db:
+            conv_svc = ConversationService(db, self.redis)
+            conv = await conv_svc.get_or_create_conversation(
+                req.user_id, req.conversation_id
             )
 
-        history = await self.conv_svc.get_conversation_messages(conv.id)
+            inputs = [
+                {
+                    "id": m.id or str(uuid.uuid4()),
+                    "role": m.role,
+                    "content": {
+                        "content_type": m.content.content_type,
+                        "parts": m.content.parts,
+                    },
+                }
+                for m in req.messages or []
+            ]
+            await conv_svc.add_messages(conv.id, inputs)
+
+            window = await self.checkpointer.aget_channel(conv.id, "messages")
+            resume = window is not None
+            if not resume:
+                # No checkpoint (new thread or expired): seed the graph with
+                # the newest turns; older ones reach it through the
+                # conversation's rolling summary.
+                recent = await conv_svc.get_latest_messages(
+                    conv.id, limit=settings.history_fetch_messages
+                )
 
-        lc_messages: list[tuple[str, str]] = []
-        for item in history:
-            role = _role_to_lc(item.get("role", "user"))
-            text = _extract_text_from_content(item.get("content") or {})
-            if text:
-                lc_messages.append((role, text))
+        history_truncated = True
+        if resume:
+            lc_messages = [m for m in map(_to_lc_message, inputs) if m is not None]
+            window_start = window[0].id if window else None
+        else:
+            lc_messages = [
+                m for m in map(_to_lc_message, recent["messages"]) if m is not None
+            ]
+            start = history_start(lc_messages, settings.history_max_tokens)
+            history_truncated = start > 0 or recent["before_cursor"] is not None
+            lc_messages = lc_messages[start:]
+            window_start = lc_messages[0].id if lc_messages else None
+        graph_input: dict[str, Any] = {"messages": lc_messages}
+        if conv.history_summary:
+            graph_input["summary"] = conv.history_summary
 
         input_msg = req.messages[-1] if req.messages else None
 
@@ -180,48 +409,6 @@ class ChatService:
                     yield s
 
         assistant_id = str(uuid.uuid4())
-        try:
-            config = self._make_graph_config(req)
-            result = await builder.ainvoke({"messages": lc_messages}, config)
-            answer = ""
-            msgs: List[Any] = []
-            if isinstance(result, dict):
-                msgs = result.get("messages") or []
-            elif hasattr(result, "messages"):
-                msgs = getattr(result, "messages") or []
-            elif hasattr(result, "get"):
-                try:
-                    msgs = result.get("messages") or []
-                except Exception:
-                    msgs = []
-
-            if msgs:
-                last = msgs[-1]
-                content = getattr(last, "content", None)
-                answer = str(content or "").strip()
-        except Exception as e:
-            err_payload = {
-                "type": "message_stream_error",
-                "error": str(e),
-            }
-            async for s in _yield_event(err_payload):
-                yield s
-            complete_payload = {
-                "type": "message_stream_complete",
-                "conversation_id": conv.id,
-            }
-            async for s in _yield_event(complete_payload):
-                yield s
-            yield "[DONE]"
-            return
-
-        assistant_msg = await self.conv_svc.add_message(
-            conv.id,
-            "assistant",
-            {"content_type": "text", "parts": [answer]},
-            assistant_id,
-        )
-        assistant_id = assistant_msg.id
 
         if _HAS_EVENTS_DTO:
             add_evt = DeltaAddEvent(
@@ -261,75 +448,93 @@ class ChatService:
             async for s in _yield_event(payload, event="delta"):
                 yield s
 
-        if _HAS_EVENTS_DTO:
-            marker_evt = MessageMarkerEvent(
-                conversation_id=conv.id,
-                message_id=assistant_id,
-                marker="user_visible_token",
-                event="first",
+        parts: List[str] = []
+        config = self._make_graph_config(req)
+        configurable = config.get("configurable") or {}
+        configurable["thread_id"] = conv.id
+        cache_question = (
+            None if history_truncated else self._cacheable_question(lc_messages)
+        )
+        cached_answer: Optional[str] = None
+        try:
+            cached_answer = await self._cached_answer(cache_question, configurable)
+            source = (
+                _replay_answer(cached_answer)
+                if cached_answer is not None
+                else self._astream_answer(graph_input, config)
             )
-            async for s in _yield_event(marker_evt):
+            async for text in source:
+                if not parts:
+                    if _HAS_EVENTS_DTO:
+                        marker_evt = MessageMarkerEvent(
+                            conversation_id=conv.id,
+                            message_id=assistant_id,
+                            marker="user_visible_token",
+                            event="first",
+                        )
+                        async for s in _yield_event(marker_evt):
+                            yield s
+                    else:
+                        payload = {
+                            "type": "message_marker",
+                            "conversation_id": conv.id,
+                            "message_id": assistant_id,
+                            "marker": "user_visible_token",
+                            "event": "first",
+                        }
+                        async for s in _yield_event(payload):
+                            yield s
+
+                parts.append(text)
+                patch: List[Dict[str, Any]] = [
+                    {"p": "/message/content/parts/0", "o": "append", "v": text}
+                ]
+                async for s in _yield_event(_delta_patch(patch), event="delta"):
+                    yield s
+        except Exception as e:
+            err_payload = {
+                "type": "message_stream_error",
+                "error": str(e),
+            }
+            async for s in _yield_event(err_payload):
                 yield s
-        else:
-            payload = {
-                "type": "message_marker",
+            complete_payload = {
+                "type": "message_stream_complete",
                 "conversation_id": conv.id,
-                "message_id": assistant_id,
-                "marker": "user_visible_token",
-                "event": "first",
             }
-            async for s in _yield_event(payload):
+            async for s in _yield_event(complete_payload):
                 yield s
+            yield "[DONE]"
+            return
 
-        for word in answer.split():
-            patch: List[Dict[str, str]] = [
-                {
-                    "p": "/message/content/parts/0",
-                    "o": "append",
-                    "v": word + " ",
-                }
-            ]
-            if _HAS_EVENTS_DTO:
-                # ĐÃ SỬA LỖI 2 (Dòng 304): Sử dụng cast để Mypy biết 'o' là Dict[str, str]
-                ops = [
-                    JsonPatchOp(
-                        p=cast(Dict[str, str], o)["p"],
-                        o=cast(Dict[str, str], o)["o"],
-                        v=cast(Dict[str, str], o)["v"],
-                    )
-                    for o in patch
-                ]
-                evt = DeltaPatchEvent(v=ops)
-                async for s in _yield_event(evt, event="delta"):
-                    yield s
-            else:
-                payload = {"v": patch}
-                async for s in _yield_event(payload, event="delta"):
-                    yield s
-            await asyncio.sleep(0.01)
+        # Persist only once the stream has finished so a failed or aborted
+        # generation never leaves a half-written assistant message behind.
+        answer = "".join(parts).strip()
+        async with self.session_factory() as db:
+            await ConversationService(db, self.redis).add_message(
+                conv.id,
+                "assistant",
+                {"content_type": "text", "parts": [answer]},
+                assistant_id,
+            )
+        if cached_answer is None and await self._window_overflowed(
+            conv.id, window_start, not resume and history_truncated
+        ):
+            self._schedule_fold(conv.id, configurable)
+
+        if self.answer_cache is not None and cache_question and cached_answer is None:
+            try:
+                await self.answer_cache.store(cache_question, answer, configurable)
+            except Exception:
+                logger.warning("Semantic cache store failed", exc_info=True)
 
         final_patch: List[Dict[str, Any]] = [
             {"p": "/message/status", "o": "replace", "v": "finished_successfully"},
             {"p": "/message/end_turn", "o": "replace", "v": True},
             {"p": "/message/metadata", "o": "append", "v": {"is_complete": True}},
         ]
-        if _HAS_EVENTS_DTO:
-            # Áp dụng cast cho final_patch tương tự
-            ops = [
-                JsonPatchOp(
-                    p=cast(Dict[str, Any], o)["p"],
-                    o=cast(Dict[str, Any], o)["o"],
-                    v=cast(Dict[str, Any], o)["v"],
-                )
-                for o in final_patch
-            ]
-            evt = DeltaPatchEvent(v=ops)
-            async for s in _yield_event(evt, event="delta"):
-                yield s
-        else:
-            payload = {"v": final_patch}
-            async for s in _yield_event(payload, event="delta"):
-                yield s
+        async for s in _yield_event(_delta_patch(final_patch), event="delta"):
+            yield s
 
         if _HAS_EVENTS_DTO:
             done_evt = MessageStreamCompleteEvent(conversation_id=conv.id)
@@ -1,25 +1,26 @@
 import json
 import uuid
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 
-from sqlalchemy import select, func, and_
+from sqlalchemy import and_, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import aliased
 
 from app.model.conversation import Conversation
 from app.model.message import Message
-from app.core.redis_client import rds
+from app.core.redis_client import Redis, rds
+from app.utils.pagination import decode_cursor, encode_cursor
 
 
 class ConversationService:
     HISTORY_MAX = 200
     HISTORY_TTL_SECONDS = 600
-    LIST_TTL_SECONDS = 600
+    INDEX_TTL_SECONDS = 7 * 24 * 3600
+    PREVIEW_MAX = 255
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis: Optional[Redis] = None):
         self.db = db
-        self.redis = rds
+        self.redis = rds if redis is None else redis
 
     @staticmethod
     def _to_str(v: Any) -> Optional[str]:
@@ -34,20 +35,84 @@ class ConversationService:
         return f"conv:{conversation_id}:history"
 
     @staticmethod
-    def _user_conv_list_key(user_id: str, offset: int, limit: int) -> str:
-        return f"user:{user_id}:conversation_list:{offset}:{limit}:updated"
+    def _user_conv_index_key(user_id: str) -> str:
+        return f"user:{user_id}:conversations"
 
     @staticmethod
-    def _user_conv_list_pattern(user_id: str) -> str:
-        return f"user:{user_id}:conversation_list:*"
+    def _user_conv_summary_key(user_id: str) -> str:
+        return f"user:{user_id}:conversation_summaries"
 
-    async def _invalidate_user_conv_list(self, user_id: str) -> None:
-        pattern = self._user_conv_list_pattern(user_id)
-        keys: List[Any] = []
-        async for k in self.redis.scan_iter(match=pattern):
-            keys.append(k)
-        if keys:
-            await self.redis.delete(*keys)
+    @staticmethod
+    def _user_conv_index_ready_key(user_id: str) -> str:
+        return f"user:{user_id}:conversations:ready"
+
+    @staticmethod
+    def _score(dt: Optional[datetime]) -> float:
+        if dt is None:
+            return 0.0
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+    @classmethod
+    def _preview(cls, content: Any) -> Optional[str]:
+        parts = (content or {}).get("parts") or []
+        return str(parts[0])[: cls.PREVIEW_MAX] if parts else None
+
+    def _summary(self, conv: Conversation) -> str:
+        return json.dumps(
+            {
+                "id": conv.id,
+                "title": getattr(conv, "title", "") or "",
+                "last_message": conv.last_message_preview,
+                "updated_at": (
+                    conv.updated_at.isoformat()
+                    if getattr(conv, "updated_at", None)
+                    else None
+                ),
+            }
+        )
+
+    def _queue_index_update(self, pipe: Any, conv: Conversation) -> None:
+        """Move ``conv`` to its new position in the user's sidebar index.
+
+        The three keys always get the same TTL in the same transaction, so they
+        expire together; writes landing after that recreate the sorted set
+        without the ready flag and the next listing rebuilds it from the DB.
+        """
+        index_key = self._user_conv_index_key(conv.user_id)
+        summary_key = self._user_conv_summary_key(conv.user_id)
+        pipe.zadd(index_key, {conv.id: self._score(conv.updated_at)})
+        pipe.hset(summary_key, conv.id, self._summary(conv))
+        for key in (
+            index_key,
+            summary_key,
+            self._user_conv_index_ready_key(conv.user_id),
+        ):
+            pipe.expire(key, self.INDEX_TTL_SECONDS)
+
+    @staticmethod
+    def _message_dict(m: Message) -> Dict[str, Any]:
+        try:
+            content_obj = json.loads(m.content) if m.content else {}
+        except Exception:
+            content_obj = {}
+        return {
+            "id": m.id,
+            "role": m.role,
+            "content": content_obj,
+            "created_at": (
+                m.created_at.isoformat() if getattr(m, "created_at", None) else None
+            ),
+        }
+
+    def _queue_history(
+        self, pipe: Any, conversation_id: str, items: List[Dict[str, Any]]
+    ) -> None:
+        key = self._conv_history_key(conversation_id)
+        pipe.rpush(key, *[json.dumps(x) for x in items])
+        pipe.ltrim(key, -self.HISTORY_MAX, -1)
+        pipe.expire(key, self.HISTORY_TTL_SECONDS)
 
     async def get_or_create_conversation(
         self,
@@ -73,7 +138,9 @@ class ConversationService:
 
         self.db.add(conv)
         await self.db.flush()
-        await self._invalidate_user_conv_list(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_index_update(pipe, conv)
+            await pipe.execute()
         return conv
 
     async def add_message(
@@ -83,125 +150,171 @@ class ConversationService:
         content: dict,
         msg_id: Optional[str] = None,
     ) -> Message:
+        msgs = await self.add_messages(
+            conversation_id, [{"id": msg_id, "role": role, "content": content}]
+        )
+        return msgs[0]
+
+    async def add_messages(
+        self, conversation_id: str, messages: List[Dict[str, Any]]
+    ) -> List[Message]:
+        """Append ``messages`` (dicts with role, content and optional id).
+
+        One flush for the rows and the conversation's denormalized
+        last-message columns, then one transactional Redis pipeline for the
+        history append/trim/expire and the sidebar index update.
+        """
         conv = await self.db.get(Conversation, conversation_id)
         if not conv:
             raise ValueError("Conversation not found")
+        if not messages:
+            return []
 
-        mid = msg_id or str(uuid.uuid4())
+        out: List[Message] = []
+        history_items: List[Dict[str, Any]] = []
         now = datetime.utcnow()
-
-        msg = Message(
-            id=mid,
-            conversation_id=conversation_id,
-            role=role,
-            content=json.dumps(content),
-        )
-        if hasattr(msg, "created_at"):
-            msg.created_at = now
-        if hasattr(msg, "updated_at"):
-            msg.updated_at = now
-
-        self.db.add(msg)
+        for m in messages:
+            mid = m.get("id") or str(uuid.uuid4())
+            now = datetime.utcnow()
+
+            msg = Message(
+                id=mid,
+                conversation_id=conversation_id,
+                role=m["role"],
+                content=json.dumps(m["content"]),
+            )
+            if hasattr(msg, "created_at"):
+                msg.created_at = now
+            if hasattr(msg, "updated_at"):
+                msg.updated_at = now
+
+            self.db.add(msg)
+            out.append(msg)
+            history_items.append(
+                {
+                    "id": mid,
+                    "role": m["role"],
+                    "content": m["content"],
+                    "created_at": now.isoformat(),
+                }
+            )
 
         if hasattr(conv, "updated_at"):
             conv.updated_at = now
+        conv.last_message_at = now
+        conv.last_message_preview = self._preview(messages[-1]["content"])
+        # Incremented in SQL so concurrent writers do not lose counts.
+        conv.message_count = Conversation.message_count + len(messages)
 
         await self.db.flush()
 
-        history_key = self._conv_history_key(conversation_id)
-        history_item = {
-            "id": mid,
-            "role": role,
-            "content": content,
-            "created_at": now.isoformat(),
-        }
-        await self.redis.rpush(history_key, json.dumps(history_item))
-        await self.redis.ltrim(history_key, -self.HISTORY_MAX, -1)
-        await self.redis.expire(history_key, self.HISTORY_TTL_SECONDS)
-        await self._invalidate_user_conv_list(conv.user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_history(pipe, conversation_id, history_items)
+            self._queue_index_update(pipe, conv)
+            await pipe.execute()
 
-        return msg
+        return out
 
     async def list_conversations(
-        self, user_id: str, offset: int = 0, limit: int = 20
+        self,
+        user_id: str,
+        offset: int = 0,
+        limit: int = 20,
+        cursor: Optional[str] = None,
     ) -> Dict[str, Any]:
-        key = self._user_conv_list_key(user_id, offset, limit)
-        cached = await self.redis.get(key)
-        cached_s = self._to_str(cached)
-        if cached_s:
-            try:
-                return json.loads(cached_s)
-            except Exception:
-                pass
-
-        total_res = await self.db.execute(
-            select(func.count())
-            .select_from(Conversation)
-            .where(Conversation.user_id == user_id)
-        )
-        total = int(total_res.scalar() or 0)
-        m2 = aliased(Message)
-        sub = (
-            select(
-                Message.conversation_id.label("cid"),
-                func.max(Message.created_at).label("max_created"),
+        """One sidebar page, newest first.
+
+        ``cursor`` (a previous page's ``next_cursor``) resumes strictly after
+        that conversation's (updated_at, id) and takes precedence over
+        ``offset``. Raises ``ValueError`` for a malformed cursor.
+        """
+        index_key = self._user_conv_index_key(user_id)
+        summary_key = self._user_conv_summary_key(user_id)
+        after = decode_cursor(cursor) if cursor else None
+        after_score = self._score(after[0]) if after else 0.0
+
+        def queue_reads(pipe: Any) -> None:
+            pipe.zcard(index_key)
+            if after is None:
+                pipe.zrevrange(index_key, offset, offset + limit)
+            else:
+                pipe.zcount(index_key, after_score, after_score)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.exists(self._user_conv_index_ready_key(user_id))
+            queue_reads(pipe)
+            ready, total, page = await pipe.execute()
+
+        if not ready:
+            await self._rebuild_conv_index(user_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                queue_reads(pipe)
+                total, page = await pipe.execute()
+
+        if after is None:
+            ids = [self._to_str(i) for i in page]
+        else:
+            # Equal scores come back in descending member order, i.e. the
+            # (updated_at DESC, id DESC) order; skip ties up to the cursor.
+            rows = await self.redis.zrevrangebyscore(
+                index_key,
+                after_score,
+                "-inf",
+                start=0,
+                num=int(page) + limit + 1,
+                withscores=True,
             )
-            .group_by(Message.conversation_id)
-            .subquery()
-        )
-
-        q = (
-            select(Conversation, m2)
-            .outerjoin(sub, sub.c.cid == Conversation.id)
-            .outerjoin(
-                m2,
-                and_(
-                    m2.conversation_id == sub.c.cid,
-                    m2.created_at == sub.c.max_created,
-                ),
-            )
-            .where(Conversation.user_id == user_id)
-            .order_by(Conversation.updated_at.desc())
-            .offset(offset)
-            .limit(limit)
-        )
-
-        res = await self.db.execute(q)
-        rows: List[Tuple[Conversation, Optional[Message]]] = res.all()
+            ids = [
+                member
+                for member, score in ((self._to_str(m), sc) for m, sc in rows)
+                if score != after_score or member < after[1]
+            ][: limit + 1]
 
+        summaries = await self.redis.hmget(summary_key, ids[:limit]) if ids else []
         out_items: List[Dict[str, Any]] = []
-        for conv, last_msg in rows:
-            last_text = None
-            if last_msg and last_msg.content:
-                try:
-                    last_content = json.loads(last_msg.content)
-                except Exception:
-                    last_content = {}
-                parts = (last_content or {}).get("parts") or []
-                last_text = parts[0] if parts else None
+        for raw in summaries:
+            s = self._to_str(raw)
+            if s:
+                out_items.append(json.loads(s))
 
-            out_items.append(
-                {
-                    "id": conv.id,
-                    "title": getattr(conv, "title", "") or "",
-                    "last_message": last_text,
-                    "updated_at": (
-                        conv.updated_at.isoformat()
-                        if getattr(conv, "updated_at", None)
-                        else None
-                    ),
-                }
-            )
+        next_cursor = None
+        if len(ids) > limit and out_items and out_items[-1].get("updated_at"):
+            last = out_items[-1]
+            next_cursor = encode_cursor(last["updated_at"], last["id"])
 
-        payload = {
+        return {
             "items": out_items,
             "limit": limit,
-            "offset": offset,
-            "total": total,
+            "offset": offset if after is None else 0,
+            "total": int(total),
+            "next_cursor": next_cursor,
         }
 
-        await self.redis.set(key, json.dumps(payload), ex=self.LIST_TTL_SECONDS)
-        return payload
+    async def _rebuild_conv_index(self, user_id: str) -> None:
+        """Load every conversation of ``user_id`` into the sidebar index.
+
+        Uses ZADD GT and HSETNX so entries written by a concurrent
+        ``add_message`` are never replaced by the older DB snapshot.
+        """
+        res = await self.db.execute(
+            select(Conversation).where(Conversation.user_id == user_id)
+        )
+        convs = res.scalars().all()
+        scores = {conv.id: self._score(conv.updated_at) for conv in convs}
+        summaries = {conv.id: self._summary(conv) for conv in convs}
+
+        index_key = self._user_conv_index_key(user_id)
+        summary_key = self._user_conv_summary_key(user_id)
+        ready_key = self._user_conv_index_ready_key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if scores:
+                pipe.zadd(index_key, scores, gt=True)
+                for cid, summary in summaries.items():
+                    pipe.hsetnx(summary_key, cid, summary)
+            pipe.set(ready_key, 1)
+            for key in (index_key, summary_key, ready_key):
+                pipe.expire(key, self.INDEX_TTL_SECONDS)
+            await pipe.execute()
 
     async def get_conversation_messages(
         self, conversation_id: str
@@ -230,30 +343,178 @@ class ConversationService:
         )
         msgs = res.scalars().all()
 
-        out_msgs: List[Dict[str, Any]] = []
-        for m in msgs:
-            try:
-                content_obj = json.loads(m.content) if m.content else {}
-            except Exception:
-                content_obj = {}
-
-            out_msgs.append(
-                {
-                    "id": m.id,
-                    "role": m.role,
-                    "content": content_obj,
-                    "created_at": (
-                        m.created_at.isoformat()
-                        if getattr(m, "created_at", None)
-                        else None
-                    ),
-                }
-            )
+        out_msgs = [self._message_dict(m) for m in msgs]
 
         if out_msgs:
-            to_cache = out_msgs[-self.HISTORY_MAX :]
-            await self.redis.rpush(key, *[json.dumps(x) for x in to_cache])
-            await self.redis.ltrim(key, -self.HISTORY_MAX, -1)
-            await self.redis.expire(key, self.HISTORY_TTL_SECONDS)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                self._queue_history(
+                    pipe, conversation_id, out_msgs[-self.HISTORY_MAX :]
+                )
+                await pipe.execute()
 
         return out_msgs
+
+    async def get_messages_page(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Messages in chronological order, ``limit`` at a time.
+
+        Keyset paging on (created_at, id): ``cursor`` is the previous page's
+        ``next_cursor``. Raises ``ValueError`` for a malformed cursor.
+        """
+        q = select(Message).where(Message.conversation_id == conversation_id)
+        if cursor:
+            q = q.where(self._after(decode_cursor(cursor)))
+        q = q.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1)
+
+        res = await self.db.execute(q)
+        msgs = list(res.scalars().all())
+
+        next_cursor = None
+        if len(msgs) > limit:
+            msgs = msgs[:limit]
+            next_cursor = encode_cursor(msgs[-1].created_at, msgs[-1].id)
+
+        return {
+            "messages": [self._message_dict(m) for m in msgs],
+            "next_cursor": next_cursor,
+        }
+
+    @staticmethod
+    def _after(key: Tuple[datetime, str]) -> Any:
+        at, mid = key
+        return or_(
+            Message.created_at > at, and_(Message.created_at == at, Message.id > mid)
+        )
+
+    @staticmethod
+    def _before(key: Tuple[datetime, str]) -> Any:
+        at, mid = key
+        return or_(
+            Message.created_at < at, and_(Message.created_at == at, Message.id < mid)
+        )
+
+    async def get_latest_messages(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """The newest ``limit`` messages (older than ``before``), oldest first.
+
+        ``before_cursor`` is set when older messages remain. Without
+        ``before`` the page bodies come from the Redis history when it holds
+        more than ``limit`` entries; otherwise one indexed query of
+        ``limit + 1`` rows. Raises ``ValueError`` for a malformed cursor.
+        """
+        if before is None and limit < self.HISTORY_MAX:
+            raw = await self.redis.lrange(
+                self._conv_history_key(conversation_id), -(limit + 1), -1
+            )
+            items = [json.loads(s) for s in map(self._to_str, raw) if s]
+            if len(items) > limit:
+                page = items[1:]
+                # Keys come from the index: Redis holds microsecond times in
+                # insertion order, while the DB may store whole seconds (MySQL
+                # DATETIME) and orders ties by id. The Redis bodies are served
+                # only when they are exactly the DB's page.
+                keys = (
+                    await self.db.execute(
+                        select(Message.created_at, Message.id)
+                        .where(Message.conversation_id == conversation_id)
+                        .order_by(Message.created_at.desc(), Message.id.desc())
+                        .limit(limit + 1)
+                    )
+                ).all()
+                if [mid for _, mid in keys[:limit][::-1]] == [it["id"] for it in page]:
+                    oldest = keys[limit - 1]
+                    return {
+                        "messages": page,
+                        "before_cursor": (
+                            encode_cursor(oldest[0], oldest[1])
+                            if len(keys) > limit
+                            else None
+                        ),
+                    }
+
+        q = select(Message).where(Message.conversation_id == conversation_id)
+        if before:
+            q = q.where(self._before(decode_cursor(before)))
+        q = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+
+        res = await self.db.execute(q)
+        msgs = list(res.scalars().all())
+        has_more = len(msgs) > limit
+        msgs = msgs[:limit][::-1]
+
+        return {
+            "messages": [self._message_dict(m) for m in msgs],
+            "before_cursor": (
+                encode_cursor(msgs[0].created_at, msgs[0].id) if has_more else None
+            ),
+        }
+
+    async def latest_window(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[str] = None,
+    ) -> Tuple[Optional[Tuple[datetime, str]], Optional[str]]:
+        """Bounds of the page ``get_latest_messages`` would return.
+
+        Returns the (created_at, id) of its oldest message, or None for an
+        empty page, and its ``before_cursor``. Reads only the
+        (conversation_id, created_at) index, so the rows themselves can then
+        be streamed with ``iter_messages``.
+        """
+        q = select(Message.created_at, Message.id).where(
+            Message.conversation_id == conversation_id
+        )
+        if before:
+            q = q.where(self._before(decode_cursor(before)))
+        rows = (
+            await self.db.execute(
+                q.order_by(Message.created_at.desc(), Message.id.desc())
+                .offset(limit - 1)
+                .limit(2)
+            )
+        ).all()
+        if rows:
+            start = (rows[0][0], rows[0][1])
+            return start, (encode_cursor(*start) if len(rows) > 1 else None)
+
+        # Fewer than ``limit`` messages: the page starts at the oldest one.
+        row = (
+            await self.db.execute(
+                q.order_by(Message.created_at.asc(), Message.id.asc()).limit(1)
+            )
+        ).first()
+        return ((row[0], row[1]) if row else None), None
+
+    async def iter_messages(
+        self,
+        conversation_id: str,
+        start: Tuple[datetime, str],
+        before: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream messages from ``start`` (inclusive) up to ``before``."""
+        at, mid = start
+        q = select(Message).where(
+            Message.conversation_id == conversation_id,
+            or_(
+                Message.created_at > at,
+                and_(Message.created_at == at, Message.id >= mid),
+            ),
+        )
+        if before:
+            q = q.where(self._before(decode_cursor(before)))
+        q = q.order_by(Message.created_at.asc(), Message.id.asc()).execution_options(
+            yield_per=batch_size
+        )
+        result = await self.db.stream_scalars(q)
+        async for m in result:
+            yield self._message_dict(m)
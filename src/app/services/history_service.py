@@ -0,0 +1,113 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages.utils import count_tokens_approximately
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai.shared.utils import load_chat_model
+from app.core.config import settings
+from app.model.conversation import Conversation
+from app.model.message import Message
+from app.services.conversation_service import ConversationService
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.prompts import HISTORY_SUMMARY_PROMPT, HISTORY_SUMMARY_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryService:
+    """Folds turns that fell out of the prompt window into a rolling summary.
+
+    The summary lives on the conversation next to ``summary_cursor``, the
+    (created_at, id) of the last message it covers, so each fold only reads
+    and summarizes the messages evicted since the previous one.
+    """
+
+    # Messages summarized per fold; any remainder is picked up next turn.
+    FOLD_MAX_MESSAGES = 100
+
+    def __init__(self, db: AsyncSession, min_tokens: Optional[int] = None):
+        self.db = db
+        self.min_tokens = (
+            settings.history_summary_min_tokens if min_tokens is None else min_tokens
+        )
+
+    @staticmethod
+    def _transcript(items: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        out: List[Tuple[str, str]] = []
+        for it in items:
+            parts = (it.get("content") or {}).get("parts") or []
+            text = "\n".join(p for p in parts if isinstance(p, str)).strip()
+            if text:
+                out.append(("user" if it["role"] == "user" else "ai", text))
+        return out
+
+    async def fold(self, conversation_id: str, before_id: str, model_name: str) -> bool:
+        """Summarize the unsummarized messages older than message ``before_id``.
+
+        Nothing happens until they add up to ``min_tokens``, so the model is
+        called once per batch of evicted turns rather than on every turn.
+        Returns True when a new summary was stored.
+        """
+        conv = await self.db.get(Conversation, conversation_id)
+        before = await self.db.get(Message, before_id)
+        if conv is None or before is None:
+            return False
+        cursor = conv.summary_cursor
+
+        q = select(Message).where(
+            Message.conversation_id == conversation_id,
+            ConversationService._before((before.created_at, before.id)),
+        )
+        if cursor:
+            q = q.where(ConversationService._after(decode_cursor(cursor)))
+        res = await self.db.execute(
+            q.order_by(Message.created_at.asc(), Message.id.asc()).limit(
+                self.FOLD_MAX_MESSAGES
+            )
+        )
+        msgs = list(res.scalars().all())
+        lines = self._transcript([ConversationService._message_dict(m) for m in msgs])
+        if not lines or count_tokens_approximately(lines) < self.min_tokens:
+            return False
+
+        transcript = "\n\n".join(
+            f"{'User' if role == 'user' else 'Assistant'}: {text}"
+            for role, text in lines
+        )
+        response = await load_chat_model(model_name).ainvoke(
+            [
+                ("system", HISTORY_SUMMARY_PROMPT),
+                (
+                    "user",
+                    HISTORY_SUMMARY_TEMPLATE.format(
+                        summary=conv.history_summary or "(empty)",
+                        messages=transcript,
+                    ),
+                ),
+            ]
+        )
+        summary = response.text.strip()
+        if not summary:
+            return False
+
+        # Compare-and-set on the cursor: a concurrent fold of the same
+        # messages loses instead of overwriting a newer summary.
+        matches_cursor = (
+            Conversation.summary_cursor == cursor
+            if cursor
+            else Conversation.summary_cursor.is_(None)
+        )
+        result = await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id, matches_cursor)
+            # Keep updated_at: summarizing is not activity in the sidebar.
+            .values(
+                history_summary=summary,
+                summary_cursor=encode_cursor(msgs[-1].created_at, msgs[-1].id),
+                updated_at=Conversation.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
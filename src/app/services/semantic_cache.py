@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from app.ai.shared.retrieval import get_text_encoder
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.core.redis_client import rds
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_KEY = "semantic_cache:index_version"
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    answer: str
+    expires_at: float
+
+
+class _Partition:
+    """Entries answered under one model/retriever configuration."""
+
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list[str] = []
+
+    def matrix(self) -> tuple[list[str], np.ndarray]:
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = np.stack([self.entries[k].vector for k in self._keys])
+        return self._keys, self._matrix
+
+    def changed(self) -> None:
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """Answers of recent standalone questions, looked up by embedding similarity.
+
+    A question whose embedding has cosine similarity of at least
+    ``threshold`` with a cached one gets that answer back without running the
+    retrieval graph. Entries expire after ``ttl_seconds``, each configuration
+    scope keeps at most ``max_entries`` (least recently used are evicted),
+    and everything is dropped when the index version in Redis is bumped by a
+    re-ingest.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+        redis: Any = rds,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.redis = redis
+        self._partitions: dict[tuple, _Partition] = {}
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scope(configurable: dict[str, Any]) -> tuple:
+        return (
+            configurable.get("embedding_model"),
+            configurable.get("query_model"),
+            configurable.get("response_model"),
+            configurable.get("retriever_provider"),
+        )
+
+    async def _embed(self, question: str, configurable: dict[str, Any]) -> np.ndarray:
+        encoder = get_text_encoder(configurable["embedding_model"])
+        vector = np.asarray(await encoder.aembed_query(question), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    async def _sync_index_version(self) -> None:
+        try:
+            raw = await self.redis.get(INDEX_VERSION_KEY)
+        except Exception:
+            logger.warning("Could not read semantic cache index version", exc_info=True)
+            return
+        version = raw.decode() if isinstance(raw, bytes) else (raw or "0")
+        with self._lock:
+            if version != self._index_version:
+                self._partitions.clear()
+                self._index_version = version
+
+    async def lookup(
+        self, question: str, configurable: dict[str, Any]
+    ) -> Optional[str]:
+        await self._sync_index_version()
+        vector = await self._embed(question, configurable)
+        now = time.monotonic()
+
+        with self._lock:
+            part = self._partitions.get(self._scope(configurable))
+            answer = None
+            if part is not None:
+                expired = [k for k, e in part.entries.items() if e.expires_at <= now]
+                for k in expired:
+                    del part.entries[k]
+                if expired:
+                    part.changed()
+                if part.entries:
+                    keys, matrix = part.matrix()
+                    sims = matrix @ vector
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        part.entries.move_to_end(keys[best])
+                        answer = part.entries[keys[best]].answer
+
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_REQUESTS.labels(
+            cache="semantic_answer", result="miss" if answer is None else "hit"
+        ).inc()
+        return answer
+
+    async def store(
+        self, question: str, answer: str, configurable: dict[str, Any]
+    ) -> None:
+        if not answer:
+            return
+        vector = await self._embed(question, configurable)
+        entry = _Entry(vector, answer, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            part = self._partitions.setdefault(self._scope(configurable), _Partition())
+            part.entries[question] = entry
+            part.entries.move_to_end(question)
+            while len(part.entries) > self.max_entries:
+                part.entries.popitem(last=False)
+            part.changed()
+
+    async def invalidate(self) -> bool:
+        """Drop every cached answer here and, via Redis, in every worker.
+
+        Returns False when Redis could not be reached: other workers keep
+        serving their cached answers.
+        """
+        with self._lock:
+            self._partitions.clear()
+        try:
+            self._index_version = str(await self.redis.incr(INDEX_VERSION_KEY))
+        except Exception:
+            logger.warning("Could not bump semantic cache index version", exc_info=True)
+            return False
+        return True
+
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": sum(len(p.entries) for p in self._partitions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+semantic_cache = SemanticAnswerCache(
+    threshold=settings.semantic_cache_threshold,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    max_entries=settings.semantic_cache_max_entries,
+)
@@ -4,7 +4,7 @@ from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.redis_client import rds
+from app.core.redis_client import Redis, rds
 from app.dto.user import UserLogin, UserRegister, UserOut
 from app.model.user import User
 from app.repository.user_repository import UserRepository
@@ -17,8 +17,10 @@ class UserService:
         self,
         db: AsyncSession,
         pwd_handler: Optional[PasswordHandler] = None,
+        redis: Optional[Redis] = None,
     ):
         self.db = db
+        self.redis = rds if redis is None else redis
         self.repo = UserRepository(db)
         self.pwd_handler = pwd_handler or PasswordHandler()
 
@@ -42,13 +44,13 @@ class UserService:
         username_key = f"user:username:{dto.username}"
         email_key = f"user:email:{dto.email}"
 
-        await rds.set(user_key, dto.model_dump_json(), ex=ttl)
-        await rds.set(username_key, str(dto.id), ex=ttl)
-        await rds.set(email_key, str(dto.id), ex=ttl)
+        await self.redis.set(user_key, dto.model_dump_json(), ex=ttl)
+        await self.redis.set(username_key, str(dto.id), ex=ttl)
+        await self.redis.set(email_key, str(dto.id), ex=ttl)
 
     async def get_user_by_id_cached(self, user_id: int) -> Optional[User]:
         cache_key = f"user:{user_id}"
-        cached = await rds.get(cache_key)
+        cached = await self.redis.get(cache_key)
         if cached:
             dto = UserOut.model_validate_json(self._decode(cached))
             return User(**dto.model_dump())
@@ -60,7 +62,7 @@ class UserService:
 
     async def get_user_by_username_cached(self, username: str) -> Optional[User]:
         username_key = f"user:username:{username}"
-        user_id_str = await rds.get(username_key)
+        user_id_str = await self.redis.get(username_key)
         if user_id_str:
             try:
                 user_id = int(self._decode(user_id_str))
@@ -75,7 +77,7 @@ class UserService:
 
     async def get_user_by_email_cached(self, email: str) -> Optional[User]:
         email_key = f"user:email:{email}"
-        user_id_str = await rds.get(email_key)
+        user_id_str = await self.redis.get(email_key)
         if user_id_str:
             try:
                 user_id = int(self._decode(user_id_str))
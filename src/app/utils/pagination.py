@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(ts: datetime | str, row_id: str) -> str:
+    """Opaque keyset cursor for the row sorted at (``ts``, ``row_id``)."""
+    if isinstance(ts, datetime):
+        ts = ts.isoformat()
+    raw = json.dumps([ts, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(ts), str(row_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
@@ -32,3 +32,23 @@ User question: {question}
 
 Write the best possible answer following the rules above.
 """.strip()
+
+
+HISTORY_SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an assistant.
+
+Update the existing summary with the new messages. Keep what later turns may depend on:
+the user's goals and constraints, facts and decisions already established, names,
+code identifiers and versions mentioned, and open questions. Drop greetings and
+repetition. Reply with the updated summary only, in at most 250 words.
+""".strip()
+
+HISTORY_SUMMARY_TEMPLATE = """
+<summary>
+{summary}
+</summary>
+
+<new_messages>
+{messages}
+</new_messages>
+""".strip()
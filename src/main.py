@@ -1,9 +1,11 @@
 # src/app/main.py
 from fastapi import FastAPI
 from pathlib import Path
+from prometheus_client import make_asgi_app
 from app.controller.auth import router as auth_router
 from app.controller.conversation import router as conv_router
 from app.core.db import engine, Base
+from app.ai.shared.retrieval import retriever_pool
 import uvicorn
 
 app = FastAPI(title="Chatbot_project")
@@ -17,8 +19,14 @@ async def _create_all():
         await conn.run_sync(Base.metadata.create_all)
 
 
+@app.on_event("shutdown")
+async def _close_retrievers():
+    await retriever_pool.aclose()
+
+
 app.include_router(auth_router)
 app.include_router(conv_router)
+app.mount("/metrics", make_asgi_app())
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
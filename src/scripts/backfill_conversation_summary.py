@@ -0,0 +1,145 @@
+"""
+Add and backfill the denormalized last-message columns on `conversation`.
+
+`Base.metadata.create_all` creates missing tables but never alters existing
+ones, so databases created before `last_message_preview`, `last_message_at`,
+`message_count` and the `(user_id, updated_at)` index need this once. The
+rolling-summary columns (`history_summary`, `summary_cursor`) are only
+added; they start empty and fill in as conversations continue.
+
+Usage (from src/):
+  python -m scripts.backfill_conversation_summary [--batch-size 500]
+
+Safe to re-run: columns and index are only added when missing, and values
+are recomputed from the messages table.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from sqlalchemy import and_, func, inspect, select, text, update
+
+from app.core.db import engine, session_factory
+from app.model.conversation import Conversation
+from app.model.message import Message
+from app.services.conversation_service import ConversationService
+
+logger = logging.getLogger("backfill_conversation_summary")
+
+NEW_COLUMNS = (
+    "last_message_preview",
+    "last_message_at",
+    "message_count",
+    "history_summary",
+    "summary_cursor",
+)
+
+
+def _ensure_schema(sync_conn) -> None:
+    table = Conversation.__table__
+    existing = {c["name"] for c in inspect(sync_conn).get_columns(table.name)}
+    for name in NEW_COLUMNS:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} "
+        ddl += column.type.compile(dialect=sync_conn.dialect)
+        if name == "message_count":
+            ddl += " NOT NULL DEFAULT 0"
+        logger.info("Adding column %s.%s", table.name, name)
+        sync_conn.execute(text(ddl))
+
+    for index in table.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+
+async def _backfill_batch(ids: list[str]) -> None:
+    async with session_factory() as db:
+        stats = (
+            select(
+                Message.conversation_id.label("cid"),
+                func.count().label("n"),
+                func.max(Message.created_at).label("last_at"),
+            )
+            .where(Message.conversation_id.in_(ids))
+            .group_by(Message.conversation_id)
+            .subquery()
+        )
+        res = await db.execute(
+            select(stats.c.cid, stats.c.n, stats.c.last_at, Message.content).join(
+                Message,
+                and_(
+                    Message.conversation_id == stats.c.cid,
+                    Message.created_at == stats.c.last_at,
+                ),
+            )
+        )
+
+        values: dict[str, dict] = {}
+        for cid, n, last_at, content in res.all():
+            if cid in values:  # timestamp tie: keep the first row
+                continue
+            try:
+                content_obj = json.loads(content) if content else {}
+            except Exception:
+                content_obj = {}
+            values[cid] = {
+                "message_count": n,
+                "last_message_at": last_at,
+                "last_message_preview": ConversationService._preview(content_obj),
+            }
+
+        for cid in ids:
+            row = values.get(
+                cid,
+                {
+                    "message_count": 0,
+                    "last_message_at": None,
+                    "last_message_preview": None,
+                },
+            )
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == cid)
+                # Keep updated_at: the column's onupdate would reorder the sidebar.
+                .values(**row, updated_at=Conversation.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+
+
+async def main(batch_size: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(_ensure_schema)
+
+    last_id = ""
+    done = 0
+    while True:
+        async with session_factory() as db:
+            res = await db.execute(
+                select(Conversation.id)
+                .where(Conversation.id > last_id)
+                .order_by(Conversation.id)
+                .limit(batch_size)
+            )
+            ids = list(res.scalars().all())
+        if not ids:
+            break
+        await _backfill_batch(ids)
+        last_id = ids[-1]
+        done += len(ids)
+        logger.info("Backfilled %d conversations", done)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Add and backfill conversation last-message columns"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.batch_size))
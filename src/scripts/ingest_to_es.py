@@ -2,19 +2,25 @@
 Ingest documents into Elasticsearch RAG index.
 
 Usage (from project root):
-  python src/scripts/ingest_to_es.py --source src/resources/documents --index docs
+  python src/scripts/ingest_to_es.py --source src/resources/documents
 
 Supports .txt and .md files. If PyPDF2 is installed, will also try to extract text from .pdf files.
 
-Chunks each document into fixed-size windows with overlap and indexes them using the
-`es_rag_service.ESRAGService.index_documents` method which handles embeddings.
+Chunks each document into fixed-size windows with overlap and indexes them through
+`retrieval.make_retriever`, i.e. the same vector store and embedding model the chat
+graph searches; the index is the one that store is configured with, so the old
+--index option is rejected. Cached answers are invalidated once the ingest
+completes; the script exits non-zero if that fails. For an offline run:
+  python src/scripts/ingest_to_es.py --provider local-numpy --embedding-model hash/256
 """
 
 import argparse
 from pathlib import Path
-from typing import List, Dict
-import uuid
+from typing import List
 import logging
+import time
+
+from langchain_core.documents import Document
 
 try:
     from PyPDF2 import PdfReader
@@ -23,8 +29,8 @@ try:
 except Exception:
     _HAS_PDF = False
 
-from app.services.cache_service import get_es_rag
-from app.core.config import settings
+from app.ai.shared import retrieval
+from app.services.semantic_cache import semantic_cache
 
 logger = logging.getLogger("ingest_to_es")
 
@@ -62,11 +68,33 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[st
     return chunks
 
 
-async def ingest_folder(source: Path, index: str, chunk_size: int, overlap: int):
-    es = get_es_rag()
+async def ingest_folder(
+    source: Path,
+    chunk_size: int,
+    overlap: int,
+    provider: str = "elastic-local",
+    embedding_model: str = "openai/text-embedding-3-small",
+) -> int:
+    """Index every supported file under ``source``; returns the exit status."""
+    config = {
+        "configurable": {
+            "retriever_provider": provider,
+            "embedding_model": embedding_model,
+        }
+    }
     files = [p for p in source.rglob("*") if p.is_file()]
     logger.info("Found %d files in %s", len(files), source)
-    batch: List[Dict] = []
+    batch: List[Document] = []
+    indexed = 0
+    started = time.perf_counter()
+
+    async def flush():
+        nonlocal batch, indexed
+        with retrieval.make_retriever(config) as retriever:
+            await retriever.aadd_documents(batch)
+        indexed += len(batch)
+        batch = []
+
     for f in files:
         ext = f.suffix.lower()
         try:
@@ -87,41 +115,74 @@ async def ingest_folder(source: Path, index: str, chunk_size: int, overlap: int)
 
         chunks = chunk_text(text, chunk_size=chunk_size, overlap=overlap)
         for i, c in enumerate(chunks):
-            doc_id = f"{f.stem}-{i}-{uuid.uuid4().hex[:8]}"
+            # Stable ids: re-ingesting a file overwrites its chunks.
+            doc_id = f"{f.relative_to(source).as_posix()}-{i}"
             metadata = {"source": str(f.name), "chunk_index": i}
-            batch.append({"id": doc_id, "text": c, "metadata": metadata})
+            batch.append(Document(id=doc_id, page_content=c, metadata=metadata))
 
         # flush in batches
         if len(batch) >= 200:
             logger.info("Indexing batch of %d chunks", len(batch))
-            await es.index_documents(batch)
-            batch = []
+            await flush()
 
     if batch:
         logger.info("Indexing final batch of %d chunks", len(batch))
-        await es.index_documents(batch)
+        await flush()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Indexed %d chunks in %.2fs (%.1f chunks/s)",
+        indexed,
+        elapsed,
+        indexed / elapsed if elapsed else 0.0,
+    )
+
+    # Cached answers were grounded in the old index contents.
+    if indexed and not await semantic_cache.invalidate():
+        logger.error(
+            "Could not invalidate the semantic answer cache; workers may serve "
+            "answers from before this ingest until it is invalidated"
+        )
+        return 1
+    return 0
 
 
-def main():
+def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--source", required=False, default="src/resources/documents")
     parser.add_argument(
-        "--index", required=False, default=getattr(settings, "elastic_index", "docs")
+        "--index",
+        help="no longer supported: chunks go to the index of --provider's store",
     )
     parser.add_argument("--chunk-size", type=int, default=1000)
     parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--provider", default="elastic-local")
+    parser.add_argument("--embedding-model", default="openai/text-embedding-3-small")
     args = parser.parse_args()
+    if args.index is not None:
+        parser.error(
+            "--index is no longer supported: chunks are indexed into the store "
+            "the chat graph searches, selected with --provider"
+        )
 
     src = Path(args.source)
     if not src.exists() or not src.is_dir():
         print("Source folder not found:", src)
-        return
+        return 1
 
     import asyncio
 
-    asyncio.run(ingest_folder(src, args.index, args.chunk_size, args.overlap))
+    return asyncio.run(
+        ingest_folder(
+            src,
+            args.chunk_size,
+            args.overlap,
+            provider=args.provider,
+            embedding_model=args.embedding_model,
+        )
+    )
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    main()
+    raise SystemExit(main())
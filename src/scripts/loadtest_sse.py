@@ -0,0 +1,350 @@
+"""
+Load-test the /f/conversation SSE endpoint.
+
+Logs in through /api/login, opens many concurrent conversation streams and
+reports p50/p95/p99 time-to-first-event, time-to-first-token (the
+``user_visible_token`` marker) and total stream time, plus events/sec.
+
+Usage (from src/):
+  # Fully offline: in-process server on SQLite + fake Redis + fake models
+  python -m scripts.loadtest_sse --concurrency 50 --requests 500
+
+  # Against a running server
+  python -m scripts.loadtest_sse --url http://127.0.0.1:8000 \
+      --username alice --password secret --concurrency 20
+
+Offline runs use ``fake/default`` chat models (tune latency with
+``--model "fake/default?first_token_ms=300&token_ms=15"``), ``hash/64``
+embeddings and a small ``local-numpy`` index.
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+logger = logging.getLogger("loadtest_sse")
+
+DEFAULT_FAKE_MODEL = "fake/default?first_token_ms=50&token_ms=5"
+OFFLINE_USER = ("loadtest", "loadtest-password")
+
+
+@dataclass
+class StreamResult:
+    ok: bool
+    first_event: Optional[float] = None
+    first_token: Optional[float] = None
+    total: float = 0.0
+    events: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadReport:
+    results: list[StreamResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    @staticmethod
+    def _percentiles(values: list[float]) -> dict[str, float]:
+        if not values:
+            return {}
+        ordered = sorted(values)
+        out = {}
+        for p in (50, 95, 99):
+            # nearest-rank percentile
+            idx = max(0, -(-p * len(ordered) // 100) - 1)
+            out[f"p{p}"] = round(ordered[idx] * 1000, 2)
+        return out
+
+    def summary(self) -> dict:
+        ok = [r for r in self.results if r.ok]
+        events = sum(r.events for r in self.results)
+        return {
+            "streams": len(self.results),
+            "failed": len(self.results) - len(ok),
+            "wall_time_s": round(self.wall_time, 3),
+            "events_per_s": round(events / self.wall_time, 1) if self.wall_time else 0,
+            "time_to_first_event_ms": self._percentiles(
+                [r.first_event for r in ok if r.first_event is not None]
+            ),
+            "time_to_first_token_ms": self._percentiles(
+                [r.first_token for r in ok if r.first_token is not None]
+            ),
+            "stream_time_ms": self._percentiles([r.total for r in ok]),
+            "errors": sorted({r.error for r in self.results if r.error})[:5],
+        }
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    resp = await client.post(
+        "/api/login", data={"username": username, "password": password}
+    )
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+def _event_payload(data: str) -> Any:
+    """Decode an event's data: JSON, or the Python literal dicts are sent as."""
+    try:
+        return json.loads(data)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(data)
+    except (ValueError, SyntaxError):
+        return data
+
+
+def _is_first_token(payload: Any) -> bool:
+    return (
+        isinstance(payload, dict)
+        and payload.get("type") == "message_marker"
+        and payload.get("marker") == "user_visible_token"
+    )
+
+
+async def run_stream(
+    client: httpx.AsyncClient, token: str, question: str
+) -> StreamResult:
+    body = {
+        "conversation_id": str(uuid.uuid4()),
+        "messages": [
+            {
+                "id": str(uuid.uuid4()),
+                "role": "user",
+                "content": {"content_type": "text", "parts": [question]},
+            }
+        ],
+    }
+    result = StreamResult(ok=False)
+    start = time.perf_counter()
+    try:
+        async with client.stream(
+            "POST",
+            "/f/conversation",
+            json=body,
+            headers={"Authorization": f"Bearer {token}"},
+        ) as resp:
+            resp.raise_for_status()
+            data_lines: list[str] = []
+            async for line in resp.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+                    continue
+                if line or not data_lines:
+                    continue
+                # Blank line: one complete event.
+                now = time.perf_counter() - start
+                data = "\n".join(data_lines)
+                data_lines = []
+                result.events += 1
+                if result.first_event is None:
+                    result.first_event = now
+                if result.first_token is None and _is_first_token(_event_payload(data)):
+                    result.first_token = now
+                if data == "[DONE]":
+                    result.ok = True
+                    break
+            if not result.ok:
+                result.error = "stream ended without [DONE]"
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.total = time.perf_counter() - start
+    return result
+
+
+async def run_load(
+    base_url: str,
+    username: str,
+    password: str,
+    *,
+    concurrency: int,
+    requests: int,
+    question: str = "How do I use a retriever in LangChain?",
+) -> LoadReport:
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    timeout = httpx.Timeout(60.0)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+        token = await login(client, username, password)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one() -> StreamResult:
+            async with sem:
+                return await run_stream(client, token, question)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        return LoadReport(list(results), time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def offline_server(
+    workdir: str, model: str = DEFAULT_FAKE_MODEL
+) -> AsyncIterator[str]:
+    """Serve the app in-process on SQLite, fake Redis and fake model providers.
+
+    The SQLite session factory and the fake Redis client are injected
+    through the app's dependencies. Yields the base URL; environment
+    variables and dependency overrides are restored on exit.
+    """
+    import uvicorn
+    from fakeredis import aioredis as fake_aioredis
+    from sqlalchemy.ext.asyncio import (
+        AsyncSession,
+        async_sessionmaker,
+        create_async_engine,
+    )
+
+    from app.ai.shared.numpy_store import NumpyVectorStore
+    from app.ai.shared.retrieval import make_text_encoder
+    from app.controller.conversation import get_chat_service
+    from app.core.db import Base, get_session_factory
+    from app.core.redis_client import get_redis
+    from app.model import conversation, message, role, user  # noqa: F401
+    from app.repository.user_repository import UserRepository
+    from app.security.password import PasswordHandler
+    from app.services.chat_service import ChatService
+    from main import app
+
+    work = Path(workdir)
+    env = {
+        "QUERY_MODEL": model,
+        "RESPONSE_MODEL": model,
+        "EMBEDDING_MODEL": "hash/64",
+        "RETRIEVER_PROVIDER": "local-numpy",
+        "NUMPY_STORE_DIR": str(work / "index"),
+    }
+    saved_env = {k: os.environ.get(k) for k in env}
+    saved_overrides = dict(app.dependency_overrides)
+
+    NumpyVectorStore.from_texts(
+        [
+            "A retriever returns documents relevant to a query.",
+            "Vector stores expose as_retriever() to build a retriever.",
+            "Chains compose prompts, models and output parsers.",
+        ],
+        make_text_encoder(env["EMBEDDING_MODEL"]),
+        path=env["NUMPY_STORE_DIR"],
+    )
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{work / 'loadtest.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+    @asynccontextmanager
+    async def sessions() -> AsyncIterator[AsyncSession]:
+        async with maker() as db:
+            try:
+                yield db
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    os.environ.update(env)
+    redis = fake_aioredis.FakeRedis()
+    chat_service = ChatService(sessions, redis=redis)
+    app.dependency_overrides.update(
+        {
+            get_session_factory: lambda: sessions,
+            get_redis: lambda: redis,
+            get_chat_service: lambda: chat_service,
+        }
+    )
+
+    server = None
+    task = None
+    try:
+        async with sessions() as session:
+            username, password = OFFLINE_USER
+            await UserRepository(session).create_basic_user(
+                username=username,
+                email=f"{username}@example.com",
+                password_hash=PasswordHandler().hash_password(password),
+            )
+
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"
+        )
+        server = uvicorn.Server(config)
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        if server is not None and task is not None:
+            server.should_exit = True
+            await task
+        await engine.dispose()
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved_overrides)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+async def main(args: argparse.Namespace) -> dict:
+    if args.url:
+        report = await run_load(
+            args.url,
+            args.username,
+            args.password,
+            concurrency=args.concurrency,
+            requests=args.requests,
+        )
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            async with offline_server(workdir, model=args.model) as url:
+                report = await run_load(
+                    url,
+                    *OFFLINE_USER,
+                    concurrency=args.concurrency,
+                    requests=args.requests,
+                )
+    return report.summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent SSE load test for /f/conversation"
+    )
+    parser.add_argument("--url", help="Base URL; omit to run an offline server")
+    parser.add_argument("--username", default=OFFLINE_USER[0])
+    parser.add_argument("--password", default=OFFLINE_USER[1])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument(
+        "--model", default=DEFAULT_FAKE_MODEL, help="Chat model for offline runs"
+    )
+    args = parser.parse_args()
+
+    if not args.url:
+        # app.core.db / jwt_tokens read these at import time; the offline
+        # server injects a session factory for its own SQLite file.
+        os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+        os.environ.setdefault("JWT_SECRET", "loadtest-secret")
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(json.dumps(asyncio.run(main(args)), indent=2))
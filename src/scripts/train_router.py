@@ -0,0 +1,80 @@
+"""
+Train the local router's centroids from logged LLM routing decisions.
+
+Set ROUTER_DECISION_LOG so the router LLM's decisions are appended as JSON
+lines, then rebuild the centroids and enable the tier with
+ROUTER_TIERS=keywords,centroid. Running workers pick up the new file on
+their next turn.
+
+Usage (from src/):
+  python -m scripts.train_router --log logs/router_decisions.jsonl \
+      --embedding-model openai/text-embedding-3-small [--min-examples 20]
+
+The output path defaults to ROUTER_CENTROIDS_PATH. The embedding model must
+match EMBEDDING_MODEL at serving time, otherwise the tier stays disabled.
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+
+from app.ai.retrieval_graph.fast_router import train_centroids
+from app.ai.shared.retrieval import make_text_encoder
+from app.core.config import settings
+
+logger = logging.getLogger("train_router")
+
+
+def read_decisions(path: str) -> list[tuple[str, str]]:
+    # Later decisions win for repeated questions.
+    latest: dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                latest[row["question"].strip()] = row["type"]
+            except Exception:
+                continue
+    return list(latest.items())
+
+
+def main(args: argparse.Namespace) -> dict:
+    examples = read_decisions(args.log)
+    logger.info("Read %d decisions: %s", len(examples), Counter(t for _, t in examples))
+
+    data = train_centroids(
+        examples,
+        make_text_encoder(args.embedding_model),
+        args.embedding_model,
+        min_examples=args.min_examples,
+    )
+
+    out = args.out
+    directory = os.path.dirname(out) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, out)
+
+    return {k: v["count"] for k, v in data["labels"].items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train local router centroids")
+    parser.add_argument("--log", default=settings.router_decision_log)
+    parser.add_argument("--out", default=settings.router_centroids_path)
+    parser.add_argument(
+        "--embedding-model",
+        default=os.getenv("EMBEDDING_MODEL", "openai/text-embedding-3-small"),
+    )
+    parser.add_argument("--min-examples", type=int, default=20)
+    args = parser.parse_args()
+    if not args.log:
+        parser.error("--log is required when ROUTER_DECISION_LOG is unset")
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(main(args), indent=2))
@@ -0,0 +1,16 @@
+"""Micro-benchmarks for per-turn helpers (pytest-benchmark).
+
+Not collected by the regular test run. From the repository root:
+
+  # compare against the tracked baseline
+  pytest src/test/benchmarks --benchmark-storage=src/test/benchmarks/baselines \
+      --benchmark-compare --benchmark-compare-fail=mean:25%
+
+  # record a new baseline after an intended change
+  pytest src/test/benchmarks --benchmark-storage=src/test/benchmarks/baselines \
+      --benchmark-save=baseline
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
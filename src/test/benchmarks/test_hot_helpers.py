@@ -0,0 +1,85 @@
+import random
+import string
+
+import pytest
+from langchain_core.documents import Document
+
+from app.ai.shared.state import reduce_docs
+from app.ai.shared.utils import format_docs
+from app.services.chat_service import _delta_patch, _dump, _extract_text_from_content
+from scripts.ingest_to_es import chunk_text
+
+SIZES = [10, 100, 1000]
+
+_rng = random.Random(0)
+_WORDS = [
+    "".join(_rng.choices(string.ascii_lowercase, k=_rng.randint(2, 10)))
+    for _ in range(2000)
+]
+
+
+def _text(words: int) -> str:
+    return " ".join(_rng.choices(_WORDS, k=words))
+
+
+def _docs(n: int) -> list[Document]:
+    return [
+        Document(
+            page_content=_text(150),
+            metadata={
+                "source": f"docs/page-{i}.md",
+                "title": _text(6),
+                "chunk": i,
+                "score": 0.5,
+                "tags": ["langchain", "retrieval"],
+            },
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.benchmark(group="reduce_docs")
+@pytest.mark.parametrize("n", SIZES)
+def test_reduce_docs(benchmark, n):
+    existing = reduce_docs(None, _docs(n))
+    # A research step returns a mix of already-seen and new chunks.
+    new = existing[: n // 2] + _docs(n // 2)
+    out = benchmark(reduce_docs, existing, new)
+    assert len(out) == n + n // 2
+
+
+@pytest.mark.benchmark(group="format_docs")
+@pytest.mark.parametrize("n", [4, 20, 100])
+def test_format_docs(benchmark, n):
+    docs = _docs(n)
+    out = benchmark(format_docs, docs)
+    assert out.count("<document ") == n
+
+
+@pytest.mark.benchmark(group="_dump")
+@pytest.mark.parametrize("n", SIZES)
+def test_dump_delta_events(benchmark, n):
+    events = [
+        _delta_patch([{"p": "/message/content/parts/0", "o": "append", "v": w}])
+        for w in _WORDS[:n]
+    ]
+    out = benchmark(lambda: [_dump(e) for e in events])
+    assert len(out) == n
+
+
+@pytest.mark.benchmark(group="_extract_text_from_content")
+@pytest.mark.parametrize("n", SIZES)
+def test_extract_text_from_history(benchmark, n):
+    history = [
+        {"content_type": "text", "parts": [_text(40), _text(20)]} for _ in range(n)
+    ]
+    out = benchmark(lambda: [_extract_text_from_content(c) for c in history])
+    assert all(out)
+
+
+@pytest.mark.benchmark(group="chunk_text")
+@pytest.mark.parametrize("kib", [10, 100, 1000])
+def test_chunk_text(benchmark, kib):
+    text = (_text(200) + "\n") * (kib * 1024 // 1200 + 1)
+    chunks = benchmark(chunk_text, text[: kib * 1024])
+    assert chunks
@@ -0,0 +1,345 @@
+import pytest
+from pydantic import SecretStr
+
+from app.ai.shared import utils
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    built = []
+
+    def fake_init_chat_model(model, model_provider=None, **kwargs):
+        built.append((model_provider, model, kwargs))
+        return object()
+
+    monkeypatch.setattr(utils, "init_chat_model", fake_init_chat_model)
+    monkeypatch.setattr(utils.settings, "openai_api_key", SecretStr("sk-test"))
+    reg = utils.ChatModelRegistry()
+    reg.built = built  # type: ignore[attr-defined]
+    return reg
+
+
+def test_chat_model_registry_reuses_clients(registry):
+    a = registry.get("openai/gpt-4o-mini")
+    b = registry.get("openai/gpt-4o-mini")
+    c = registry.get("openai/gpt-4o-mini", temperature=0.2)
+
+    assert a is b
+    assert c is not a
+    assert registry.stats() == {"size": 2, "hits": 1, "misses": 2}
+    assert registry.built[0] == ("openai", "gpt-4o-mini", {"api_key": "sk-test"})
+
+
+async def test_retriever_pool_builds_each_store_once(monkeypatch):
+    from langchain_core.embeddings import FakeEmbeddings
+    from langchain_core.vectorstores import InMemoryVectorStore
+
+    from app.ai.shared import retrieval
+
+    built = []
+
+    def fake_store(configuration, embedding_model):
+        built.append(embedding_model)
+        return InMemoryVectorStore(embedding_model)
+
+    monkeypatch.setattr(
+        retrieval, "make_text_encoder", lambda model: FakeEmbeddings(size=8)
+    )
+    monkeypatch.setattr(
+        retrieval, "_store_factory", lambda provider: (fake_store, "idx")
+    )
+    pool = retrieval.RetrieverPool()
+    monkeypatch.setattr(retrieval, "retriever_pool", pool)
+
+    config = {"configurable": {"retriever_provider": "chroma"}}
+    for _ in range(3):
+        with retrieval.make_retriever(config) as retriever:
+            assert retriever.vectorstore is pool.get_vector_store(
+                retrieval.BaseConfiguration.from_runnable_config(config)
+            )
+
+    assert len(built) == 1
+    # Ingest through the store must not go through the query cache.
+    model = retrieval.BaseConfiguration.from_runnable_config(config).embedding_model
+    assert built[0] is pool.get_document_encoder(model)
+    assert pool.get_text_encoder(model) is not built[0]
+    await pool.aclose()
+    assert pool._stores == {}
+
+
+async def test_retriever_pool_closes_sdk_and_http_clients(monkeypatch):
+    from langchain_core.embeddings import FakeEmbeddings
+
+    from app.ai.shared import retrieval
+
+    closed = []
+
+    class SyncClient:
+        def close(self):
+            closed.append("sync")
+
+    class AsyncClient:
+        async def close(self):
+            closed.append("async")
+
+    class Resource:
+        """Like openai's ``client.embeddings``: no close, holds the root client."""
+
+        def __init__(self, root):
+            self._client = root
+
+    class HttpxAsyncClient:
+        async def aclose(self):
+            closed.append("httpx")
+
+    class SdkEmbeddings(FakeEmbeddings):
+        client: object = None
+        async_client: object = None
+        http_async_client: object = None
+
+    encoder = SdkEmbeddings(
+        size=8,
+        client=Resource(SyncClient()),
+        async_client=Resource(AsyncClient()),
+        http_async_client=HttpxAsyncClient(),
+    )
+    monkeypatch.setattr(retrieval, "make_text_encoder", lambda model: encoder)
+    pool = retrieval.RetrieverPool()
+    pool.get_text_encoder("openai/text-embedding-3-small")
+
+    await pool.aclose()
+    assert sorted(closed) == ["async", "httpx", "sync"]
+
+
+async def test_micro_batcher_coalesces_concurrent_requests():
+    import asyncio
+
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.ai.shared.embeddings import MicroBatchingEmbeddings
+
+    class Recording(DeterministicFakeEmbedding):
+        batches: list = []
+
+        async def aembed_documents(self, texts):
+            self.batches.append(list(texts))
+            return self.embed_documents(texts)
+
+    inner = Recording(size=4)
+    batcher = MicroBatchingEmbeddings(inner, max_wait_ms=20, max_batch_size=100)
+
+    texts = [f"q{i}" for i in range(10)]
+    vectors = await asyncio.gather(*(batcher.aembed_query(t) for t in texts))
+
+    assert inner.batches == [texts]
+    assert vectors == [inner.embed_query(t) for t in texts]
+
+    # A full batch is flushed without waiting for the timer.
+    batcher = MicroBatchingEmbeddings(inner, max_wait_ms=10_000, max_batch_size=2)
+    await asyncio.wait_for(batcher.aembed_documents(["a", "b"]), timeout=1)
+
+    # A batch cancelled mid-call (e.g. on shutdown) releases its callers.
+    class Hanging(DeterministicFakeEmbedding):
+        async def aembed_documents(self, texts):
+            await asyncio.Event().wait()
+
+    batcher = MicroBatchingEmbeddings(Hanging(size=4), max_wait_ms=0)
+    caller = asyncio.ensure_future(batcher.aembed_query("x"))
+    await asyncio.sleep(0.01)
+    (task,) = batcher._tasks
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(caller, timeout=1)
+    assert not batcher._tasks
+
+
+async def test_cached_embeddings_lru_and_redis_tiers():
+    from fakeredis import aioredis as fake_aioredis
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.ai.shared.embeddings import CachedEmbeddings, unpack_vector
+
+    class Counting(DeterministicFakeEmbedding):
+        calls: list = []
+
+        async def aembed_documents(self, texts):
+            self.calls.append(list(texts))
+            return self.embed_documents(texts)
+
+    inner = Counting(size=8)
+    redis = fake_aioredis.FakeRedis()
+    cache = CachedEmbeddings(inner, model="fake/8", redis=redis, max_bytes=64)
+
+    first = await cache.aembed_documents(["what is  LCEL?", "what is LCEL?", "x"])
+    assert len(inner.calls) == 1 and len(inner.calls[0]) == 2
+    assert first[0] == first[1]
+
+    # 32 bytes per vector: only the two most recent fit the byte budget.
+    await cache.aembed_documents(["what is LCEL?"])
+    assert len(inner.calls) == 1
+
+    # A fresh process misses the LRU but is served from Redis as float32.
+    other = CachedEmbeddings(inner, model="fake/8", redis=redis)
+    again = await other.aembed_query("what is LCEL?")
+    assert len(inner.calls) == 1
+    raw = await redis.get(other.key("what is LCEL?"))
+    assert len(raw) == 8 * 4
+    assert again == unpack_vector(raw)
+
+
+async def test_numpy_store_top_k_and_persistence(tmp_path):
+    import numpy as np
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.ai.shared.numpy_store import NumpyVectorStore
+
+    encoder = DeterministicFakeEmbedding(size=32)
+    texts = [f"chunk {i}" for i in range(50)]
+    store = NumpyVectorStore.from_texts(texts, encoder, path=str(tmp_path))
+
+    query = encoder.embed_query("chunk 7")
+    hits = await store.asimilarity_search_by_vector(query, k=3)
+    assert hits[0].page_content == "chunk 7"
+    assert len(hits) == 3
+
+    reopened = NumpyVectorStore(encoder, path=str(tmp_path))
+    assert len(reopened) == 50
+    assert isinstance(reopened._snapshot.matrix, np.memmap)
+    assert [d.page_content for d in reopened.similarity_search("chunk 7", k=3)] == [
+        d.page_content for d in hits
+    ]
+
+
+def test_numpy_store_appends_batches_and_drops_uncommitted_tail(tmp_path):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.ai.shared.numpy_store import DOCS_FILE, VECTORS_FILE, NumpyVectorStore
+
+    encoder = DeterministicFakeEmbedding(size=8)
+    store = NumpyVectorStore(encoder, path=str(tmp_path))
+    before = store._snapshot
+    for batch in range(3):
+        store.add_texts([f"chunk {batch}-{i}" for i in range(4)])
+    assert len(before.matrix) == 0 and len(store) == 12
+
+    # An insert that died before committing the header leaves a tail behind.
+    with (tmp_path / VECTORS_FILE).open("ab") as f:
+        f.write(b"\0" * 8 * 4)
+    with (tmp_path / DOCS_FILE).open("ab") as f:
+        f.write(b'{"id": "torn", "page_con')
+
+    reopened = NumpyVectorStore(encoder, path=str(tmp_path))
+    assert len(reopened) == 12
+    reopened.add_texts(["chunk 3-0"])
+    again = NumpyVectorStore(encoder, path=str(tmp_path))
+    assert len(again) == 13
+    assert again.similarity_search("chunk 3-0", k=1)[0].page_content == "chunk 3-0"
+    assert again.similarity_search("chunk 1-2", k=1)[0].page_content == "chunk 1-2"
+
+    memory = NumpyVectorStore(encoder)
+    for i in range(100):
+        memory.add_texts([f"m{i}"])
+    assert memory.similarity_search("m42", k=1)[0].page_content == "m42"
+
+
+def test_numpy_store_upserts_by_document_id(tmp_path):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.ai.shared.numpy_store import NumpyVectorStore
+
+    encoder = DeterministicFakeEmbedding(size=8)
+    for path in (str(tmp_path), None):
+        store = NumpyVectorStore(encoder, path=path)
+        store.add_texts(["old a", "b"], ids=["a", "b"])
+        before = store._snapshot
+        store.add_texts(["new a", "c", "newer c"], ids=["a", "c", "c"])
+
+        assert len(before.matrix) == 2 and before.docs[0].page_content == "old a"
+        assert len(store) == 3
+        hit = store.similarity_search("new a", k=1)[0]
+        assert (hit.id, hit.page_content) == ("a", "new a")
+        assert store.similarity_search("newer c", k=1)[0].id == "c"
+
+    reopened = NumpyVectorStore(encoder, path=str(tmp_path))
+    assert [d.page_content for d in reopened._snapshot.docs] == [
+        "new a",
+        "b",
+        "newer c",
+    ]
+    reopened.add_texts(["d"], ids=["d"])
+    reopened.add_texts(["b again"], ids=["b"])
+    again = NumpyVectorStore(encoder, path=str(tmp_path))
+    assert [d.id for d in again._snapshot.docs] == ["a", "b", "c", "d"]
+    assert again.similarity_search("b again", k=1)[0].page_content == "b again"
+
+
+def test_hash_embeddings_are_deterministic_and_normalized():
+    import numpy as np
+
+    from app.ai.shared.retrieval import make_text_encoder
+
+    encoder = make_text_encoder("hash/64")
+    a, b, c = encoder.embed_documents(
+        ["LangGraph state reducers", "langgraph STATE reducers!", "pizza recipes"]
+    )
+
+    assert len(a) == 64
+    assert a == make_text_encoder("hash/64").embed_query("LangGraph state reducers")
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert np.dot(a, b) > 0.99
+    assert np.dot(a, c) < 0.5
+
+
+def test_history_window_fits_budget_and_starts_on_user_turn():
+    from app.ai.shared.history import history_start, prompt_messages
+
+    turns = []
+    for i in range(10):
+        turns += [("user", f"question {i} " * 20), ("ai", f"answer {i} " * 20)]
+    turns.append(("user", "latest question"))
+
+    start = history_start(turns, 200)
+    assert 0 < start < len(turns) - 1
+    assert turns[start][0] == "user"
+    assert history_start(turns, None) == 0
+    # The newest message is kept even when it alone is over budget.
+    assert history_start(turns, 1) == len(turns) - 1
+
+    messages = prompt_messages("SYSTEM", {"messages": turns, "summary": "S"}, 200)
+    assert "<conversation_summary>\nS\n" in messages[0]["content"]
+    assert messages[1:] == turns[start:]
+
+
+async def test_checkpointer_lists_latest_checkpoint_of_every_thread():
+    from fakeredis import aioredis as fake_aioredis
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    from app.ai.shared.checkpoint import RedisCheckpointSaver
+
+    saver = RedisCheckpointSaver(fake_aioredis.FakeRedis())
+    for thread, ns in (("a", ""), ("b", ""), ("b", "sub:1")):
+        config = {"configurable": {"thread_id": thread, "checkpoint_ns": ns}}
+        for step in range(2):
+            config = await saver.aput(config, empty_checkpoint(), {"step": step}, {})
+            await saver.aput_writes(config, [("x", step)], "task")
+        if thread == "a":
+            config_a = config
+
+    # Writes keys folded into a newer checkpoint leave the thread's set.
+    latest = config_a["configurable"]["checkpoint_id"]
+    assert await saver.redis.smembers(saver._thread_key("a")) == {
+        b"graph:checkpoint:a:",
+        saver._writes_key("a", "", latest).encode(),
+    }
+
+    listed = [t async for t in saver.alist(None)]
+    assert sorted(
+        (
+            t.config["configurable"]["thread_id"],
+            t.config["configurable"]["checkpoint_ns"],
+        )
+        for t in listed
+    ) == [("a", ""), ("b", ""), ("b", "sub:1")]
+    assert all(t.metadata["step"] == 1 for t in listed)
+    assert len([t async for t in saver.alist(None, limit=2)]) == 2
+    assert [t async for t in saver.alist(None, filter={"step": 0})] == []
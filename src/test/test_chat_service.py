@@ -0,0 +1,308 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.db import Base
+from app.dto.chat_dto import ChatRequestIn
+from app.dto.message import MessageBase, MessageContent
+from app.model.conversation import Conversation  # noqa: F401
+from app.model.message import Message
+from app.services import chat_service as chat_mod
+from app.services import conversation_service as conv_mod
+from app.services.chat_service import ChatService
+
+POOL_SIZE = 2
+STREAMS = 12
+
+
+@pytest.fixture
+async def small_pool(tmp_path, monkeypatch):
+    redis = fake_aioredis.FakeRedis()
+    monkeypatch.setattr(conv_mod, "rds", redis)
+    monkeypatch.setattr(chat_mod.checkpointer, "redis", redis)
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=2,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def factory():
+        async with maker() as db:
+            try:
+                yield db
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    yield engine, factory
+    await engine.dispose()
+
+
+def _request(i: int) -> ChatRequestIn:
+    return ChatRequestIn(
+        user_id=1,
+        conversation_id=f"conv-{i}",
+        messages=[
+            MessageBase(
+                id=f"msg-{i}",
+                role="user",
+                content=MessageContent(parts=[f"question {i}"]),
+            )
+        ],
+    )
+
+
+async def test_streams_do_not_hold_pooled_connections(small_pool, monkeypatch):
+    engine, factory = small_pool
+    in_flight = 0
+    all_in_flight = asyncio.Event()
+    checked_out_when_parked: list[int] = []
+
+    async def fake_answer(self, lc_messages, config):
+        nonlocal in_flight
+        in_flight += 1
+        if in_flight == STREAMS:
+            checked_out_when_parked.append(engine.pool.checkedout())
+            all_in_flight.set()
+        # Every stream parks "inside the LLM call" until all of them are
+        # there; that only happens if none of them is holding a connection.
+        await asyncio.wait_for(all_in_flight.wait(), timeout=5)
+        yield "answer"
+
+    monkeypatch.setattr(ChatService, "_astream_answer", fake_answer)
+
+    async def run(i: int) -> list:
+        return [e async for e in ChatService(factory).stream_conversation(_request(i))]
+
+    results = await asyncio.gather(*(run(i) for i in range(STREAMS)))
+
+    assert STREAMS > POOL_SIZE * 5
+    assert checked_out_when_parked == [0]
+    assert all(events[-1] == "[DONE]" for events in results)
+    assert not any(
+        isinstance(e, dict)
+        and isinstance(e["data"], dict)
+        and e["data"].get("type") == "message_stream_error"
+        for events in results
+        for e in events
+    )
+
+    async with factory() as db:
+        count = await db.scalar(
+            select(func.count()).select_from(Message).where(Message.role == "assistant")
+        )
+    assert count == STREAMS
+
+
+async def test_tokens_are_forwarded_as_append_patches(small_pool, monkeypatch):
+    _, factory = small_pool
+
+    async def fake_answer(self, lc_messages, config):
+        for t in ["Hel", "lo", "!"]:
+            yield t
+
+    monkeypatch.setattr(ChatService, "_astream_answer", fake_answer)
+
+    events = [e async for e in ChatService(factory).stream_conversation(_request(0))]
+    appends = [
+        op["v"]
+        for e in events
+        if isinstance(e, dict) and e.get("event") == "delta"
+        for op in (e["data"].get("v") or [])
+        if isinstance(op, dict) and op.get("o") == "append" and op["p"].endswith("/0")
+    ]
+    assert appends == ["Hel", "lo", "!"]
+
+    async with factory() as db:
+        msg = await db.scalar(select(Message).where(Message.role == "assistant"))
+    assert msg is not None and '"Hello!"' in msg.content
+
+
+async def test_graph_streams_only_answer_node_tokens(small_pool, monkeypatch):
+    import importlib
+    import json
+
+    from langchain_core.language_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    from app.ai.retrieval_graph.state import Router
+
+    graph_mod = importlib.import_module("app.ai.retrieval_graph.graph")
+
+    class StreamingFake(GenericFakeChatModel):
+        def with_structured_output(self, schema, **kwargs):
+            def parse(message):
+                value = json.loads(message.content)
+                return schema.model_validate(value) if schema is Router else value
+
+            return self | RunnableLambda(parse)
+
+    models = {
+        # Router and planner output stream too, from non-answer nodes.
+        "fake/query": StreamingFake(
+            messages=iter(
+                [
+                    AIMessage('{"logic": "ROUTER says docs", "type": "langchain"}'),
+                    AIMessage('{"steps": []}'),
+                ]
+            )
+        ),
+        "fake/answer": StreamingFake(
+            messages=iter([AIMessage("Retrievers fetch relevant documents.")])
+        ),
+    }
+    monkeypatch.setattr(graph_mod, "load_chat_model", lambda name, **kw: models[name])
+
+    config = {
+        "configurable": {
+            "thread_id": "stream-test",
+            "query_model": "fake/query",
+            "response_model": "fake/answer",
+        }
+    }
+    tokens = [
+        t
+        async for t in ChatService()._astream_answer(
+            {"messages": [("user", "How do retrievers work?")]}, config
+        )
+    ]
+
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Retrievers fetch relevant documents."
+
+
+def test_chunk_text_handles_content_blocks():
+    class Chunk:
+        content = [{"type": "text", "text": "a"}, "b", {"type": "tool_use"}]
+
+    assert chat_mod._chunk_text(Chunk()) == "ab"
+
+
+async def test_semantic_cache_serves_repeated_question(small_pool, monkeypatch):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.services import semantic_cache as cache_mod
+
+    _, factory = small_pool
+    monkeypatch.setattr(
+        cache_mod, "get_text_encoder", lambda model: DeterministicFakeEmbedding(size=8)
+    )
+    cache = cache_mod.SemanticAnswerCache(redis=fake_aioredis.FakeRedis())
+    graph_runs = 0
+
+    async def fake_answer(self, lc_messages, config):
+        nonlocal graph_runs
+        graph_runs += 1
+        yield "cached answer"
+
+    monkeypatch.setattr(ChatService, "_astream_answer", fake_answer)
+
+    def ask(i: int) -> ChatRequestIn:
+        req = _request(i)
+        req.messages[0].content.parts = ["What is LCEL?"]
+        return req
+
+    for i in range(2):
+        [
+            e
+            async for e in ChatService(factory, answer_cache=cache).stream_conversation(
+                ask(i)
+            )
+        ]
+
+    assert graph_runs == 1
+    assert cache.stats()["hits"] == 1
+
+    await cache.invalidate()
+    [
+        e
+        async for e in ChatService(factory, answer_cache=cache).stream_conversation(
+            ask(2)
+        )
+    ]
+    assert graph_runs == 2
+
+
+async def test_turns_resume_from_checkpoint_and_fold_old_history(
+    small_pool, monkeypatch
+):
+    _, factory = small_pool
+    monkeypatch.setenv("QUERY_MODEL", "fake/default?route=general")
+    monkeypatch.setenv("RESPONSE_MODEL", "fake/default")
+    monkeypatch.setattr(chat_mod.settings, "history_max_tokens", 300)
+    monkeypatch.setattr(chat_mod.settings, "history_summary_min_tokens", 200)
+    monkeypatch.setattr(
+        chat_mod.settings, "summary_model", "fake/default?answer=User+likes+LCEL."
+    )
+    inputs: list[dict] = []
+    astream_answer = ChatService._astream_answer
+
+    async def spy(self, graph_input, config):
+        inputs.append(graph_input)
+        async for text in astream_answer(self, graph_input, config):
+            yield text
+
+    monkeypatch.setattr(ChatService, "_astream_answer", spy)
+    folds: list[str] = []
+    fold_history = ChatService._fold_history
+
+    async def count_folds(self, conversation_id, model_name):
+        folds.append(conversation_id)
+        await fold_history(self, conversation_id, model_name)
+
+    monkeypatch.setattr(ChatService, "_fold_history", count_folds)
+
+    async def turn(text: str) -> None:
+        req = _request(0)
+        req.messages[0].id = None
+        req.messages[0].content.parts = [text]
+        [e async for e in ChatService(factory).stream_conversation(req)]
+        await asyncio.gather(*chat_mod._background_tasks)
+
+    for i in range(8):
+        await turn(f"question {i} " * 20)
+
+    # Only the first turn is seeded; later ones send just the new message.
+    assert [len(i["messages"]) for i in inputs] == [1] * 8
+    # Folds run only on turns that pushed messages out of the window.
+    assert 0 < len(folds) < 8
+    assert "summary" in inputs[-1]
+
+    async with factory() as db:
+        conv = await db.get(Conversation, "conv-0")
+    assert conv.message_count == 16
+    assert conv.history_summary == "User likes LCEL."
+    assert conv.summary_cursor
+
+    state = await chat_mod.graph.aget_state({"configurable": {"thread_id": "conv-0"}})
+    messages = state.values["messages"]
+    assert 1 < len(messages) < 16
+    assert messages[0].type == "human"
+    assert messages[-2].content == ("question 7 " * 20).strip()
+    assert state.values["summary"] == "User likes LCEL."
+
+    # An evicted checkpoint is rebuilt from the newest stored turns.
+    await chat_mod.checkpointer.adelete_thread("conv-0")
+    await turn("question 8")
+    seeded = inputs[-1]["messages"]
+    assert 1 < len(seeded) < 17
+    assert seeded[0].type == "human" and seeded[-1].content == "question 8"
@@ -0,0 +1,100 @@
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.controller import conversation as conv_ctrl
+from app.core.db import Base, get_db
+from app.model.conversation import Conversation  # noqa: F401
+from app.model.message import Message  # noqa: F401
+from app.security.deps import CurrentUser, get_current_user
+from app.services import conversation_service as conv_mod
+from app.services.conversation_service import ConversationService
+
+THREAD = 320
+
+
+@pytest.fixture
+async def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(conv_mod, "rds", fake_aioredis.FakeRedis())
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'api.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def factory():
+        async with maker() as db:
+            yield db
+            await db.commit()
+
+    async def db_dep():
+        async with factory() as db:
+            yield db
+
+    def user():
+        cu = CurrentUser()
+        cu.id, cu.username, cu.roles = 1, "u", []
+        return cu
+
+    monkeypatch.setattr(conv_ctrl, "session_factory", factory)
+    app = FastAPI()
+    app.include_router(conv_ctrl.router)
+    app.dependency_overrides[get_db] = db_dep
+    app.dependency_overrides[get_current_user] = user
+
+    async with factory() as db:
+        svc = ConversationService(db)
+        conv = await svc.get_or_create_conversation("1", "long")
+        await svc.add_messages(
+            conv.id,
+            [{"role": "user", "content": {"parts": [f"m{i}"]}} for i in range(THREAD)],
+        )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+        yield c
+    await engine.dispose()
+
+
+def _parts(body):
+    return [m["content"]["parts"][0] for m in body["messages"]]
+
+
+async def test_detail_returns_latest_page_and_walks_back(client):
+    first = (await client.get("/conversation/long")).json()
+    assert _parts(first) == [f"m{i}" for i in range(THREAD - 50, THREAD)]
+
+    older = (
+        await client.get(
+            "/conversation/long",
+            params={"before": first["before_cursor"], "limit": 100},
+        )
+    ).json()
+    assert _parts(older) == [f"m{i}" for i in range(THREAD - 150, THREAD - 50)]
+    assert older["before_cursor"]
+
+
+async def test_large_detail_pages_are_streamed(client):
+    resp = await client.get("/conversation/long", params={"limit": 300})
+    body = resp.json()
+
+    assert resp.headers["content-type"] == "application/json"
+    assert "content-length" not in resp.headers
+    assert _parts(body) == [f"m{i}" for i in range(THREAD - 300, THREAD)]
+
+    rest = (
+        await client.get(
+            "/conversation/long", params={"before": body["before_cursor"], "limit": 300}
+        )
+    ).json()
+    assert _parts(rest) == [f"m{i}" for i in range(THREAD - 300)]
+    assert rest["before_cursor"] is None
+
+
+async def test_detail_rejects_bad_cursor_and_unknown_thread(client):
+    assert (await client.get("/conversation/long?before=xx")).status_code == 400
+    assert (await client.get("/conversation/missing")).status_code == 404
@@ -0,0 +1,205 @@
+import json
+
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.db import Base
+from app.model.conversation import Conversation  # noqa: F401
+from app.model.message import Message  # noqa: F401
+from app.services import conversation_service as conv_mod
+from app.services.conversation_service import ConversationService
+
+
+@pytest.fixture
+async def service(tmp_path, monkeypatch):
+    redis = fake_aioredis.FakeRedis()
+    monkeypatch.setattr(conv_mod, "rds", redis)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'conv.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with maker() as db:
+        yield ConversationService(db)
+    await engine.dispose()
+
+
+def _text(i: int) -> dict:
+    return {"content_type": "text", "parts": [f"message {i}"]}
+
+
+async def test_add_messages_writes_history_in_one_pipeline(service, monkeypatch):
+    conv = await service.get_or_create_conversation("1", "conv-1")
+
+    executed = []
+    real_pipeline = service.redis.pipeline
+
+    def pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        executed.append(pipe)
+        return pipe
+
+    monkeypatch.setattr(service.redis, "pipeline", pipeline)
+
+    await service.add_messages(
+        conv.id, [{"role": "user", "content": _text(i)} for i in range(3)]
+    )
+    await service.add_message(conv.id, "assistant", _text(3), "answer-1")
+
+    assert len(executed) == 2
+    history = await service.redis.lrange(service._conv_history_key(conv.id), 0, -1)
+    assert [json.loads(h)["content"] for h in history] == [_text(i) for i in range(4)]
+    assert json.loads(history[-1])["id"] == "answer-1"
+    assert await service.redis.ttl(service._conv_history_key(conv.id)) > 0
+    summary = await service.redis.hget(service._user_conv_summary_key("1"), conv.id)
+    assert json.loads(summary)["last_message"] == "message 3"
+
+
+async def test_history_is_trimmed_to_max(service, monkeypatch):
+    monkeypatch.setattr(ConversationService, "HISTORY_MAX", 5)
+    conv = await service.get_or_create_conversation("1", "conv-2")
+
+    await service.add_messages(
+        conv.id, [{"role": "user", "content": _text(i)} for i in range(8)]
+    )
+
+    msgs = await service.get_conversation_messages(conv.id)
+    assert [m["content"] for m in msgs] == [_text(i) for i in range(3, 8)]
+
+
+async def test_sidebar_index_pages_without_the_db_after_warm_up(service, monkeypatch):
+    ids = [f"conv-{i}" for i in range(5)]
+    for i, cid in enumerate(ids):
+        await service.get_or_create_conversation("1", cid)
+        await service.add_message(cid, "user", _text(i))
+    # Drop the index: the first listing rebuilds it from the DB.
+    await service.redis.delete(
+        service._user_conv_index_key("1"),
+        service._user_conv_summary_key("1"),
+        service._user_conv_index_ready_key("1"),
+    )
+    first = await service.list_conversations("1", offset=0, limit=2)
+    assert [it["id"] for it in first["items"]] == ["conv-4", "conv-3"]
+    assert first["total"] == 5
+
+    async def no_db(*args, **kwargs):
+        raise AssertionError("listing hit the database")
+
+    monkeypatch.setattr(service.db, "execute", no_db)
+    await service.add_message("conv-1", "assistant", _text(9))
+
+    page = await service.list_conversations("1", offset=0, limit=2)
+    rest = await service.list_conversations("1", offset=2, limit=10)
+
+    assert [it["id"] for it in page["items"]] == ["conv-1", "conv-4"]
+    assert page["items"][0]["last_message"] == "message 9"
+    assert [it["id"] for it in rest["items"]] == ["conv-3", "conv-2", "conv-0"]
+
+
+async def test_add_messages_maintains_last_message_columns(service):
+    from sqlalchemy import select
+
+    conv = await service.get_or_create_conversation("1", "conv-4")
+    await service.add_messages(
+        conv.id, [{"role": "user", "content": _text(i)} for i in range(2)]
+    )
+    await service.add_message(
+        conv.id, "assistant", {"content_type": "text", "parts": ["x" * 1000]}
+    )
+
+    row = (
+        await service.db.execute(
+            select(
+                Conversation.message_count,
+                Conversation.last_message_preview,
+                Conversation.last_message_at,
+            ).where(Conversation.id == conv.id)
+        )
+    ).one()
+    assert row.message_count == 3
+    assert row.last_message_preview == "x" * ConversationService.PREVIEW_MAX
+    assert row.last_message_at is not None
+
+
+async def test_conversation_cursor_pages_match_offset_pages(service):
+    from datetime import datetime
+
+    from sqlalchemy import update
+
+    for i in range(7):
+        await service.get_or_create_conversation("1", f"c{i}")
+    # Ties on updated_at must be broken by id, as in the SQL ordering.
+    await service.db.execute(
+        update(Conversation).values(updated_at=datetime(2024, 1, 1))
+    )
+    # Drop the whole index: ZADD GT would keep the newer live scores.
+    await service.redis.delete(
+        service._user_conv_index_key("1"),
+        service._user_conv_summary_key("1"),
+        service._user_conv_index_ready_key("1"),
+    )
+
+    by_offset = await service.list_conversations("1", offset=0, limit=10)
+    expected = [it["id"] for it in by_offset["items"]]
+    assert expected == [f"c{i}" for i in reversed(range(7))]
+    scores = await service.redis.zrange(
+        service._user_conv_index_key("1"), 0, -1, withscores=True
+    )
+    assert len(scores) == 7 and len({score for _, score in scores}) == 1
+
+    seen, cursor = [], None
+    while True:
+        page = await service.list_conversations("1", limit=3, cursor=cursor)
+        seen += [it["id"] for it in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    with pytest.raises(ValueError):
+        await service.list_conversations("1", cursor="not-a-cursor")
+
+
+async def test_message_cursor_pages_cover_the_thread_once(service):
+    conv = await service.get_or_create_conversation("1", "thread")
+    await service.add_messages(
+        conv.id, [{"role": "user", "content": _text(i)} for i in range(11)]
+    )
+
+    seen, cursor = [], None
+    while True:
+        page = await service.get_messages_page(conv.id, limit=4, cursor=cursor)
+        seen += [m["content"]["parts"][0] for m in page["messages"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"message {i}" for i in range(11)]
+
+
+async def test_latest_page_cursor_uses_db_keys_with_second_precision(service):
+    from datetime import datetime
+
+    from sqlalchemy import update
+
+    conv = await service.get_or_create_conversation("1", "conv-s")
+    await service.add_messages(
+        conv.id, [{"role": "user", "content": _text(i)} for i in range(12)]
+    )
+    # What MySQL DATETIME keeps: one whole second, so ties are ordered by id.
+    await service.db.execute(
+        update(Message)
+        .where(Message.conversation_id == conv.id)
+        .values(created_at=datetime(2024, 1, 1, 12, 0, 0))
+    )
+
+    first = await service.get_latest_messages(conv.id, limit=5)
+    rest = await service.get_latest_messages(
+        conv.id, limit=50, before=first["before_cursor"]
+    )
+
+    ids = [m["id"] for m in rest["messages"] + first["messages"]]
+    assert sorted(ids) == sorted(set(ids)) and len(ids) == 12
+    assert rest["before_cursor"] is None
@@ -0,0 +1,33 @@
+from main import app
+from scripts.loadtest_sse import (
+    _event_payload,
+    _is_first_token,
+    offline_server,
+    run_load,
+)
+
+
+async def test_offline_load_run_completes_every_stream(tmp_path):
+    async with offline_server(str(tmp_path), model="fake/default?token_ms=1") as url:
+        report = await run_load(
+            url, "loadtest", "loadtest-password", concurrency=4, requests=8
+        )
+
+    summary = report.summary()
+    assert summary["failed"] == 0, summary["errors"]
+    assert summary["streams"] == 8
+    for r in report.results:
+        assert r.first_event <= r.first_token <= r.total
+    assert set(summary["time_to_first_token_ms"]) == {"p50", "p95", "p99"}
+    assert app.dependency_overrides == {}
+
+
+def test_first_token_marker_is_parsed_from_event_data():
+    marker = {"type": "message_marker", "marker": "user_visible_token"}
+    assert _is_first_token(_event_payload(repr(marker)))
+    assert _is_first_token(
+        _event_payload('{"type": "message_marker", ' '"marker": "user_visible_token"}')
+    )
+    text = {"v": [{"p": "/message/content/parts/0", "v": "user_visible_token"}]}
+    assert not _is_first_token(_event_payload(repr(text)))
+    assert _event_payload("[DONE]") == "[DONE]"
@@ -0,0 +1,152 @@
+import importlib
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+from langchain_core.vectorstores import InMemoryVectorStore, VectorStore
+
+from app.ai.researcher_graph.dedup import QueryMemo
+from app.ai.shared import retrieval
+
+researcher_mod = importlib.import_module("app.ai.researcher_graph.graph")
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    batch_calls: int = 0
+    query_calls: int = 0
+
+    def embed_documents(self, texts):
+        self.batch_calls += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+
+class FakeQueryModel:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def with_structured_output(self, schema):
+        return RunnableLambda(lambda _: {"queries": self.queries})
+
+
+@pytest.fixture
+def store(monkeypatch):
+    encoder = CountingEmbeddings(size=16)
+    vstore = InMemoryVectorStore(encoder)
+    vstore.add_documents(
+        [Document(page_content=t) for t in ["retrievers", "agents", "memory"]]
+    )
+    encoder.batch_calls = 0
+
+    pool = retrieval.RetrieverPool()
+    pool._encoders["fake/encoder"] = encoder
+    monkeypatch.setattr(pool, "get_vector_store", lambda configuration: vstore)
+    monkeypatch.setattr(retrieval, "retriever_pool", pool)
+    return encoder
+
+
+async def test_queries_are_embedded_in_one_batch(store, monkeypatch):
+    monkeypatch.setattr(
+        researcher_mod,
+        "load_chat_model",
+        lambda name: FakeQueryModel(["retrievers", "agents", "memory"]),
+    )
+    config = {
+        "configurable": {"embedding_model": "fake/encoder", "search_kwargs": {"k": 1}}
+    }
+
+    result = await researcher_mod.graph.ainvoke({"question": "how?"}, config)
+
+    assert store.batch_calls == 1
+    assert store.query_calls == 0
+    assert sorted(d.page_content for d in result["documents"]) == [
+        "agents",
+        "memory",
+        "retrievers",
+    ]
+
+
+async def test_repeated_queries_are_searched_once_per_turn(store, monkeypatch):
+    searched = []
+    search = retrieval.asearch_by_vector
+
+    async def counting_search(config, query, embedding):
+        searched.append(query)
+        return await search(config, query, embedding)
+
+    monkeypatch.setattr(retrieval, "asearch_by_vector", counting_search)
+    config = {
+        "configurable": {"embedding_model": "fake/encoder", "search_kwargs": {"k": 1}}
+    }
+    memo = QueryMemo(threshold=0.95)
+
+    monkeypatch.setattr(
+        researcher_mod,
+        "load_chat_model",
+        lambda name: FakeQueryModel(["retrievers", " Retrievers ", "agents"]),
+    )
+    first = await researcher_mod.graph.ainvoke({"question": "a", "memo": memo}, config)
+
+    # A later step of the same turn: only the new query is searched.
+    monkeypatch.setattr(
+        researcher_mod,
+        "load_chat_model",
+        lambda name: FakeQueryModel(["agents", "memory"]),
+    )
+    second = await researcher_mod.graph.ainvoke({"question": "b", "memo": memo}, config)
+
+    assert sorted(searched) == ["agents", "memory", "retrievers"]
+    assert memo.queries == ["retrievers", "agents", "memory"]
+    assert len(first["documents"]) == 2
+    assert [d.page_content for d in second["documents"]] == ["memory"]
+
+
+def test_memo_skips_near_duplicate_embeddings():
+    memo = QueryMemo(["retrievers"], threshold=0.9)
+    memo.set_vectors(["retrievers"], [[1.0, 0.0]])
+
+    kept = memo.admit(["retriever", "agents"], [[0.99, 0.05], [0.0, 1.0]])
+
+    assert kept == [1]
+    assert memo.queries == ["retrievers", "agents"]
+    assert QueryMemo(["x"], threshold=None).missing_vectors() == []
+
+
+async def test_scored_only_store_uses_the_batched_embeddings(store, monkeypatch):
+    """Like ElasticsearchStore: no similarity_search_by_vector at all."""
+    inner = retrieval.retriever_pool.get_vector_store(None)
+
+    class ScoredOnlyStore(InMemoryVectorStore):
+        similarity_search_by_vector = VectorStore.similarity_search_by_vector
+        asimilarity_search_by_vector = VectorStore.asimilarity_search_by_vector
+
+        def similarity_search_by_vector_with_relevance_scores(
+            self, embedding, k=4, **kwargs
+        ):
+            return inner.similarity_search_with_score_by_vector(embedding, k)
+
+    scored = ScoredOnlyStore(store)
+    monkeypatch.setattr(
+        retrieval.retriever_pool, "get_vector_store", lambda configuration: scored
+    )
+    monkeypatch.setattr(
+        researcher_mod,
+        "load_chat_model",
+        lambda name: FakeQueryModel(["retrievers", "agents"]),
+    )
+    config = {
+        "configurable": {"embedding_model": "fake/encoder", "search_kwargs": {"k": 1}}
+    }
+
+    for step in range(2):
+        result = await researcher_mod.graph.ainvoke({"question": str(step)}, config)
+        assert store.batch_calls == step + 1
+        assert store.query_calls == 0
+    assert sorted(d.page_content for d in result["documents"]) == [
+        "agents",
+        "retrievers",
+    ]
@@ -0,0 +1,293 @@
+import asyncio
+import importlib
+import time
+
+from langchain_core.documents import Document
+
+# The package re-exports the compiled graph under the module's name.
+graph_mod = importlib.import_module("app.ai.retrieval_graph.graph")
+
+
+class SlowResearcher:
+    def __init__(self, delays: dict[str, float]):
+        self.delays = delays
+
+    async def ainvoke(self, inputs, config=None):
+        step = inputs["question"]
+        await asyncio.sleep(self.delays[step])
+        return {"documents": [Document(page_content=f"doc for {step}")]}
+
+
+def _config(**configurable):
+    return {"configurable": configurable}
+
+
+async def test_parallel_research_runs_steps_concurrently(monkeypatch):
+    delays = {"a": 0.2, "b": 0.2, "c": 0.3}
+    monkeypatch.setattr(graph_mod, "researcher_graph", SlowResearcher(delays))
+
+    start = time.perf_counter()
+    out = await graph_mod.conduct_research(
+        {"steps": list(delays)}, config=_config(research_mode="parallel")
+    )
+    elapsed = time.perf_counter() - start
+
+    assert out["steps"] == []
+    assert [d.page_content for d in out["documents"]] == [
+        "doc for a",
+        "doc for b",
+        "doc for c",
+    ]
+    assert elapsed < sum(delays.values()) * 0.6
+
+
+async def test_parallel_research_drops_timed_out_steps(monkeypatch):
+    delays = {"fast": 0.01, "slow": 1.0}
+    monkeypatch.setattr(graph_mod, "researcher_graph", SlowResearcher(delays))
+
+    out = await graph_mod.conduct_research(
+        {"steps": ["fast", "slow"]},
+        config=_config(
+            research_mode="parallel",
+            research_max_concurrency=1,
+            research_step_timeout=0.1,
+        ),
+    )
+
+    assert [d.page_content for d in out["documents"]] == ["doc for fast"]
+
+
+async def test_timed_out_step_does_not_mark_its_queries_searched(monkeypatch):
+    class AdmittingResearcher(SlowResearcher):
+        async def ainvoke(self, inputs, config=None):
+            step = inputs["question"]
+            kept = inputs["memo"].admit(["shared query"])
+            await asyncio.sleep(self.delays[step])
+            return {"documents": [Document(page_content=f"{step}: {len(kept)}")]}
+
+    delays = {"slow": 1.0, "fast": 0.01}
+    monkeypatch.setattr(graph_mod, "researcher_graph", AdmittingResearcher(delays))
+    config = _config(research_step_timeout=0.1)
+
+    for mode in ("sequential", "parallel"):
+        state = {"steps": ["slow", "fast"]}
+        documents = []
+        while state["steps"]:
+            out = await graph_mod.conduct_research(
+                state,
+                config=_config(
+                    **config["configurable"],
+                    research_mode=mode,
+                    research_max_concurrency=1,
+                ),
+            )
+            state = {**state, **out}
+            documents += out["documents"]
+
+        # The slow step's search was dropped, so the fast one must still run it.
+        assert [d.page_content for d in documents] == ["fast: 1"]
+        assert out["searched_queries"] == ["shared query"]
+
+
+async def test_sequential_research_takes_one_step(monkeypatch):
+    monkeypatch.setattr(graph_mod, "researcher_graph", SlowResearcher({"a": 0, "b": 0}))
+
+    out = await graph_mod.conduct_research({"steps": ["a", "b"]}, config=_config())
+
+    assert out["steps"] == ["b"]
+    assert len(out["documents"]) == 1
+
+
+async def test_graph_runs_offline_with_fake_models_and_replays_them(
+    monkeypatch, tmp_path
+):
+    from app.ai.shared import fake_models, retrieval
+    from app.ai.shared.numpy_store import NumpyVectorStore
+    from app.ai.shared.utils import chat_models
+
+    store_dir = tmp_path / "index"
+    NumpyVectorStore.from_texts(
+        ["Retrievers return documents for a query.", "Chains compose runnables."],
+        retrieval.make_text_encoder("hash/64"),
+        path=str(store_dir),
+    )
+    monkeypatch.setenv("NUMPY_STORE_DIR", str(store_dir))
+    monkeypatch.setattr(retrieval, "retriever_pool", retrieval.RetrieverPool())
+    monkeypatch.setattr(fake_models, "_cassettes", {})
+    monkeypatch.setattr(
+        fake_models.settings, "chat_cassette_path", str(tmp_path / "chat.json")
+    )
+    chat_models.clear()
+
+    async def run(model: str):
+        return await graph_mod.graph.ainvoke(
+            {"messages": [("user", "How do retrievers work?")]},
+            config=_config(
+                query_model=model,
+                response_model=model,
+                embedding_model="hash/64",
+                retriever_provider="local-numpy",
+            ),
+        )
+
+    recorded = await run("record/fake/default?token_ms=1")
+    replayed = await run("replay/fake/default")
+    chat_models.clear()
+
+    assert recorded["router"]["type"] == "langchain"
+    assert recorded["documents"]
+    assert recorded["messages"][-1].content == fake_models.DEFAULT_ANSWER
+    assert replayed["messages"][-1].content == fake_models.DEFAULT_ANSWER
+    assert replayed["router"] == recorded["router"]
+
+
+def _metric(name: str, **labels) -> float:
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def test_speculative_research_overlaps_routing(monkeypatch):
+    monkeypatch.setattr(graph_mod, "researcher_graph", SlowResearcher({"a": 0.2}))
+    router = "fake/default?route=langchain&first_token_ms=200"
+    monkeypatch.setattr(
+        graph_mod,
+        "_plan",
+        lambda state, configuration: asyncio.sleep(0, result=["a", "b"]),
+    )
+    used = _metric("chatbot_speculative_research_runs_total", outcome="used")
+
+    start = time.perf_counter()
+    out = await graph_mod.analyze_and_route_query(
+        {"messages": [("user", "How do retrievers work?")]},
+        config=_config(query_model=router, speculative_research=True),
+    )
+    elapsed = time.perf_counter() - start
+
+    assert out["router"]["type"] == "langchain"
+    assert out["steps"] == ["b"]
+    assert [d.page_content for d in out["documents"].value] == ["doc for a"]
+    assert elapsed < 0.35
+    assert _metric("chatbot_speculative_research_runs_total", outcome="used") == (
+        used + 1
+    )
+    state = {"router": out["router"], "steps": out["steps"]}
+    config = _config(speculative_research=True)
+    assert graph_mod.route_query(state, config) == "conduct_research"
+
+
+async def test_speculative_research_is_cancelled_for_other_routes(monkeypatch):
+    researcher = SlowResearcher({"a": 5.0})
+    monkeypatch.setattr(graph_mod, "researcher_graph", researcher)
+    monkeypatch.setattr(
+        graph_mod,
+        "_plan",
+        lambda state, configuration: asyncio.sleep(0, result=["a"]),
+    )
+    wasted = _metric(
+        "chatbot_speculative_research_wasted_seconds_total", stage="research"
+    )
+
+    start = time.perf_counter()
+    out = await graph_mod.analyze_and_route_query(
+        {"messages": [("user", "hi")]},
+        config=_config(
+            query_model="fake/default?route=general&first_token_ms=100",
+            speculative_research=True,
+        ),
+    )
+
+    assert out == {"router": {"type": "general", "logic": "Scripted route."}}
+    assert time.perf_counter() - start < 1.0
+    assert (
+        _metric("chatbot_speculative_research_wasted_seconds_total", stage="research")
+        > wasted
+    )
+
+
+async def test_local_router_tiers_skip_the_llm(monkeypatch, tmp_path):
+    import json
+
+    from app.ai.retrieval_graph import fast_router
+    from app.ai.shared.retrieval import make_text_encoder
+
+    examples = [(f"how do I tune pgvector index {i}", "langchain") for i in range(5)]
+    examples += [(f"what is the best pizza recipe {i}", "general") for i in range(5)]
+    centroids = tmp_path / "centroids.json"
+    centroids.write_text(
+        json.dumps(
+            fast_router.train_centroids(
+                examples, make_text_encoder("hash/64"), "hash/64"
+            )
+        )
+    )
+    log = tmp_path / "decisions.jsonl"
+    monkeypatch.setattr(fast_router.settings, "router_centroids_path", str(centroids))
+    monkeypatch.setattr(fast_router.settings, "router_decision_log", str(log))
+
+    def route(question: str):
+        return graph_mod.analyze_and_route_query(
+            {"messages": [("user", question)]},
+            config=_config(
+                # The LLM would say "more-info"; local tiers must win first.
+                query_model="fake/default?route=more-info",
+                embedding_model="hash/64",
+                router_tiers=["keywords", "centroid"],
+            ),
+        )
+
+    llm_before = _metric("chatbot_router_decisions_total", tier="llm")
+    centroid_before = _metric("chatbot_router_decisions_total", tier="centroid")
+
+    assert (await route("What is LCEL?"))["router"]["type"] == "langchain"
+    assert (await route("hello!"))["router"]["type"] == "general"
+    out = await route("best pizza recipe please")
+    assert out["router"]["type"] == "general"
+    assert out["router"]["logic"] == ""
+    assert _metric("chatbot_router_decisions_total", tier="centroid") == (
+        centroid_before + 1
+    )
+    assert _metric("chatbot_router_decisions_total", tier="llm") == llm_before
+
+    # Conflicting keywords and an unfamiliar question fall back to the LLM,
+    # whose decisions are logged as training data.
+    assert (await route("My retriever is not working"))["router"]["type"] == (
+        "more-info"
+    )
+    assert _metric("chatbot_router_decisions_total", tier="llm") == llm_before + 1
+    logged = [json.loads(line) for line in log.read_text().splitlines()]
+    assert logged[-1]["question"] == "My retriever is not working"
+    assert logged[-1]["type"] == "more-info"
+
+
+def test_router_tiers_are_reused_until_the_centroid_file_changes(monkeypatch, tmp_path):
+    import json
+    import os
+
+    from app.ai.retrieval_graph import fast_router
+
+    centroids = tmp_path / "centroids.json"
+    labels = {"general": {"centroid": [1.0, 0.0]}, "langchain": {"centroid": [0, 1]}}
+    centroids.write_text(json.dumps({"embedding_model": "hash/2", "labels": labels}))
+    monkeypatch.setattr(fast_router.settings, "router_centroids_path", str(centroids))
+    monkeypatch.setattr(fast_router, "CENTROID_RECHECK_SECONDS", 0.0)
+
+    def build(min_margin: float = 0.05):
+        return fast_router.build_tiers(
+            ["keywords", "centroid"],
+            "hash/2",
+            min_similarity=0.5,
+            min_margin=min_margin,
+        )
+
+    tiers = build()
+    assert [t.name for t in tiers] == ["keywords", "centroid"]
+    assert build() is tiers
+    assert build(min_margin=0.1) is not tiers
+
+    labels["more-info"] = {"centroid": [0.6, 0.8]}
+    centroids.write_text(json.dumps({"embedding_model": "hash/2", "labels": labels}))
+    os.utime(centroids, (1, 1))
+    rebuilt = build()
+    assert rebuilt is not tiers
+    assert rebuilt[1].labels == ["general", "langchain", "more-info"]